@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""Benchmark the slotted records of roquefort.records against the former
+SimpleNamespace objects, per object: memory and attribute access, e.g.:
+
+    python benchmarks/records.py -n 100000
+"""
+import argparse
+import time
+import tracemalloc
+from types import SimpleNamespace
+from typing import Callable, List
+
+from roquefort.records import Declaration, ImportedVar, Scope, UseImport
+
+
+def namespace_scope(i: int) -> SimpleNamespace:
+    """The former scope of scope_utils.separate_scope."""
+    return SimpleNamespace(name='s', istart=i, iend=i + 1, data=None,
+                           tokens=None, module=[], floats=[], integers=[],
+                           characters=[], complexes=[], parameters=[],
+                           dimensions=[], bulky_var=[])
+
+
+def namespace_import(i: int) -> SimpleNamespace:
+    """The former entry of scope.module."""
+    mod = SimpleNamespace(name='m', iline=i, total_count=0)
+    mod.var = []
+    return mod
+
+
+CASES = [
+    ('Scope', namespace_scope, lambda i: Scope('s', i, i + 1, None)),
+    ('UseImport', namespace_import, lambda i: UseImport('m', i)),
+    ('ImportedVar', lambda i: SimpleNamespace(name='v', count=i),
+     lambda i: ImportedVar('v', i)),
+    ('Declaration',
+     lambda i: SimpleNamespace(variables=None, dimensions=i),
+     lambda i: Declaration(None, i)),
+]
+
+
+def memory(factory: Callable, number: int) -> float:
+    """Bytes allocated per object, lists and all."""
+    tracemalloc.start()
+    objects = [factory(i) for i in range(number)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return size / number
+
+
+def access(objects: List, repeat: int) -> float:
+    """Best time of repeat reads of an attribute of the objects."""
+    name = objects[0].__slots__[1] if hasattr(objects[0], '__slots__') \
+        else list(vars(objects[0]))[1]
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for obj in objects:
+            getattr(obj, name)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--number', type=int, default=100000,
+                        help='number of objects')
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+                        help='number of runs, the best one is kept')
+    args = parser.parse_args()
+
+    for name, old, new in CASES:
+        old_size = memory(old, args.number)
+        new_size = memory(new, args.number)
+        olds = [old(i) for i in range(args.number)]
+        news = [new(i) for i in range(args.number)]
+        old_time = access(olds, args.repeat)
+        new_time = access(news, args.repeat)
+        print('%s: %.0f -> %.0f bytes per object (-%.0f%%), '
+              'access %.4fs -> %.4fs' %
+              (name, old_size, new_size, 100 * (1 - new_size / old_size),
+               old_time, new_time))
+
+
+if __name__ == "__main__":
+    main()
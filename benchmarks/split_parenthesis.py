@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""Benchmark the declaration and common block splitters against the former
+pyparsing grammars, e.g.:
+
+    python benchmarks/split_parenthesis.py example/src/vmc/*.f* -r 200
+
+Needs pyparsing for the reference timings.
+"""
+import argparse
+import re
+import time
+from typing import Callable, List
+
+from pyparsing import (Char, Group, Literal, OneOrMore, Word, ZeroOrMore,
+                       alphanums, delimitedList, nestedExpr, originalTextFor,
+                       printables, quotedString)
+
+from roquefort.clean_common import parse_common_block
+from roquefort.statements import assemble_statements
+from roquefort.string_utils import (list_to_string, split_rawdata,
+                                    split_string_with_parenthesis)
+
+DECLARATIONS = ('real', 'integer', 'complex', 'character', 'dimension')
+
+
+def pyparsing_split_string_with_parenthesis(s: str) -> list:
+    """The former grammar of split_string_with_parenthesis."""
+    value = (quotedString
+             | originalTextFor(OneOrMore(Word(printables, excludeChars="(),")
+                                         | nestedExpr())))
+    expr = delimitedList(value)
+    return expr.parseString(s).asList()
+
+
+def pyparsing_parse_common_block(s: str) -> List[str]:
+    """The former grammar of parse_common_block."""
+    myword = Word(alphanums + "_")
+    inside = OneOrMore(myword + ZeroOrMore("*") + ZeroOrMore(","))
+    parenthesis = ZeroOrMore(Char("(") + inside + Char(")"))
+    parser = Literal("common") + Char('/') + myword + Char('/') + \
+        OneOrMore(Group(myword + parenthesis + ZeroOrMore(Char(","))))
+    return parser.parseString(s).asList()
+
+
+def read_inputs(filenames: List[str]):
+    """Gather the declarations with a shape and the common blocks."""
+    declarations, commons = [], []
+    for filename in filenames:
+        with open(filename, 'r') as f:
+            statements = assemble_statements(f.readlines())
+        texts = [st.text for st in statements]
+        for text, words in zip(texts, split_rawdata(texts)):
+            head = words[0].lower()
+            if head.startswith(DECLARATIONS):
+                s = list_to_string(words[1:]).split('!')[0]
+                if '(' in s:
+                    declarations.append(s)
+            elif head == 'common' and re.match(r'\s*common\s*/', text):
+                commons.append(text.split('!')[0].strip())
+    return declarations, commons
+
+
+def timing(function: Callable, inputs: List[str], repeat: int) -> float:
+    """Best time of repeat runs of function over the inputs."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for s in inputs:
+            function(s)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('filenames', nargs='+', help='Fortran files')
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+                        help='number of runs, the best one is kept')
+    args = parser.parse_args()
+
+    declarations, commons = read_inputs(args.filenames)
+    cases = [('split_string_with_parenthesis', declarations,
+              pyparsing_split_string_with_parenthesis,
+              split_string_with_parenthesis),
+             ('parse_common_block', commons, pyparsing_parse_common_block,
+              parse_common_block)]
+
+    for name, inputs, reference, scanner in cases:
+        if not inputs:
+            continue
+        assert all(reference(s) == scanner(s) for s in inputs)
+        old = timing(reference, inputs, args.repeat)
+        new = timing(scanner, inputs, args.repeat)
+        print('%s: %d inputs, pyparsing %.4fs, scanner %.4fs (x%.0f)' %
+              (name, len(inputs), old, new, old / new))
+
+
+if __name__ == "__main__":
+    main()
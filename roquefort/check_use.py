@@ -1,7 +1,13 @@
 #!/usr/bin/env python
 from types import SimpleNamespace
-from typing import List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
 import re
+from roquefort.project_index import (DEFAULT_INDEX_DIR, STATEMENT_KINDS,
+                                     ProjectIndex)
+from roquefort.spans import TokenLine
+from roquefort.records import Scope
+from roquefort.scope_tree import scope_tree
+from roquefort.string_utils import split_string
 
 
 def flatten_string_list(l: List[List[str]]) -> List[str]:
@@ -16,20 +22,6 @@ def flatten_string_list(l: List[List[str]]) -> List[str]:
     return [item for sublist in l for item in sublist]
 
 
-def split_string(s: str, delimiters: str = ' |, | ,|,') -> List[str]:
-    """Split a string using the regex delimiters
-
-    Args:
-        s (str): the string
-        delimiters (str, optional): regex delimiters. Defaults to ' |, | ,|,'.
-
-    Returns:
-        List[str]: the splitted string
-    """
-    split_str = re.split(delimiters, s)
-    return list(filter(None, split_str))
-
-
 def read_file(filename: str) -> List[str]:
     """Read the data file and returns a list of strings
 
@@ -50,11 +42,8 @@ def consider_line(spl: List[str]):
     comment = ['c', 'C', '!']
     if spl[0] in comment:
         return False
-    if spl[0] == 'implicit':
-        return False
-    if spl[0].startswith('format'):
-        return False
-    if spl[0].startswith('write'):
+    # (the statements left out of the counts of the index too)
+    if spl[0].lower().split('(')[0] in STATEMENT_KINDS:
         return False
     if len(spl) == 1 and spl[0][0] in comment:
         return False
@@ -81,7 +70,7 @@ def process_data(rawdata: List[str]) -> List[List[str]]:
     # return [split_string(rd) if len(rd) > 0 else rd for rd in rawdata]
 
 
-def separate_scope(data: List[str]) -> List[SimpleNamespace]:
+def separate_scope(data: List[str]) -> List[Scope]:
     """Find the scope regions of the data
 
     Args:
@@ -90,26 +79,10 @@ def separate_scope(data: List[str]) -> List[SimpleNamespace]:
     Returns:
         List[List[str]]: each scope separated
     """
-
-    # identifier for scoping
-    start_keyword = ['subroutine', 'function', 'module']
-    end_keyword = ['end', 'end\n']
-
-    # get the index of start/end scope
-    name, idx_start, idx_end = [], [], []
-    for i, d in enumerate(data):
-
-        if len(d) == 0:
-            continue
-
-        if d[0] in start_keyword:
-            idx_start.append(i)
-            name.append(d[1].split('(')[0])
-
-        if d[0] in end_keyword:
-            idx_end.append(i)
-
-    return [SimpleNamespace(name=name, istart=istart, data=data[istart:iend]) for name, istart, iend in zip(name, idx_start, idx_end)]
+    tree = scope_tree(data)
+    return [Scope(node.name, node.istart, node.body_end,
+                  data[node.istart:node.body_end], tree.tokens)
+            for node in tree.scopes()]
 
 
 def get_scope(filename: str) -> SimpleNamespace:
@@ -222,28 +195,61 @@ def get_local_vars(scope: SimpleNamespace) -> List:
     return local_vars
 
 
-def check_var(scope: List[SimpleNamespace], modules: List[SimpleNamespace]) -> List[int]:
+def _tally(counts: Dict[str, int], var: str) -> int:
+    """Count a variable in the occurrences of the index, by lowercase
+    name."""
+    return counts[var.lower()]
+
+
+def check_var(scope: List[SimpleNamespace], modules: List[SimpleNamespace],
+              index: Optional[ProjectIndex] = None,
+              filename: Optional[str] = None) -> List[int]:
     """[summary]
 
+    The occurrences of the variables are taken from the index of the
+    project if given, with the file of the scopes.
+
     Args:
         scope (SimpleNamespace): [description]
+        index (Optional[ProjectIndex]): the index of the project
+        filename (Optional[str]): the file of the scopes, for the index
 
     Returns:
         SimpleNamespace: [description]
     """
 
+    # occurrences of the ids of the header and of the body of the scopes:
+    indexed = {}
+    if index is not None:
+        index.update([filename])
+        for (name, _, _), counts in zip(index.scopes(filename),
+                                        index.occurrences(filename,
+                                                          STATEMENT_KINDS)):
+            indexed.setdefault(name.lower(), []).append(counts)
+
     for s in scope:
         print_scope_name = True
+        # the positions of the ids, recorded for the first report:
+        occurrences = None
 
         use_var = get_use_vars(s)
         local_var = get_local_vars(s)
 
+        if indexed.get(s.name.lower()):
+            head, body = indexed[s.name.lower()].pop(0)
+            tally = _tally
+        else:
+            head = s.tokens.occurrences([s.istart])
+            body = s.tokens.occurrences(
+                range(s.istart + 1, s.istart + len(s.data)))
+            tally = s.tokens.tally
+
         for m in modules:
             for var in m.var:
                 if len(var) < 4:
                     continue
-                c0, srch = count([s.data[0]], var)
-                c, srch = count(s.data[1:], var)
+                c0 = tally(head, var)
+                c = tally(body, var)
                 if c0 == 0 and var not in local_var:
                     if c > 0 and var not in use_var:
                         if print_scope_name:
@@ -253,30 +259,75 @@ def check_var(scope: List[SimpleNamespace], modules: List[SimpleNamespace]) -> L
                         print('    missing variable %s from module %s' %
                               (var.rstrip('\n'), m.name.rstrip('\n')))
                         if var.rstrip('\n') == 'c':
-                            for ls in srch:
+                            if occurrences is None:
+                                occurrences = Occurrences(s.data[1:])
+                            for ls in occurrences.contexts(var):
                                 print('    ', ls)
 
 
-def count(scope_data: List[str], varname: str) -> int:
-    """Count the number of time a variable appears in the
+# The identifiers of the code of a statement:
+_IDENT_RE = re.compile(r'\w+')
+
+
+class Occurrences:
+    """The positions of the identifiers in the code of statements, recorded
+    in a single pass: the counts are looked up, and the context of an
+    occurrence is only sliced when it is reported."""
+
+    __slots__ = ('data', 'positions')
+
+    def __init__(self, data: Sequence[TokenLine]):
+        """Record the identifiers of the statements.
+
+        Args:
+            data (Sequence[TokenLine]): the words of the statements
+        """
+        self.data = data
+        # the (statement, start, end) of each lowercase identifier:
+        self.positions: Dict[str, List[Tuple[int, int, int]]] = {}
+        for index, words in enumerate(data):
+            lower = words.lower
+            for start, end in words.code_pieces():
+                for match in _IDENT_RE.finditer(lower, start, end):
+                    self.positions.setdefault(match.group(), []).append(
+                        (index, match.start(), match.end()))
+
+    def count(self, varname: str) -> int:
+        """Count the occurrences of a variable, in any case."""
+        return len(self.positions.get(varname.lower(), ()))
+
+    def contexts(self, varname: str, width: int = 5) -> Iterator[str]:
+        """Slice the text around each occurrence of a variable.
+
+        Args:
+            varname (str): the variable, in any case
+            width (int, optional): characters kept on each side
+
+        Yields:
+            str: the occurrence and its context in the code of the
+                 statement
+        """
+        for index, start, end in self.positions.get(varname.lower(), ()):
+            words = self.data[index]
+            comment = words.mask.comment
+            stop = words.end if comment is None else comment
+            yield words.buffer[max(start - width, words.start):
+                               min(end + width, stop)].rstrip('\n')
+
+
+def count(scope_data: List[TokenLine], varname: str) -> int:
+    """Count the number of time a variable appears in the code of the scope,
+    strings and comments are skipped.
 
     Args:
-        scope_data (List[str]): data of the scope
+        scope_data (List[TokenLine]): data of the scope
         var (str): name of the vairable
 
     Returns:
         int: count
     """
-    joined_data = ' ' + \
-        ' '.join(flatten_string_list(scope_data)) + ' '
-    pattern = re.compile('[\W\s]' + varname + '[\W\s]', re.IGNORECASE)
-    c = len(pattern.findall(joined_data))
-    contxt = []
-    if c > 0:
-        srch = pattern.finditer(joined_data)
-        for s in srch:
-            contxt.append(joined_data[s.span()[0]-5:s.span()[1]+5])
-    return c, contxt
+    occurrences = Occurrences(scope_data)
+    return occurrences.count(varname), list(occurrences.contexts(varname))
 
 
 if __name__ == "__main__":
@@ -290,6 +341,10 @@ if __name__ == "__main__":
 
     parser.add_argument(
         '-ow', '--overwrite', action='store_true', help='overwrite the inputfile')
+
+    parser.add_argument(
+        '--index_dir', default=DEFAULT_INDEX_DIR,
+        help='directory of the index of the identifiers of the project')
     args = parser.parse_args()
 
     print("== FILE : %s" % args.filename)
@@ -300,4 +355,4 @@ if __name__ == "__main__":
     scope = get_scope(args.filename)
 
     # check
-    check_var(scope, modules)
+    check_var(scope, modules, ProjectIndex(args.index_dir), args.filename)
@@ -1,50 +1,156 @@
 #!/usr/bin/env python
 
 import re
-import string
 from itertools import chain, takewhile
 from pathlib import Path
-from pyparsing import (Char, Group, Literal, OneOrMore, Word, ZeroOrMore,
-                       alphanums)
-from typing import List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+from roquefort.declarations import (IMPLICIT_DEFAULT, compile_implicit,
+                                    parse_implicit, refactored_type)
+from roquefort.lexer import mask_line
+from roquefort.project_index import ProjectIndex
+from roquefort.scope_tree import scope_tree
+from roquefort.source_form import (FIXED_FORM, INITIAL, detect_form,
+                                   line_classifier)
+from roquefort.spans import fold_case
+from roquefort.statements import assemble_statements
+from roquefort.string_utils import split_rawdata
+
+
+_COMMON_WORD_RE = re.compile(r'[ \t\n\r]*([A-Za-z0-9_]+)')
+_COMMON_CHAR_RE = re.compile(r'[ \t\n\r]*(.)', re.DOTALL)
 
 
 def parse_common_block(s: str) -> List[str]:
-    """Parse a common block."""
-    myword = Word(alphanums + "_")
-    inside = OneOrMore(myword + ZeroOrMore("*") + ZeroOrMore(","))
-    parenthesis = ZeroOrMore(Char("(") + inside + Char(")"))
-    parser = Literal("common") + Char('/') + myword + Char('/') + \
-        OneOrMore(Group(myword + parenthesis + ZeroOrMore(Char(","))))
-
-    return parser.parseString(s).asList()
-
-
-def search_for_procedures(index: int, xs: str, procedure: str = "subroutine") -> Optional[Tuple[int, int]]:
-    """Search for string slice containing the procedure."""
-    start = re.search(f"      {procedure}", xs[index:])
-    if start is not None:
-        end = re.search(r"(?i)      end\s*\n", xs[index + start.start():])
-        return index + start.start(), index + start.start() + end.end()
-    else:
+    """Parse a common block.
+
+    The block is scanned once, e.g.
+    "common /name/ a(n*2, 3), b" ->
+        ['common', '/', 'name', '/',
+         ['a', '(', 'n', '*', '2', ',', '3', ')', ','], ['b']]
+
+    Like a parser, the scan stops at the first variable it cannot read.
+    """
+    s = s.expandtabs()
+    head = re.match(r'[ \t\n\r]*common', s)
+    index = head and _common_char(s, head.end(), '/')
+    name = index and _common_word(s, index)
+    end = name and _common_char(s, name[1], '/')
+    if end is None:
+        raise ValueError('Not a common block: %r' % s)
+    parsed = ['common', '/', name[0], '/']
+
+    while True:
+        word = _common_word(s, end)
+        if word is None:
+            break
+        group, end = [word[0]], word[1]
+        # shapes of the variable, e.g. (n*2, 3):
+        while True:
+            shape = _common_shape(s, end)
+            if shape is None:
+                break
+            group.extend(shape[0])
+            end = shape[1]
+        while _common_char(s, end, ',') is not None:
+            group.append(',')
+            end = _common_char(s, end, ',')
+        parsed.append(group)
+
+    if len(parsed) == 4:
+        raise ValueError('No variable in the common block: %r' % s)
+    return parsed
+
+
+def _common_word(s: str, index: int) -> Optional[Tuple[str, int]]:
+    """Read a word of the common block, return it and where it ends."""
+    match = _COMMON_WORD_RE.match(s, index)
+    return match and (match.group(1), match.end())
+
+
+def _common_char(s: str, index: int, char: str) -> Optional[int]:
+    """Read the character char, return where it ends."""
+    match = _COMMON_CHAR_RE.match(s, index)
+    return match.end() if match and match.group(1) == char else None
+
+
+def _common_shape(s: str,
+                  index: int) -> Optional[Tuple[List[str], int]]:
+    """Read a shape of a variable, e.g. (n*2, 3), as its list of tokens."""
+    end = _common_char(s, index, '(')
+    if end is None:
+        return None
+    tokens = ['(']
+    while True:
+        word = _common_word(s, end)
+        if word is None:
+            break
+        tokens.append(word[0])
+        end = word[1]
+        for char in '*,':
+            while _common_char(s, end, char) is not None:
+                tokens.append(char)
+                end = _common_char(s, end, char)
+    close = _common_char(s, end, ')')
+    if len(tokens) == 1 or close is None:
         return None
+    tokens.append(')')
+    return tokens, close
+
+
+def search_for_procedures(index: int, xs: str, procedure: str = "subroutine",
+                          form: str = FIXED_FORM) -> Optional[Tuple[int, int]]:
+    """Search for string slice containing the procedure.
+
+    The text is walked line by line from index: the comment lines are
+    skipped and, in fixed form, the statements must start after column 6.
+    The procedure ends at a bare ``end`` or an ``end <procedure>``, the
+    blank lines following it belong to the procedure.
+    """
+    classify = line_classifier(form)
+    fixed_form = form == FIXED_FORM
+    size = len(xs)
+    start = None
+    while index < size:
+        eol = xs.find('\n', index) + 1 or size
+        line = xs[index:eol]
+        if classify(line)[0] == INITIAL and \
+           not (fixed_form and line[:6].strip()):
+            code = line[6:] if fixed_form else line
+            word = code.strip()
+            if start is None:
+                if word.startswith(procedure):
+                    start = index
+            elif re.match(rf"end\s*(?:{procedure}\b.*)?$", word, re.I):
+                while eol < size:
+                    following = xs.find('\n', eol) + 1
+                    if not following or not xs[eol:following].isspace():
+                        break
+                    eol = following
+                return start, eol
+        index = eol
+    return None if start is None else (start, size)
 
 
 class Expression:
     """Naive representation of an expression."""
 
-    def __init__(self, s: str, kind: str):
+    def __init__(self, s: str, kind: str, form: Optional[str] = None):
         self.text = s
         self.kind = kind
+        # the form of the file holding it:
+        self.form = form
 
 
 class Refactor:
     """Object to remove common block from a project."""
 
-    def __init__(self, name: str, path: Path):
-        """Initialize Refactor class."""
+    def __init__(self, name: str, path: Path,
+                 index: Optional[ProjectIndex] = None):
+        """Initialize Refactor class, with the index of the identifiers of
+        the project, kept in the default disk cache if not given."""
         self.block_name = name
         self.path = path
+        self.index = ProjectIndex() if index is None else index
         self.keyword = f"      common /{name}/.*"
         self.multiline = False
 
@@ -56,18 +162,17 @@ class Refactor:
         result = re.search(self.keyword, xs)
         return True if result is not None else False
 
-    def generate_new_module(self, variables: List[str], variable_names: str) -> str:
-        """Generate new module replacing the common block."""
-        integer_variables = string.ascii_lowercase[8:14]
-
+    def generate_new_module(
+            self, variables: List[str], variable_names: str,
+            types: Tuple[Optional[str], ...] = IMPLICIT_DEFAULT) -> str:
+        """Generate new module replacing the common block, the variables
+        having the implicit types of types."""
         # Sort alphabetically
         variables.sort()
 
         def add_kind(v: str) -> str:
-            if v[0].lower() in integer_variables:
-                return "integer  ::"
-            else:
-                return "real(dp) ::"
+            type_ = refactored_type(types, v)
+            return f"{type_:<8} ::"
 
         kinds_and_variables = '\n'.join(
             f"    {add_kind(v)} {v}" for v in variables)
@@ -98,6 +203,32 @@ class Refactor:
 
         return target_source, target_include
 
+    def read_implicit_types(self, path: Path) -> Tuple[Optional[str], ...]:
+        """Compile the implicit types of the scope defining the common block
+        from its 'implicit' statements and the ones of its hosts."""
+        with open(path, 'r') as f:
+            rawdata = f.readlines()
+
+        form = detect_form(str(path), rawdata)
+        statements = assemble_statements(rawdata, form)
+        data = split_rawdata([st.text for st in statements], form)
+        index = next((i for i, st in enumerate(statements)
+                      if re.match(self.keyword, st.text)), None)
+        node = None if index is None else scope_tree(data).scope_of(index)
+
+        hosts = []
+        while node is not None:
+            hosts.append(node)
+            node = node.parent
+        types = IMPLICIT_DEFAULT
+        for host in reversed(hosts):
+            implicits = [
+                parse_implicit(sd.buffer, sd.start, sd.end, sd.lower) or ()
+                for sd in data[host.istart:host.body_end]
+                if len(sd) and sd.folded[0] == 'implicit']
+            types = compile_implicit(implicits, types)
+        return types
+
     def read_common_block_definition(self, path: Path) -> str:
         """Read the definition of the common block."""
         with open(path, 'r') as f:
@@ -157,21 +288,24 @@ class Refactor:
         with open(path, 'r') as f:
             xs = f.read()
 
+        form = detect_form(str(path), xs.splitlines(True))
         index = 0
         size = len(xs)
         components = []
         while True:
-            rs = search_for_procedures(index, xs, procedure)
+            rs = search_for_procedures(index, xs, procedure, form)
             # There are not more procedures
             if rs is None:
-                components.append(Expression(xs[index:size], "other"))
+                components.append(Expression(xs[index:size], "other", form))
                 break
             else:
                 start, end = rs
                 # Add comments and other things in the middle
-                components.append(Expression(xs[index: start], "other"))
+                components.append(Expression(xs[index: start], "other",
+                                             form))
                 # Add the procedure
-                components.append(Expression(xs[start:end], procedure))
+                components.append(Expression(xs[start:end], procedure,
+                                             form))
                 index = end
 
         return components
@@ -238,7 +372,8 @@ class Refactor:
         definitions = self.read_common_block_definition(target_source[0])
         variables = self.get_variable_names(definitions)
         module_call = self.generate_module_call(definitions)
-        new_module = self.generate_new_module(definitions, variables)
+        new_module = self.generate_new_module(
+            definitions, variables, self.read_implicit_types(target_source[0]))
         # Add variable to new module
         self.add_new_module(new_module)
         # Replace common blocks in subroutines
@@ -291,13 +426,14 @@ class Refactor:
         target_source = self.get_files_to_change(
             used_variables, module_call, folder)
 
+        matcher = VariableMatcher(used_variables)
         for path in target_source:
             print("Changing file: ", path)
             subroutines_functions = self.split_into_procedures(path, procedure)
             module = []
             for expr in subroutines_functions:
                 variables_in_procedure = get_variable_in_string(
-                    expr.text, used_variables)
+                    expr.text, matcher, expr.form)
                 if variables_in_procedure and expr.kind == procedure:
                     module.append(self.change_subroutine(
                         module_call, expr.text))
@@ -309,15 +445,9 @@ class Refactor:
 
     def get_files_to_change(self, used_variables: List[str], module_call: str, folder: Path) -> List[Path]:
         """Introduce a module call in subroutines wiht include file."""
-        vmc_path = self.path / folder
-        files = []
-        for file_path in vmc_path.rglob("*.f"):
-            variables_in_file = get_variables_in_file(
-                file_path, used_variables)
-            if variables_in_file:
-                files.append(file_path)
-        files.sort()
-        return files
+        files = self.index_source_files(folder)
+        using = self.index.files_using(used_variables)
+        return sorted(path for path in files if str(path) in using)
 
     def remove_common_block_from_include(self, file_path: Path) -> None:
         """Remove the common block  that are not use in the source file."""
@@ -331,33 +461,96 @@ class Refactor:
 
     def search_for_variables_in_src(self, variables: List[str], folder: str) -> Optional[List[str]]:
         """Check what the variables in the common block  are use in the `.f` source files."""
-        vmc_path = self.path / folder
-        # Search in each source file
-        used_variables = set()
-        for file_path in vmc_path.rglob("*.f"):
-            s = get_variables_in_file(file_path, variables)
-            used_variables.update(s)
-        return list(used_variables)
+        files = self.index_source_files(folder)
+        return list(self.index.used(variables, files))
+
+    def index_source_files(self, folder: str) -> List[Path]:
+        """Bring the index of the `.f` source files up to date, only the
+        files changed since they were indexed are read."""
+        files = sorted((self.path / folder).rglob("*.f"))
+        self.index.update(files)
+        return files
 
 
-def get_variables_in_file(file_path: Path, variables: List[str]) -> set:
-    """Get the subset of `variables` in ``file_path``."""
-    with open(file_path, 'r') as f:
-        content = f.read()
+# The identifiers of a text, as the regex r'\W{variable}\W' sees them:
+_IDENTIFIER_RE = re.compile(r'\w+')
 
-    return get_variable_in_string(content, variables)
 
+class VariableMatcher:
+    """Find the members of a set of variables in the code of a text in a
+    single pass: the identifiers of the code, case-folded, are looked up in
+    the set."""
 
-def get_variable_in_string(content: str, variables: List[str]) -> set:
-    """Get the subset of `variables` in ``content``."""
-    used_variables = set()
-    for variable in variables:
-        pattern = f"\W{variable}\W"
-        start = re.search(pattern, content)
-        if start is not None:
-            used_variables.add(variable)
+    __slots__ = ('names', )
+
+    def __init__(self, variables: Iterable[str]):
+        """Index the variables by lowercase name."""
+        self.names: Dict[str, List[str]] = {}
+        for variable in variables:
+            self.names.setdefault(variable.lower(), []).append(variable)
+
+    def search(self, content: str, form: Optional[str] = None) -> Set[str]:
+        """Get the variables found in the code of ``content``, strings and
+        comments skipped, see blank_non_code."""
+        code = fold_case(blank_non_code(content, form))
+        found = set()
+        for name in self.names.keys() & set(_IDENTIFIER_RE.findall(code)):
+            found.update(self.names[name])
+        return found
+
+    def find(self, content: str,
+             form: Optional[str] = None) -> Dict[str, List[int]]:
+        """Get the offsets of the variables found in the code of
+        ``content``, by variable, see blank_non_code."""
+        code = fold_case(blank_non_code(content, form))
+        offsets: Dict[str, List[int]] = {}
+        for match in _IDENTIFIER_RE.finditer(code):
+            for variable in self.names.get(match.group(), ()):
+                offsets.setdefault(variable, []).append(match.start())
+        return offsets
+
+
+def get_variables_in_file(file_path: Path,
+                          variables: Union[List[str], VariableMatcher]
+                          ) -> set:
+    """Get the subset of `variables` in ``file_path``."""
+    with open(file_path, 'r') as f:
+        content = f.read()
 
-    return used_variables
+    return get_variable_in_string(
+        content, variables,
+        detect_form(str(file_path), content.splitlines(True)))
+
+
+def get_variable_in_string(content: str,
+                           variables: Union[List[str], VariableMatcher],
+                           form: Optional[str] = None) -> set:
+    """Get the subset of `variables` in the code of ``content``, strings and
+    comments are skipped, see blank_non_code."""
+    if not isinstance(variables, VariableMatcher):
+        variables = VariableMatcher(variables)
+    return variables.search(content, form)
+
+
+def blank_non_code(content: str, form: Optional[str] = None) -> str:
+    """Replace the strings and the comments of ``content`` by blanks, keeping
+    the positions of the code: the comment lines are told by the form of
+    the source, detected from ``content`` if not given."""
+    form = form or detect_form(lines=content.splitlines(True))
+    fixed_form = form == FIXED_FORM
+    chars = list(content)
+    start = 0
+    for line in content.splitlines(keepends=True):
+        strings, comment = mask_line(content, start, start + len(line),
+                                     fixed_form)
+        if comment is not None:
+            end = start + len(line.rstrip('\n'))
+            chars[comment:end] = ' ' * (end - comment)
+        for i in range(0, len(strings), 2):
+            chars[strings[i]:strings[i + 1]] = ' ' * (strings[i + 1] -
+                                                      strings[i])
+        start += len(line)
+    return ''.join(chars)
 
 
 def split_variables_into_multiple_lines(variables: list) -> str:
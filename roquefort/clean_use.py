@@ -1,7 +1,15 @@
 #!/usr/bin/env python
+from collections import Counter
 from types import SimpleNamespace
-from typing import List, Optional, Tuple
-import re
+from typing import Dict, List, Optional, Tuple
+from roquefort.statements import (Statement, assemble_statements,
+                                  format_statement, replace_statement)
+from roquefort.preprocessor import (inactive_names, map_statements,
+                                    preprocess)
+from roquefort.records import ImportedVar, Scope, UseImport
+from roquefort.scope_tree import scope_tree
+from roquefort.source_form import detect_form
+from roquefort.string_utils import split_string
 
 
 def flatten_string_list(l: List[List[str]]) -> List[str]:
@@ -16,20 +24,6 @@ def flatten_string_list(l: List[List[str]]) -> List[str]:
     return [item for sublist in l for item in sublist]
 
 
-def split_string(s: str, delimiters: str = ' |, | ,|,') -> List[str]:
-    """Split a string using the regex delimiters
-
-    Args:
-        s (str): the string
-        delimiters (str, optional): regex delimiters. Defaults to ' |, | ,|,'.
-
-    Returns:
-        List[str]: the splitted string
-    """
-    split_str = re.split(delimiters, s)
-    return list(filter(None, split_str))
-
-
 def read_file(filename: str) -> List[str]:
     """Read the data file and returns a list of strings
 
@@ -46,71 +40,46 @@ def read_file(filename: str) -> List[str]:
     return rawdata
 
 
-def replace_ampersand(rawdata: List[str]) -> List[List[str]]:
-    """[summary]
-
-    Args:
-        rawdata (List[str]): [description]
-
-    Returns:
-        List[List[str]]: [description]
-    """
-
-    for il, rd in enumerate(rawdata):
-        if len(rd) > 0:
-            if rd.lstrip(' ').startswith('use'):
-                next_line = il+1
-                while rawdata[next_line].lstrip(' ').startswith('&'):
-                    name = rd.split()[1].lstrip(',').rstrip(',')
-                    rawdata[next_line] = rawdata[next_line].replace(
-                        '&', ' use %s, only: ' % name)
-                    next_line += 1
-
-    return rawdata
-
-
-def process_data(rawdata: List[str]) -> List[List[str]]:
-    """Split the raw data into chunks
+def process_data(rawdata: List[str], filename: Optional[str] = None,
+                 defines: Optional[Dict[str, str]] = None) -> \
+        Tuple[List[List[str]], List[Statement]]:
+    """Split the raw data into chunks, one per logical statement
 
     Args:
         rawdata (List[str]): [description]
+        filename (Optional[str]): name of the file, to detect its form
+        defines (Optional[Dict[str, str]]): macros of the preprocessor
 
     Returns:
-        List[List[str]]: [description]
+        Tuple[List[List[str]], List[Statement]]: the chunks and the
+                                                 statements they come from
     """
-    rawdata = replace_ampersand(rawdata)
-    return [split_string(rd) if len(rd) > 0 else rd for rd in rawdata]
+    preprocessed = preprocess(rawdata, defines)
+    statements = map_statements(
+        assemble_statements(preprocessed.lines,
+                            detect_form(filename, rawdata)),
+        preprocessed.line_map)
+    data = [split_string(st.text) if len(st.text) > 0 else st.text
+            for st in statements]
+    return data, statements
 
 
-def separate_scope(data: List[str]) -> List[SimpleNamespace]:
+def separate_scope(data: List[str]) -> List[Scope]:
     """Find the scope regions of the data
 
+    The data of a scope stops at its 'contains' statement, iend at its end
+    statement: the procedures it contains also see its imports.
+
     Args:
         data (List[str]): data read in the file
 
     Returns:
         List[List[str]]: each scope separated
     """
-
-    # identifier for scoping
-    start_keyword = ['subroutine', 'function', 'module']
-    end_keyword = ['end', 'end\n']
-
-    # get the index of start/end scope
-    name, idx_start, idx_end = [], [], []
-    for i, d in enumerate(data):
-
-        if len(d) == 0:
-            continue
-
-        if d[0] in start_keyword:
-            idx_start.append(i)
-            name.append(d[1].split('(')[0])
-
-        if d[0] in end_keyword:
-            idx_end.append(i)
-
-    return [SimpleNamespace(name=name, istart=istart, data=data[istart:iend], module=[]) for name, istart, iend in zip(name, idx_start, idx_end)]
+    tree = scope_tree(data)
+    return [Scope(node.name, node.istart, node.iend,
+                  data[node.istart:node.body_end], tree.tokens)
+            for node in tree.scopes()]
 
 
 def find_import_var(scope: SimpleNamespace) -> SimpleNamespace:
@@ -135,64 +104,59 @@ def find_import_var(scope: SimpleNamespace) -> SimpleNamespace:
             if s[0] == 'use' and s[2].startswith('only'):
 
                 module_name = s[1].rstrip('\n')
-                mod = SimpleNamespace(
-                    name=module_name, iline=iline, total_count=0)
-                mod.var = []
+                mod = UseImport(module_name, iline)
 
                 for icol in range(3, len(s)):
                     varname = s[icol].rstrip('\n')
                     if len(varname) > 0:
-                        mod.var.append(SimpleNamespace(name=varname,
-                                                       count=None))
+                        mod.var.append(ImportedVar(varname))
 
                 scope.module.append(mod)
 
     return scope
 
 
-def count_var(scope: SimpleNamespace) -> SimpleNamespace:
+def count_var(scope: SimpleNamespace,
+              kept: Optional[Counter] = None) -> SimpleNamespace:
     """[summary]
 
     Args:
         scope (SimpleNamespace): [description]
+        kept (Optional[Counter]): occurrences of the lowercase names to
+                                  count too, e.g. from inactive_names
 
     Returns:
         SimpleNamespace: [description]
     """
-    # Avoid to count variables in commented lines:
-    exclude = ["c", "C", "!"]
-    data_copy = [var for index, var in enumerate(scope.data)
-                 if var[0] not in exclude]
+    # Avoid to count variables in use statements, the ones of the
+    # contained procedures included; the store leaves the comments and
+    # strings out, the identifiers are counted in one pass:
+    store = scope.tokens
+    use = store.symbols.lookup('use')
+    indexes = []
+    for index in range(scope.istart, scope.iend):
+        ids = store.statement_ids(index)
+        if not ids or ids[0] != use:
+            indexes.append(index)
+    counts = store.occurrences(indexes)
 
     for mod in scope.module:
         for var in mod.var:
-            c = count(data_copy, var.name)
+            c = store.tally(counts, var.name)
+            if kept:
+                c += kept[var.name.lower()]
             var.count = c
             mod.total_count += c
     return scope
 
 
-def count(scope_data: List[str], varname: str) -> int:
-    """Count the number of time a variable appears in the
-
-    Args:
-        scope_data (List[str]): data of the scope
-        var (str): name of the vairable
-
-    Returns:
-        int: count
-    """
-    joined_data = ' ' + \
-        ' '.join(flatten_string_list(scope_data)) + ' '
-    pattern = re.compile('[\W\s]' + varname + '[\W\s]', re.IGNORECASE)
-    return len(pattern.findall(joined_data))-1
-
-
-def clean_raw_data(rawdata: List[str], scope: SimpleNamespace) -> List[str]:
+def clean_raw_data(rawdata: List[str], statements: List[Statement],
+                   scope: SimpleNamespace) -> List[str]:
     """
 
     Args:
         rawdata (List[str]): [description]
+        statements (List[Statement]): statements of rawdata
         scope (SimpleNamespace): [description]
 
     Returns:
@@ -202,35 +166,27 @@ def clean_raw_data(rawdata: List[str], scope: SimpleNamespace) -> List[str]:
     for mod in scope.module:
 
         print('  --  Module : %s' % mod.name)
-        idx_rawdata = scope.istart + mod.iline
+        statement = statements[scope.istart + mod.iline]
 
         if mod.total_count == 0:
             print('      No variable called, removing the entire module')
-            rawdata[idx_rawdata] = ''
-            idx_rawdata += 1
-            while rawdata[idx_rawdata].lstrip(' ').startswith('&'):
-                rawdata[idx_rawdata] = ''
-                idx_rawdata += 1
+            rawdata = replace_statement(rawdata, statement, '')
 
         else:
 
-            ori_line = rawdata[idx_rawdata]
-            line = ori_line.split(
+            ori_line = rawdata[statement.first]
+            head = ori_line.split(
                 'use')[0] + 'use ' + mod.name + ', only: '
 
+            names = []
             for var in mod.var:
                 if var.count != 0:
-                    line += var.name + ', '
+                    names.append(var.name)
                 else:
                     print('  ---   removing unused variable %s' %
                           var.name)
-            rawdata[idx_rawdata] = line.rstrip(', ') + '\n'
-
-            # remove the unwanted
-            idx_rawdata += 1
-            while rawdata[idx_rawdata].lstrip(' ').startswith('&'):
-                rawdata[idx_rawdata] = ''
-                idx_rawdata += 1
+            rawdata = replace_statement(
+                rawdata, statement, format_statement(statement, head, names))
 
     return rawdata
 
@@ -281,7 +237,11 @@ def clean_use_statement(filename: str, overwrite: bool = False) -> List[SimpleNa
     rawdata = read_file(filename)
 
     # splitted data
-    data = process_data(rawdata)
+    data, statements = process_data(rawdata, filename)
+
+    # the names used by the other builds of the file
+    kept = inactive_names(rawdata, statements,
+                          detect_form(filename, rawdata))
 
     # separate in scope
     scoped_data = separate_scope(data)
@@ -295,10 +255,10 @@ def clean_use_statement(filename: str, overwrite: bool = False) -> List[SimpleNa
         scope = find_import_var(scope)
 
         # count the number of var calls per var per module in scope
-        scope = count_var(scope)
+        scope = count_var(scope, kept)
 
         # clean the raw data
-        rawdata = clean_raw_data(rawdata, scope)
+        rawdata = clean_raw_data(rawdata, statements, scope)
 
     # save file copy
     if overwrite:
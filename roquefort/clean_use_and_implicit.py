@@ -1,60 +1,39 @@
 #!/usr/bin/env python
 import os
+from itertools import chain, islice
 from types import SimpleNamespace
-from typing import List
+from typing import Dict, List, Optional, Tuple
 from roquefort.io_utils import read_file, save_file, get_new_filename, rise_error
 from roquefort.scope_utils import separate_scope, fill_scopes, modify_rawdata, modify_rawdata_move_var
 from roquefort.string_utils import split_rawdata
+from roquefort.statements import Statement, assemble_statements
+from roquefort.scope_tree import forget_tree, read_units
+from roquefort.source_form import SNIFF_LINES, detect_form
+from roquefort.preprocessor import map_statements, parse_defines, preprocess
 import argparse
 
 
-def replace_ampersand(rawdata: List[str]) -> List[List[str]]:
-    """[summary]
+def replace_implicit_real(rawdata: List[str]) -> List[str]:
+    """Replace 'implicit real*8(a-h,o-z)' by 'implicit none'.
 
-    Args:
-        rawdata (List[str]): [description]
+    :param rawdata: Plain rawdata as read from the read_file function.
 
-    Returns:
-        List[List[str]]: [description]
+    :return: rawdata input with the implicit real replaced by none.
     """
-
-    for il, rd in enumerate(rawdata):
-        if len(rd) > 0:
-            if rd.lstrip(' ').startswith('use'):
-                next_line = il+1
-                while rawdata[next_line].lstrip(' ').startswith('&'):
-                    name = rd.split()[1].lstrip(',').rstrip(',')
-                    rawdata[next_line] = rawdata[next_line].replace(
-                        '&', ' use %s, only: ' % name)
-                    next_line += 1
-            if rd.lstrip(' ').startswith('parameter'):
-                if rd.lstrip(' ').startswith('parameter('):
-                    rawdata[il] = \
-                        rawdata[il].replace(
-                            "parameter(", "parameter (")
-                next_line = il+1
-                while rawdata[next_line].lstrip(' ').startswith('&'):
-                    rawdata[il] = rawdata[il].rstrip(
-                        "\n").rstrip(",") + ")"
-                    rawdata[next_line] = rawdata[next_line].\
-                        replace('&,', '&').replace(
-                            '&', ' parameter (')
-                    next_line += 1
-            if rd.lstrip(' ').startswith('dimension'):
-                next_line = il+1
-                while rawdata[next_line].lstrip(' ').startswith('&'):
-                    rawdata[next_line] = rawdata[next_line].\
-                        replace('&,', '&').replace('&', ' dimension ')
-                    next_line += 1
+    if not _replace_implicit_real(rawdata):
+        rise_error(file=os.path.basename(__file__),
+                   function=replace_implicit_real.__name__,
+                   type='NameError',
+                   message="There is no implicit declaration!")
     return rawdata
 
 
-def replace_implicit_real(rawdata: List[str]) -> List[str]:
-    """Replace 'implicit real*8(a-h,o-z)' by 'implicit none'.
+def _replace_implicit_real(rawdata: List[str]) -> bool:
+    """Replace the implicit real of rawdata, in place.
 
-    :param rawdata: Plain rawdata as read from the read_file function.
+    :param rawdata: Plain rawdata, or a part of it.
 
-    :return: rawdata input with the implicit real replaced by none.
+    :return: True if rawdata holds an implicit declaration.
     """
     implicit_declaration = False
     for index, rd in enumerate(rawdata):
@@ -67,30 +46,43 @@ def replace_implicit_real(rawdata: List[str]) -> List[str]:
         elif rd.lstrip(' ').lower().startswith('implicit real*8'):
             rawdata[index] = "      implicit none\n\n"
             implicit_declaration = True
+    return implicit_declaration
 
-    if not implicit_declaration:
-        rise_error(file=os.path.basename(__file__),
-                   function=replace_implicit_real.__name__,
-                   type='NameError',
-                   message="There is no implicit declaration!")
-    return rawdata
 
+def process_data(rawdata: List[str], clean_implicit: bool,
+                 filename: Optional[str] = None,
+                 defines: Optional[Dict[str, str]] = None,
+                 cache_dir: Optional[str] = None,
+                 form: Optional[str] = None) -> \
+        Tuple[List[List[str]], List[Statement]]:
+    """Split the raw data into chunks, one per logical statement.
 
-def process_data(rawdata: List[str], clean_implicit: bool) -> List[List[str]]:
-    """Split the raw data into chunks
+    The preprocessor directives are evaluated first, the statements refer
+    to the lines of rawdata. The implicit real is replaced in rawdata once
+    the chunks are made, their 'implicit' statements typing the variables
+    to declare.
 
     Args:
         rawdata (List[str]): [description]
+        filename (Optional[str]): name of the file, to detect its form
+        defines (Optional[Dict[str, str]]): macros of the preprocessor
+        cache_dir (Optional[str]): where to cache the preprocessed files
+        form (Optional[str]): form of the file, detected if not given
 
     Returns:
-        List[List[str]]: [description]
+        Tuple[List[List[str]], List[Statement]]: the chunks and the
+                                                 statements they come from
     """
 
+    if form is None:
+        form = detect_form(filename, rawdata)
+    preprocessed = preprocess(rawdata, defines, cache_dir)
+    statements = map_statements(
+        assemble_statements(preprocessed.lines, form), preprocessed.line_map)
+    data = split_rawdata([st.text for st in statements], form)
     if clean_implicit:
         rawdata = replace_implicit_real(rawdata)
-    rawdata = replace_ampersand(rawdata)
-    rawdata = split_rawdata(rawdata)
-    return rawdata
+    return data, statements
 
 
 def clean_statements(args: argparse.ArgumentParser) -> \
@@ -101,7 +93,8 @@ def clean_statements(args: argparse.ArgumentParser) -> \
 
     :param args: argparse arguments, namely:
                     args.filename,
-                    args.overwrite.
+                    args.overwrite,
+                    args.jobs.
 
     :return: List[] of SimpleNamespace cotaining the scooped data.
     """
@@ -120,18 +113,23 @@ def clean_statements(args: argparse.ArgumentParser) -> \
     # Read the data file and split it:
     rawdata = read_file(args.filename)
     
+    form = detect_form(args.filename, rawdata)
+
     # Prepare data to be splitted in scopes, remove &'s, implicit real, etc:
-    data = process_data(rawdata, clean_implicit)
+    data, statements = process_data(rawdata, clean_implicit,
+                                    args.filename,
+                                    parse_defines(args.define),
+                                    args.cache_dir, form)
    
     # Separate in scope:
     scopes = separate_scope(data)
     
     # Fill attributes of scopes:
-    scopes = fill_scopes(rawdata, scopes, clean_implicit)
+    scopes = fill_scopes(rawdata, scopes, clean_implicit, jobs=args.jobs)
 
     # Modify rawdata according to scopes and flag options:
-    modified_rawdata = modify_rawdata(rawdata,
-                                      scopes, clean_use, clean_implicit)
+    modified_rawdata = modify_rawdata(rawdata, statements,
+                                      scopes, clean_use, clean_implicit, form)
 
     # save file copy
     if args.overwrite:
@@ -142,13 +140,71 @@ def clean_statements(args: argparse.ArgumentParser) -> \
 
     return scopes
 
+def stream_statements(args: argparse.ArgumentParser):
+    """Clean 'use' or 'implicit real' statements as clean_statements does,
+    one top-level program unit at a time: only the unit being cleaned is
+    held in memory. The output is written next to its final name, and
+    moved there once the whole file is cleaned.
+
+    :param args: argparse arguments, namely:
+                    args.filename,
+                    args.overwrite,
+                    args.jobs.
+    """
+    print('=')
+    print('= Clean Use Statements from %s' % args.filename)
+    print('=')
+
+    clean_use = args.command == "clean_use"
+    clean_implicit = args.command == "clean_implicit"
+    defines = parse_defines(args.define)
+    if args.overwrite:
+        filename = args.filename
+    else:
+        filename = get_new_filename(args.filename)
+    partial = filename + '.part'
+
+    implicit_declaration = False
+    try:
+        with open(args.filename, 'r') as f, open(partial, 'w') as out:
+            # (the form is told by the first lines, as for the whole file)
+            head = list(islice(f, SNIFF_LINES))
+            form = detect_form(args.filename, head)
+            for rawdata in read_units(chain(head, f), form):
+                data, statements = process_data(rawdata, False,
+                                                defines=defines,
+                                                cache_dir=args.cache_dir,
+                                                form=form)
+                if clean_implicit:
+                    implicit_declaration |= _replace_implicit_real(rawdata)
+                scopes = fill_scopes(rawdata, separate_scope(data),
+                                     clean_implicit, jobs=args.jobs)
+                out.writelines(modify_rawdata(rawdata, statements, scopes,
+                                              clean_use, clean_implicit,
+                                              form))
+                forget_tree(data)
+        if clean_implicit and not implicit_declaration:
+            rise_error(file=os.path.basename(__file__),
+                       function=replace_implicit_real.__name__,
+                       type='NameError',
+                       message="There is no implicit declaration!")
+    except BaseException:
+        os.remove(partial)
+        raise
+
+    os.replace(partial, filename)
+    print('=')
+    print('= Output file written in %s' % filename)
+
+
 def move_variable(args: argparse.ArgumentParser) -> \
         List[SimpleNamespace]:
     """Move a variable from one module to another
 
     :param args: argparse arguments, namely:
                     args.filename,
-                    args.overwrite.
+                    args.overwrite,
+                    args.jobs.
 
     :return: List[] of SimpleNamespace cotaining the scooped data.
     """
@@ -162,17 +218,22 @@ def move_variable(args: argparse.ArgumentParser) -> \
     rawdata = read_file(args.filename)
     
     # Prepare data to be splitted in scopes, remove &'s, implicit real, etc:
-    data = process_data(rawdata, clean_implicit=False)
+    data, statements = process_data(rawdata, clean_implicit=False,
+                                    filename=args.filename,
+                                    defines=parse_defines(args.define),
+                                    cache_dir=args.cache_dir)
    
     # Separate in scope:
     scopes = separate_scope(data)
     
     # Fill attributes of scopes:
-    scopes = fill_scopes(rawdata, scopes, clean_implicit=False)
+    scopes = fill_scopes(rawdata, scopes, clean_implicit=False,
+                         jobs=args.jobs)
     
     # Modify rawdata according to scopes and flag options:
-    modified_rawdata, rewrite = modify_rawdata_move_var(rawdata, scopes, 
-                                       args.var_name, args.new_module, args.from_module)
+    modified_rawdata, rewrite = modify_rawdata_move_var(
+        rawdata, statements, scopes, args.var_name, args.new_module,
+        args.from_module)
 
     # save file copy
     if rewrite:
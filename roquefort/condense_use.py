@@ -1,5 +1,8 @@
 from roquefort.scope_utils import separate_scope, fill_scopes
-from roquefort.clean_use_and_implicit import split_rawdata, replace_ampersand
+from roquefort.statements import assemble_statements, replace_statement
+from roquefort.preprocessor import map_statements, parse_defines, preprocess
+from roquefort.source_form import detect_form
+from roquefort.string_utils import split_rawdata
 from collections import defaultdict
 
 
@@ -31,7 +34,7 @@ def create_newline(module, values, max_line, min_only_offset):
 
 
 def condense_use(*, overwrite, filename, max_line_length, min_only_offset,
-                 sort, **_):
+                 sort, define=None, cache_dir=None, jobs=1, **_):
     """condense_use.
 
     Parameters
@@ -42,24 +45,35 @@ def condense_use(*, overwrite, filename, max_line_length, min_only_offset,
         filename
     max_line_length :
         max_line_length
+    define :
+        macros of the preprocessor, as NAME or NAME=VALUE
+    cache_dir :
+        where to cache the preprocessed files
+    jobs :
+        number of processes analysing the scopes
         _
     """
 
     # Read the data file and split it:
     with open(filename, "r") as f:
         rawdata = f.readlines()
-    no_amp = replace_ampersand(rawdata)
-    splitted = split_rawdata(no_amp)
+    form = detect_form(filename, rawdata)
+    preprocessed = preprocess(rawdata, parse_defines(define), cache_dir)
+    statements = map_statements(
+        assemble_statements(preprocessed.lines, form), preprocessed.line_map)
+    splitted = split_rawdata([st.text for st in statements], form)
     scopes = separate_scope(splitted)
-    fill_scopes(rawdata, scopes, clean_implicit=False, also_no_only=True)
+    fill_scopes(rawdata, scopes, clean_implicit=False, also_no_only=True,
+                jobs=jobs)
 
     for scope in scopes:
         condensed_modules = defaultdict(list)
         min_line = len(rawdata)
         for modul in scope.module:
             condensed_modules[modul.name] += [var.name for var in modul.var]
-            min_line = min(modul.iline + scope.istart, min_line)
-            rawdata[modul.iline + scope.istart] = ''
+            statement = statements[modul.iline + scope.istart]
+            min_line = min(statement.first, min_line)
+            rawdata = replace_statement(rawdata, statement, '')
 
         if sort:
             condensed_modules = dict(sorted(condensed_modules.items()))
@@ -0,0 +1,391 @@
+"""Parser of the declaration statements, filling the symbol tables of the
+scopes.
+
+The type declarations are read as in the standard: the type spec and its
+kind or length selector, the attributes, the optional '::' and the
+entities with their array spec, character length and initializer. The
+'dimension' and 'parameter' statements add to the symbols they name.
+
+The 'implicit' statements of a scope are compiled into a table of the
+implicit type of each initial letter, over the table of its host.
+"""
+import string
+from typing import Dict, Iterable, List, Optional, Tuple
+from roquefort.lexer import COMMENT, IDENTIFIER, KEYWORD, LABEL, tokenize
+from roquefort.records import Symbol
+from roquefort.spans import TokenLine, fold_case
+
+# Intrinsic types, as the words they are written with:
+_TYPES = {
+    'integer': 'integer',
+    'real': 'real',
+    'complex': 'complex',
+    'logical': 'logical',
+    'character': 'character',
+    'doubleprecision': 'double precision',
+    'doublecomplex': 'double complex',
+}
+_DERIVED = ('type', 'class')
+_NAMES = (IDENTIFIER, KEYWORD)
+
+# The implicit types of the letters without 'implicit' statement: i to n
+# are integer, the others real:
+IMPLICIT_DEFAULT = tuple('integer' if 'i' <= letter <= 'n' else 'real'
+                         for letter in string.ascii_lowercase)
+
+
+class _Tokens:
+    """The code tokens of a statement, with their text."""
+
+    __slots__ = ('text', 'lower', 'tokens', 'index')
+
+    def __init__(self, text: str, start: int, end: int, lower: str):
+        self.text = text
+        self.lower = lower
+        self.tokens = [t for t in tokenize(text, start, end, False)
+                       if t.kind != COMMENT]
+        if self.tokens and self.tokens[0].kind == LABEL:
+            del self.tokens[0]
+        self.index = 0
+
+    def peek(self, offset: int = 0) -> str:
+        """The lowercase text of a coming token, '' at the end."""
+        index = self.index + offset
+        if index >= len(self.tokens):
+            return ''
+        token = self.tokens[index]
+        return self.lower[token.start:token.end]
+
+    def kind(self) -> Optional[str]:
+        """The kind of the current token, None at the end."""
+        if self.index >= len(self.tokens):
+            return None
+        return self.tokens[self.index].kind
+
+    def take(self) -> str:
+        """Read a token, in its original case, '' at the end."""
+        if self.index >= len(self.tokens):
+            return ''
+        token = self.tokens[self.index]
+        self.index += 1
+        return self.text[token.start:token.end]
+
+    def group(self) -> str:
+        """Read a parenthesized group, without its whitespace."""
+        first, depth = self.index, 0
+        while self.index < len(self.tokens):
+            text = self.peek()
+            depth += (text in ('(', '[')) - (text in (')', ']'))
+            self.index += 1
+            if depth == 0:
+                break
+        return self._text(first)
+
+    def expression(self) -> str:
+        """Read an expression, up to the next ',' outside of parentheses."""
+        first, depth = self.index, 0
+        while self.index < len(self.tokens):
+            text = self.peek()
+            if depth == 0 and text in (',', ')'):
+                break
+            depth += (text in ('(', '[')) - (text in (')', ']'))
+            self.index += 1
+        return self._text(first)
+
+    def _text(self, first: int) -> str:
+        """Text of the tokens read from first on, without the whitespace
+        between them."""
+        return ''.join(self.text[t.start:t.end]
+                       for t in self.tokens[first:self.index])
+
+
+def parse_declaration(text: str, start: int = 0, end: Optional[int] = None,
+                      lower: Optional[str] = None) -> Optional[List[Symbol]]:
+    """Parse a type declaration, 'dimension' or 'parameter' statement.
+
+    Args:
+        text (str): the statement, or a buffer containing it
+        start (int, optional): offset of the statement in the buffer
+        end (Optional[int], optional): end of the statement in the buffer
+        lower (Optional[str], optional): the buffer folded to lowercase
+
+    Returns:
+        Optional[List[Symbol]]: the declared symbols, None if the statement
+                                is not a declaration
+    """
+    if end is None:
+        end = len(text)
+    if lower is None:
+        lower = fold_case(text)
+    tokens = _Tokens(text, start, end, lower)
+    first = tokens.peek()
+    if first == 'dimension':
+        tokens.index += 1
+        if tokens.peek() == '::':
+            tokens.index += 1
+        return _entities(tokens, None, None, ('dimension', ), None)
+    if first == 'parameter':
+        tokens.index += 1
+        return _parameters(tokens)
+
+    spec = _type_spec(tokens)
+    if spec is None:
+        return None
+    attributes, dimensions = _attributes(tokens)
+    if attributes is None:
+        return None
+    if tokens.peek() == '::':
+        tokens.index += 1
+    elif tokens.peek() == 'function' or attributes:
+        # a typed function, or attributes without '::'
+        return None
+    return _entities(tokens, spec[0], spec[1], attributes, dimensions)
+
+
+def parse_statement(sd: TokenLine) -> Optional[List[Symbol]]:
+    """Parse the declaration statement of a line of words.
+
+    Args:
+        sd (TokenLine): the words of the statement
+
+    Returns:
+        Optional[List[Symbol]]: the declared symbols, None if the statement
+                                is not a declaration
+    """
+    return parse_declaration(sd.buffer, sd.start, sd.end, sd.lower)
+
+
+def declare(symbols: Dict[str, Symbol], symbol: Symbol) -> Symbol:
+    """Add a symbol to a symbol table, merging it with the symbol of the
+    same name, e.g. a 'dimension' statement after the type declaration.
+
+    Args:
+        symbols (Dict[str, Symbol]): the table, by lowercase name
+        symbol (Symbol): the declared symbol
+
+    Returns:
+        Symbol: the symbol of the table
+    """
+    key = symbol.name.lower()
+    known = symbols.get(key)
+    if known is None:
+        symbols[key] = symbol
+        return symbol
+    if symbol.type is not None:
+        known.type, known.kind = symbol.type, symbol.kind
+    known.attributes += tuple(attribute for attribute in symbol.attributes
+                              if attribute not in known.attributes)
+    if symbol.dimensions is not None:
+        known.dimensions = symbol.dimensions
+    if symbol.initializer is not None:
+        known.initializer = symbol.initializer
+    return known
+
+
+def _type_spec(tokens: _Tokens) -> Optional[Tuple[str, Optional[str]]]:
+    """Read the type and its kind or length selector."""
+    word = tokens.peek()
+    if word == 'double':
+        word += tokens.peek(1)
+        tokens.index += 1
+    if word in _TYPES:
+        tokens.index += 1
+        kind = None
+        if tokens.peek() == '*':
+            tokens.index += 1
+            kind = '*' + (tokens.group() if tokens.peek() == '('
+                          else tokens.take())
+        elif tokens.peek() == '(':
+            kind = tokens.group()
+        return _TYPES[word], kind
+    if word in _DERIVED and tokens.peek(1) == '(':
+        tokens.index += 1
+        return word + tokens.group().lower(), None
+    return None
+
+
+def _attributes(tokens: _Tokens) -> Tuple[Optional[Tuple[str, ...]],
+                                          Optional[str]]:
+    """Read the attributes, and the array spec of the dimension one."""
+    attributes, dimensions = [], None
+    while tokens.peek() == ',':
+        tokens.index += 1
+        if tokens.kind() not in _NAMES:
+            return None, None
+        attribute = tokens.take().lower()
+        if tokens.peek() == '(':
+            argument = tokens.group()
+            if attribute == 'dimension':
+                dimensions = argument
+            else:
+                attribute += argument.lower()
+        attributes.append(attribute)
+    return tuple(attributes), dimensions
+
+
+def _entities(tokens: _Tokens, type_: Optional[str], kind: Optional[str],
+              attributes: Tuple[str, ...],
+              dimensions: Optional[str]) -> Optional[List[Symbol]]:
+    """Read the declared entities, up to the end of the statement."""
+    symbols = []
+    while True:
+        if tokens.kind() not in _NAMES:
+            return None
+        name = tokens.take()
+        shape = tokens.group() if tokens.peek() == '(' else dimensions
+        length = kind
+        if tokens.peek() == '*':
+            tokens.index += 1
+            length = '*' + (tokens.group() if tokens.peek() == '('
+                            else tokens.take())
+        initializer = None
+        if tokens.peek() in ('=', '=>'):
+            tokens.index += 1
+            initializer = tokens.expression()
+        symbols.append(Symbol(name, type_, length, attributes, shape,
+                              initializer))
+        if not tokens.peek():
+            return symbols
+        if tokens.peek() != ',':
+            return None
+        tokens.index += 1
+
+
+def _parameters(tokens: _Tokens) -> Optional[List[Symbol]]:
+    """Read the named constants of a 'parameter' statement."""
+    if tokens.peek() != '(':
+        return None
+    tokens.index += 1
+    symbols = []
+    while tokens.kind() in _NAMES:
+        name = tokens.take()
+        if tokens.peek() != '=':
+            return None
+        tokens.index += 1
+        symbols.append(Symbol(name, None, None, ('parameter', ), None,
+                              tokens.expression()))
+        if tokens.peek() == ',':
+            tokens.index += 1
+    if tokens.peek() != ')' or tokens.peek(1):
+        return None
+    return symbols
+
+
+def parse_implicit(text: str, start: int = 0, end: Optional[int] = None,
+                   lower: Optional[str] = None) -> \
+        Optional[List[Tuple[Optional[str], str]]]:
+    """Parse an 'implicit' statement.
+
+    Args:
+        text (str): the statement, or a buffer containing it
+        start (int, optional): offset of the statement in the buffer
+        end (Optional[int], optional): end of the statement in the buffer
+        lower (Optional[str], optional): the buffer folded to lowercase
+
+    Returns:
+        Optional[List[Tuple[Optional[str], str]]]: the types, with their
+            kind, and the letters they apply to, a None type for
+            'implicit none'; None if it is not an 'implicit' statement
+    """
+    if end is None:
+        end = len(text)
+    if lower is None:
+        lower = fold_case(text)
+    tokens = _Tokens(text, start, end, lower)
+    if tokens.peek() != 'implicit':
+        return None
+    tokens.index += 1
+    if tokens.peek() == 'none':
+        return [(None, string.ascii_lowercase)]
+
+    rules = []
+    while True:
+        spec = _type_spec(tokens)
+        if spec is None:
+            return None
+        type_, kind = spec
+        if tokens.peek() == '(':
+            letters = tokens.group()
+        elif kind is not None and kind.startswith('('):
+            # 'real (a-h)': the group was the letters, not the kind
+            letters, kind = kind, None
+        else:
+            return None
+        rules.append((type_ + (kind or ''), _letters(letters.lower())))
+        if not tokens.peek():
+            return rules
+        if tokens.peek() != ',':
+            return None
+        tokens.index += 1
+
+
+def compile_implicit(statements: Iterable[List[Tuple[Optional[str], str]]],
+                     inherited: Tuple[Optional[str], ...] = IMPLICIT_DEFAULT
+                     ) -> Tuple[Optional[str], ...]:
+    """Compile the 'implicit' statements of a scope into the table of the
+    implicit type of each letter.
+
+    Args:
+        statements (Iterable[List[Tuple[Optional[str], str]]]): the parsed
+            statements, see parse_implicit
+        inherited (Tuple[Optional[str], ...], optional): the table of the
+            host scope
+
+    Returns:
+        Tuple[Optional[str], ...]: the type of each letter from 'a' to 'z',
+                                   None if it has no implicit type
+    """
+    table = list(inherited)
+    for rules in statements:
+        for type_, letters in rules:
+            for letter in letters:
+                table[ord(letter) - 97] = type_
+    return tuple(table)
+
+
+def implicit_type(table: Tuple[Optional[str], ...],
+                  name: str) -> Optional[str]:
+    """Get the implicit type of a name.
+
+    Args:
+        table (Tuple[Optional[str], ...]): see compile_implicit
+        name (str): the name
+
+    Returns:
+        Optional[str]: its type, None if it has no implicit type
+    """
+    index = ord(name[0]) | 32
+    return table[index - 97] if 97 <= index <= 122 else None
+
+
+def refactored_type(table: Tuple[Optional[str], ...], name: str) -> str:
+    """Get the type an undeclared name is declared with in the refactored
+    code: its implicit type, the default one under 'implicit none', with
+    the reals and complexes of kind 'dp'.
+
+    Args:
+        table (Tuple[Optional[str], ...]): see compile_implicit
+        name (str): the name
+
+    Returns:
+        str: the type of its declaration
+    """
+    type_ = implicit_type(table, name) or implicit_type(IMPLICIT_DEFAULT,
+                                                        name)
+    if type_ is None or type_.startswith(('real', 'double precision')):
+        return 'real(dp)'
+    if type_.startswith(('complex', 'double complex')):
+        return 'complex(dp)'
+    return type_
+
+
+def _letters(spec: str) -> str:
+    """The letters of a letter spec, e.g. '(a-h,o-z)'."""
+    letters = []
+    for item in spec.strip('()').split(','):
+        first, _, last = item.partition('-')
+        last = last or first
+        if len(first) != 1 or len(last) != 1 or not first <= last:
+            continue
+        letters.extend(chr(c) for c in range(ord(first), ord(last) + 1))
+    return ''.join(c for c in letters if c in string.ascii_lowercase)
@@ -2,18 +2,9 @@
 from types import SimpleNamespace
 from typing import List, Optional, Tuple
 import re
-
-
-def flatten_string_list(l: List[List[str]]) -> List[str]:
-    """Flatten a list of list of str
-
-    Args:
-        l (List[List[str]]): [description]
-
-    Returns:
-        List[str]: [description]
-    """
-    return [item for sublist in l for item in sublist]
+from roquefort.project_index import DEFAULT_INDEX_DIR, ProjectIndex
+from roquefort.records import Scope
+from roquefort.scope_tree import scope_tree
 
 
 def split_string(s: str, delimiters: str = ' |, | ,|,') -> List[str]:
@@ -65,7 +56,7 @@ def process_data(rawdata: List[str]) -> List[List[str]]:
     # return [split_string(rd) if len(rd) > 0 else rd for rd in rawdata]
 
 
-def separate_scope(data: List[str]) -> List[SimpleNamespace]:
+def separate_scope(data: List[str]) -> List[Scope]:
     """Find the scope regions of the data
 
     Args:
@@ -74,26 +65,9 @@ def separate_scope(data: List[str]) -> List[SimpleNamespace]:
     Returns:
         List[List[str]]: each scope separated
     """
-
-    # identifier for scoping
-    start_keyword = ['subroutine', 'function', 'module']
-    end_keyword = ['end', 'end\n']
-
-    # get the index of start/end scope
-    name, idx_start, idx_end = [], [], []
-    for i, d in enumerate(data):
-
-        if len(d) == 0:
-            continue
-
-        if d[0] in start_keyword:
-            idx_start.append(i)
-            name.append(d[1].split('(')[0])
-
-        if d[0] in end_keyword:
-            idx_end.append(i)
-
-    return [SimpleNamespace(name=name, istart=istart, data=data[istart:iend]) for name, istart, iend in zip(name, idx_start, idx_end)]
+    return [Scope(node.name, node.istart, node.body_end,
+                  data[node.istart:node.body_end])
+            for node in scope_tree(data).scopes()]
 
 
 def get_all_var(filename: str) -> List[str]:
@@ -128,50 +102,40 @@ def get_all_var(filename: str) -> List[str]:
     return scope, modules
 
 
-def count_var(filename: str, modules: SimpleNamespace) -> List[int]:
-    """[summary]
+def count_var(filename: str, modules: SimpleNamespace,
+              index: Optional[ProjectIndex] = None) -> List[int]:
+    """Count the uses of the variables of the modules spelled in another
+    case than in their module.
+
+    The uses are looked up in the index of the project if given, else the
+    file is indexed in memory: strings, comments and implicit statements
+    are left out the same way.
 
     Args:
-        scope (SimpleNamespace): [description]
+        filename (str): the file to search
+        modules (SimpleNamespace): the modules and their variables
+        index (Optional[ProjectIndex]): the index of the project, up to
+                                        date for the file
 
     Returns:
-        SimpleNamespace: [description]
+        List[int]: the count of each variable, module by module
     """
-
-    data = process_data(read_file(filename))
+    if index is None:
+        index = ProjectIndex(None)
+        index.update([filename])
+    counts = []
     for m in modules:
         for var in m.var:
-            c, srch = count(data, var.swapcase())
+            c = len(index.postings(var, [filename], skip=['implicit'])) - \
+                len(index.postings(var, [filename], exact=True,
+                                   skip=['implicit']))
+            counts.append(c)
             if c > 0:
                 print(' -- %s' % filename)
-                print('    found %s of %s ' %
-                      (var.swapcase(), m.name))
-                # for s in srch:
-                #     print('    ', s)
+                print('    found %s in another case, of %s ' %
+                      (var, m.name))
 
-    return scope
-
-
-def count(scope_data: List[str], varname: str) -> int:
-    """Count the number of time a variable appears in the
-
-    Args:
-        scope_data (List[str]): data of the scope
-        var (str): name of the vairable
-
-    Returns:
-        int: count
-    """
-    joined_data = ' ' + \
-        ' '.join(flatten_string_list(scope_data)) + ' '
-    pattern = re.compile('[\W\s]' + varname + '[\W\s]')
-    c = len(pattern.findall(joined_data))
-    contxt = []
-    if c > 0:
-        srch = pattern.finditer(joined_data)
-        for s in srch:
-            contxt.append(joined_data[s.span()[0]-5:s.span()[1]+5])
-    return c, contxt
+    return counts
 
 
 if __name__ == "__main__":
@@ -185,7 +149,13 @@ if __name__ == "__main__":
 
     parser.add_argument(
         '-ow', '--overwrite', action='store_true', help='overwrite the inputfile')
+
+    parser.add_argument(
+        '--index_dir', default=DEFAULT_INDEX_DIR,
+        help='directory of the index of the identifiers of the project')
     args = parser.parse_args()
 
     scope, modules = get_all_var(args.modulefile)
-    count_var(args.filename, modules)
+    index = ProjectIndex(args.index_dir)
+    index.update([args.filename])
+    count_var(args.filename, modules, index)
@@ -0,0 +1,202 @@
+"""Single-pass lexer for Fortran source lines."""
+from array import array
+from typing import List, NamedTuple, Optional
+import re
+
+# Token kinds
+IDENTIFIER = 'identifier'
+KEYWORD = 'keyword'
+NUMBER = 'number'
+OPERATOR = 'operator'
+STRING = 'string'
+COMMENT = 'comment'
+LABEL = 'label'
+LOGICAL = 'logical'
+
+# Kind of the characters of a line that are neither string nor comment:
+CODE = 'code'
+# Kind of the words made of a single literal constant:
+LITERAL = 'literal'
+
+# Fortran has no reserved words, a KEYWORD token may still be a variable
+# name: the kind is a hint for the statement-level logic, not a verdict.
+KEYWORDS = frozenset([
+    'allocatable', 'allocate', 'backspace', 'call', 'character', 'close',
+    'common', 'complex', 'contains', 'continue', 'cycle', 'data',
+    'deallocate', 'dimension', 'do', 'double', 'else', 'elseif', 'end',
+    'enddo', 'endif', 'entry', 'equivalence', 'exit', 'external', 'format',
+    'function', 'go', 'goto', 'if', 'implicit', 'include', 'integer',
+    'intent', 'interface', 'intrinsic', 'logical', 'module', 'none', 'only',
+    'open', 'optional', 'parameter', 'pointer', 'precision', 'print',
+    'private', 'program', 'public', 'read', 'real', 'return', 'rewind',
+    'save', 'stop', 'subroutine', 'then', 'to', 'use', 'while', 'write'
+])
+
+# Patterns of the tokens, shared with the word scanners of string_utils:
+STRING_PATTERN = r"""'(?:[^'\n]|'')*'?|"(?:[^"\n]|"")*"?"""
+KIND_PATTERN = r"(?:_(?:\d+|[a-zA-Z]\w*))?"
+NUMBER_PATTERN = \
+    r"(?:\d+(?:\.(?![a-zA-Z]+\.)\d*)?|\.\d+)(?:[eEdDqQ][+-]?\d+)?" + \
+    KIND_PATTERN
+BOZ_PATTERN = r"""[bBoOzZ](?:'[0-9a-fA-F]+'|"[0-9a-fA-F]+")"""
+LOGICAL_PATTERN = r"\.(?i:true|false)\." + KIND_PATTERN
+NAME_PATTERN = r"[a-zA-Z_]\w*"
+
+_TOKEN_RE = re.compile(
+    r"""
+    \s*(?:
+    (?P<comment>!.*)
+    |(?P<boz>%s)
+    |(?P<string>%s)
+    |(?P<number>%s)
+    |(?P<logical>%s)
+    |(?P<name>%s)
+    |(?P<operator>\.[a-zA-Z]+\.|\*\*|//|::|=>|==|/=|<=|>=|\S)
+    )""" % (BOZ_PATTERN, STRING_PATTERN, NUMBER_PATTERN, LOGICAL_PATTERN,
+            NAME_PATTERN), re.VERBOSE)
+
+# A word made of a single literal, before its separator or end of line:
+_LITERAL_RE = re.compile(r'(?:%s|%s|%s)[,\s]*' % (
+    NUMBER_PATTERN, BOZ_PATTERN, LOGICAL_PATTERN))
+
+# Characters starting a fixed-form comment line in the first column:
+_COMMENT_MARKS = ('c', 'C', '*', '!')
+
+
+class Token(NamedTuple):
+    """A lexed token, as offsets into the lexed text."""
+    start: int
+    end: int
+    kind: str
+
+
+# Build the tokens without the keyword handling of the generated __new__:
+_new_token = tuple.__new__
+
+
+class Mask(NamedTuple):
+    """The character ranges of a line that are not code: the string
+    literals, as flat start/end pairs, and the comment, from its start (None
+    without comment) to the end of the line."""
+    strings: array
+    comment: Optional[int]
+
+
+# Mask of the lines made of code only, shared by all of them:
+NO_MASK = Mask(array('l'), None)
+
+_MASK_RE = re.compile(r'(%s)|!' % STRING_PATTERN)
+
+
+def is_comment_line(line: str, start: int = 0,
+                    end: Optional[int] = None) -> bool:
+    """Check if the line is a whole-line fixed-form comment.
+
+    A 'c' in the first column only opens a comment if it is not the first
+    letter of a statement keyword or name starting in column 1 (e.g. 'call').
+
+    Args:
+        line (str): the physical line, or a buffer containing it
+        start (int, optional): offset of the line in the buffer
+        end (Optional[int], optional): end of the line in the buffer
+
+    Returns:
+        bool: True if the line is a comment
+    """
+    if end is None:
+        end = len(line)
+    if start >= end or line[start] not in _COMMENT_MARKS:
+        return False
+    if line[start] in '*!':
+        return True
+    return start + 1 == end or not (line[start + 1].isalnum()
+                                    or line[start + 1] == '_')
+
+
+def is_literal(text: str, start: int = 0, end: Optional[int] = None) -> bool:
+    """Check if a word is a literal constant: an integer or real number,
+    with its exponent (e, d or q) and kind suffix, a BOZ constant or a
+    logical.
+
+    Args:
+        text (str): the word, or a buffer containing it
+        start (int, optional): offset of the word in the buffer
+        end (Optional[int], optional): end of the word in the buffer
+
+    Returns:
+        bool: True if the word is a literal
+    """
+    if end is None:
+        end = len(text)
+    return _LITERAL_RE.fullmatch(text, start, end) is not None
+
+
+def tokenize(text: str, start: int = 0, end: Optional[int] = None,
+             fixed_form: bool = True) -> List[Token]:
+    """Split a line into typed tokens, walking it only once.
+
+    The tokens are offsets into text, no substring is created.
+
+    Args:
+        text (str): the line, or a buffer containing it
+        start (int, optional): offset of the line in the buffer
+        end (Optional[int], optional): end of the line in the buffer
+        fixed_form (bool, optional): look for the fixed-form comment lines
+
+    Returns:
+        List[Token]: the tokens of the line, whitespace excluded
+    """
+    if end is None:
+        end = len(text)
+    if fixed_form and is_comment_line(text, start, end):
+        if text[end - 1:end] == '\n':
+            end -= 1
+        return [Token(start, end, COMMENT)] if end > start else []
+
+    tokens = []
+    append = tokens.append
+    # Each match swallows the whitespace before its token:
+    for match in _TOKEN_RE.finditer(text, start, end):
+        kind = match.lastgroup
+        if kind is None:
+            continue
+        if kind == 'name':
+            kind = KEYWORD if match[kind].lower() in KEYWORDS else IDENTIFIER
+        elif kind == 'boz':
+            kind = NUMBER
+        elif kind == 'number' and not tokens and match[kind].isdigit():
+            kind = LABEL
+        append(_new_token(Token, match.span(match.lastindex) + (kind, )))
+
+    # A lonely number is a value, not the label of an empty statement:
+    if len(tokens) == 1 and tokens[0].kind == LABEL:
+        tokens[0] = tokens[0]._replace(kind=NUMBER)
+    return tokens
+
+
+def mask_line(text: str, start: int = 0, end: Optional[int] = None,
+              fixed_form: bool = True) -> Mask:
+    """Find the string literals and the comment of a line.
+
+    Args:
+        text (str): the line, or a buffer containing it
+        start (int, optional): offset of the line in the buffer
+        end (Optional[int], optional): end of the line in the buffer
+        fixed_form (bool, optional): look for the fixed-form comment lines
+
+    Returns:
+        Mask: the ranges that are not code
+    """
+    if end is None:
+        end = len(text)
+    if fixed_form and is_comment_line(text, start, end):
+        return Mask(NO_MASK.strings, start)
+    strings, comment = array('l'), None
+    for match in _MASK_RE.finditer(text, start, end):
+        if match.lastindex is None:
+            comment = match.start()
+            break
+        strings.extend(match.span())
+    if not strings:
+        return NO_MASK if comment is None else Mask(NO_MASK.strings, comment)
+    return Mask(strings, comment)
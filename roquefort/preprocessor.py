@@ -0,0 +1,337 @@
+"""Lightweight evaluation of the preprocessor directives of .F/.F90 files.
+
+Only the conditional directives are evaluated: the lines of the inactive
+branches and the directives themselves are left out, with a map from the
+kept lines back to the original ones. Macros are not expanded in the code
+and ``#include`` files are not read, they are only listed.
+"""
+from array import array
+from collections import Counter
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional, Tuple
+import hashlib
+import json
+import operator
+import os
+import re
+from roquefort.statements import Statement
+from roquefort.string_utils import split_rawdata
+
+# Where the command line tools keep the evaluated files:
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+    'roquefort')
+
+_DIRECTIVE_RE = re.compile(r'[ \t]*#[ \t]*([a-z]*)(.*)', re.DOTALL)
+_IDENT_RE = re.compile(r'[a-z_]\w*')
+_C_COMMENT_RE = re.compile(r'/\*.*?\*/|//.*')
+_EXPRESSION_RE = re.compile(
+    r'\s*(?:(\d+)[uUlL]*|([A-Za-z_]\w*)|(&&|\|\||==|!=|<=|>=|[-!<>()+*/%]))')
+
+# Binary operators of #if, with their precedence:
+_BINARY = {
+    '||': (1, lambda a, b: int(bool(a or b))),
+    '&&': (2, lambda a, b: int(bool(a and b))),
+    '==': (3, lambda a, b: int(a == b)),
+    '!=': (3, lambda a, b: int(a != b)),
+    '<': (4, lambda a, b: int(a < b)),
+    '>': (4, lambda a, b: int(a > b)),
+    '<=': (4, lambda a, b: int(a <= b)),
+    '>=': (4, lambda a, b: int(a >= b)),
+    '+': (5, operator.add),
+    '-': (5, operator.sub),
+    '*': (6, operator.mul),
+    '/': (6, lambda a, b: int(a / b) if b else 0),
+    '%': (6, lambda a, b: a % b if b else 0),
+}
+
+# Evaluated files of the run, by cache key:
+_CACHE: Dict[str, Tuple[array, List[str]]] = {}
+
+
+def parse_defines(items: Optional[Iterable[str]]) -> Dict[str, str]:
+    """Read the defines given as on the cpp command line.
+
+    Args:
+        items (Optional[Iterable[str]]): e.g. ['MPI', 'NDIM=3']
+
+    Returns:
+        Dict[str, str]: the values by name, '1' if not given
+    """
+    defines = {}
+    for item in items or ():
+        name, _, value = item.partition('=')
+        defines[name.strip()] = value.strip() if _ else '1'
+    return defines
+
+
+def has_directives(rawdata: List[str]) -> bool:
+    """Check if any line of rawdata is a preprocessor directive."""
+    return any(rd.lstrip(' \t').startswith('#') for rd in rawdata)
+
+
+def preprocess(rawdata: List[str],
+               defines: Optional[Dict[str, str]] = None,
+               cache_dir: Optional[str] = None) -> SimpleNamespace:
+    """Evaluate the conditional directives of a file.
+
+    The result is cached per (content hash, defines) for the run and, if
+    cache_dir is given, on disk for the next runs.
+
+    Args:
+        rawdata (List[str]): the lines of the file
+        defines (Optional[Dict[str, str]], optional): the predefined macros
+        cache_dir (Optional[str], optional): directory of the disk cache
+
+    Returns:
+        SimpleNamespace: lines, the active lines; line_map, the index in
+                         rawdata of each of them; includes, the files of
+                         the active #include directives
+    """
+    if not has_directives(rawdata):
+        return SimpleNamespace(lines=rawdata,
+                               line_map=array('I', range(len(rawdata))),
+                               includes=[])
+    defines = dict(defines or {})
+    key = _cache_key(rawdata, defines)
+    if key not in _CACHE:
+        cached = cache_dir and _load(cache_dir, key)
+        if not cached:
+            cached = _evaluate(rawdata, defines)
+            if cache_dir:
+                _save(cache_dir, key, cached)
+        _CACHE[key] = cached
+    line_map, includes = _CACHE[key]
+    return SimpleNamespace(lines=[rawdata[i] for i in line_map],
+                           line_map=line_map, includes=list(includes))
+
+
+def map_statements(statements: List[Statement],
+                   line_map: array) -> List[Statement]:
+    """Point statements assembled from preprocessed lines back at the
+    original lines.
+
+    Args:
+        statements (List[Statement]): statements of the preprocessed lines
+        line_map (array): index of each preprocessed line in the original
+
+    Returns:
+        List[Statement]: the same statements
+    """
+    for statement in statements:
+        statement.lines = [line_map[i] for i in statement.lines]
+    return statements
+
+
+def inactive_names(rawdata: List[str], statements: List[Statement],
+                   form: str) -> Counter:
+    """Count the identifiers of the lines of rawdata left out by the
+    preprocessor, in the inactive branches of the conditionals.
+
+    The names found there are used by other builds of the file: the tools
+    removing what the statements do not use keep them.
+
+    Args:
+        rawdata (List[str]): the lines of the file
+        statements (List[Statement]): the statements of its active lines
+        form (str): form of the file
+
+    Returns:
+        Counter: the occurrences of the lowercase names
+    """
+    active = set()
+    for statement in statements:
+        active.update(statement.lines)
+    inactive = [rd for index, rd in enumerate(rawdata)
+                if index not in active and not _DIRECTIVE_RE.match(rd)]
+    counts = Counter()
+    for words in split_rawdata(inactive, form):
+        lower = words.lower
+        for start, end in words.code_pieces():
+            counts.update(_IDENT_RE.findall(lower, start, end))
+    return counts
+
+
+def evaluate(expression: str, defines: Dict[str, str]) -> int:
+    """Evaluate the expression of an #if or #elif directive.
+
+    Args:
+        expression (str): e.g. 'defined(MPI) && NDIM > 2'
+        defines (Dict[str, str]): the macros defined so far
+
+    Returns:
+        int: the value, undefined macros being 0
+    """
+    tokens = []
+    index, end = 0, len(expression.rstrip())
+    while index < end:
+        match = _EXPRESSION_RE.match(expression, index)
+        if match is None:
+            raise ValueError('cannot evaluate #if %s' % expression.strip())
+        tokens.append(match.groups())
+        index = match.end()
+    value, index = _parse(tokens, 0, 1, defines)
+    if index != len(tokens):
+        raise ValueError('cannot evaluate #if %s' % expression.strip())
+    return value
+
+
+def _parse(tokens: List[Tuple[str, str, str]], index: int, precedence: int,
+           defines: Dict[str, str]) -> Tuple[int, int]:
+    """Parse the binary operations of at least the given precedence."""
+    value, index = _parse_unary(tokens, index, defines)
+    while index < len(tokens) and tokens[index][2] in _BINARY:
+        level, operation = _BINARY[tokens[index][2]]
+        if level < precedence:
+            break
+        right, index = _parse(tokens, index + 1, level + 1, defines)
+        value = operation(value, right)
+    return value, index
+
+
+def _parse_unary(tokens: List[Tuple[str, str, str]], index: int,
+                 defines: Dict[str, str]) -> Tuple[int, int]:
+    """Parse a number, a macro, defined(...), a unary operation or a
+    parenthesized expression."""
+    if index >= len(tokens):
+        raise ValueError('incomplete #if expression')
+    number, name, symbol = tokens[index]
+    if number:
+        return int(number), index + 1
+    if name == 'defined':
+        parenthesized = tokens[index + 1:index + 2] == [(None, None, '(')]
+        index += 1 + parenthesized
+        if index >= len(tokens) or not tokens[index][1]:
+            raise ValueError('defined without a macro in #if expression')
+        if parenthesized and \
+                tokens[index + 1:index + 2] != [(None, None, ')')]:
+            raise ValueError("missing ')' after defined in #if expression")
+        value = int(tokens[index][1] in defines)
+        return value, index + 1 + parenthesized
+    if name:
+        return _macro_value(name, defines), index + 1
+    if symbol in ('!', '-', '+'):
+        value, index = _parse_unary(tokens, index + 1, defines)
+        return {'!': int(not value), '-': -value, '+': value}[symbol], index
+    if symbol == '(':
+        value, index = _parse(tokens, index + 1, 1, defines)
+        if tokens[index:index + 1] != [(None, None, ')')]:
+            raise ValueError("missing ')' in #if expression")
+        return value, index + 1
+    raise ValueError('unexpected %s in #if expression' % symbol)
+
+
+def _macro_value(name: str, defines: Dict[str, str]) -> int:
+    """Get the value of a macro in an #if expression."""
+    value = defines.get(name, '').strip()
+    if not value:
+        return 0
+    # a macro may refer to others, but not to itself:
+    others = {k: v for k, v in defines.items() if k != name}
+    return evaluate(value, others)
+
+
+def _evaluate(rawdata: List[str],
+              defines: Dict[str, str]) -> Tuple[array, List[str]]:
+    """Find the active lines of rawdata and the included files."""
+    line_map, includes = array('I'), []
+    active = True
+    # (the parent branch is active, a branch was already taken):
+    stack = []
+    index = 0
+    while index < len(rawdata):
+        first = index
+        match = _DIRECTIVE_RE.match(rawdata[index])
+        index += 1
+        if match is None:
+            if active:
+                line_map.append(first)
+            continue
+
+        directive, text = match.groups()
+        while text.rstrip().endswith('\\') and index < len(rawdata):
+            text = text.rstrip()[:-1] + rawdata[index]
+            index += 1
+        text = _C_COMMENT_RE.sub(' ', text).strip()
+
+        if directive in ('if', 'ifdef', 'ifndef'):
+            if not active:
+                taken = False
+            elif directive == 'if':
+                taken = bool(_evaluate_at(first, text, defines))
+            else:
+                taken = (text.split() or [''])[0] in defines
+                taken = taken if directive == 'ifdef' else not taken
+            stack.append((active, taken))
+            active = taken
+        elif directive in ('elif', 'else', 'endif'):
+            if not stack:
+                raise ValueError('line %d: #%s without #if' %
+                                 (first + 1, directive))
+            parent, taken = stack[-1]
+            if directive == 'endif':
+                active = stack.pop()[0]
+            elif directive == 'else':
+                active = parent and not taken
+                stack[-1] = (parent, True)
+            else:
+                active = parent and not taken and \
+                    bool(_evaluate_at(first, text, defines))
+                stack[-1] = (parent, taken or active)
+        elif not active:
+            continue
+        elif directive == 'define':
+            name, value = (text.split(None, 1) + [''])[:2]
+            # function-like macros never show up in the conditions we read:
+            if '(' not in name:
+                defines[name] = value
+        elif directive == 'undef':
+            defines.pop(text, None)
+        elif directive == 'include':
+            includes.append(text.strip('"<>'))
+
+    if stack:
+        raise ValueError('#if without #endif')
+    return line_map, includes
+
+
+def _evaluate_at(index: int, expression: str,
+                 defines: Dict[str, str]) -> int:
+    """Evaluate the expression of the directive of a line, reporting the
+    line in the errors."""
+    try:
+        return evaluate(expression, defines)
+    except ValueError as error:
+        raise ValueError('line %d: %s' % (index + 1, error)) from None
+
+
+def _cache_key(rawdata: List[str], defines: Dict[str, str]) -> str:
+    """Hash the content of a file and the defines it is evaluated with."""
+    digest = hashlib.sha256()
+    for rd in rawdata:
+        digest.update(rd.encode())
+    digest.update(json.dumps(sorted(defines.items())).encode())
+    return digest.hexdigest()
+
+
+def _load(cache_dir: str,
+          key: str) -> Optional[Tuple[array, List[str]]]:
+    """Read an evaluated file from the disk cache, None if missing."""
+    try:
+        with open(os.path.join(cache_dir, key + '.json'), 'r') as f:
+            cached = json.load(f)
+        return array('I', cached['line_map']), cached['includes']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _save(cache_dir: str, key: str, cached: Tuple[array, List[str]]):
+    """Write an evaluated file to the disk cache, if possible."""
+    line_map, includes = cached
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(os.path.join(cache_dir, key + '.json'), 'w') as f:
+            json.dump({'line_map': line_map.tolist(), 'includes': includes},
+                      f)
+    except OSError:
+        pass
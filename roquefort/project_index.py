@@ -0,0 +1,326 @@
+"""Persistent index of the identifiers used in the files of a project.
+
+Each file is indexed once per content: the scopes of the file and the
+postings of its identifiers, as (scope, line) pairs, are saved in the disk
+cache under the hash of the content. A manifest maps each indexed file to
+its hash, size and modification time, so that the unchanged files are not
+even read when the index is brought up to date. The tools looking for the
+uses of a name query the index instead of scanning the sources.
+"""
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+import hashlib
+import json
+import os
+import re
+from roquefort.preprocessor import DEFAULT_CACHE_DIR
+from roquefort.scope_tree import scope_tree
+from roquefort.source_form import detect_form
+from roquefort.statements import assemble_statements
+from roquefort.string_utils import split_rawdata
+
+# Where the command line tools keep the index:
+DEFAULT_INDEX_DIR = os.path.join(DEFAULT_CACHE_DIR, 'index')
+
+# Version of the indexed files, part of their key:
+_FORMAT = 2
+_IDENT_RE = re.compile(r'\w+')
+
+# The kinds of statements recorded, that the tools may leave out:
+STATEMENT_KINDS = frozenset(['implicit', 'format', 'write'])
+
+
+class Posting(NamedTuple):
+    """A use of an identifier: the file, its innermost scope, None outside
+    of them, and the first line of the statement, from 0."""
+
+    file: str
+    scope: Optional[str]
+    line: int
+
+
+def index_lines(rawdata: List[str],
+                form: Optional[str] = None) -> Dict[str, list]:
+    """Find the identifiers used in the code of a file.
+
+    The identifiers are kept as written, strings, comments and preprocessor
+    directives are skipped. The statements of STATEMENT_KINDS are indexed
+    with their kind, for the queries leaving them out.
+
+    Args:
+        rawdata (List[str]): the lines of the file
+        form (Optional[str]): form of the file, detected if not given
+
+    Returns:
+        Dict[str, list]: 'scopes', the [name, first line, last line] of the
+                         program units and procedures, and 'postings', the
+                         index in scopes, -1 outside of them, and the line
+                         of each use, back to back, by identifier, and
+                         'kinds', the first line and kind of the
+                         statements of STATEMENT_KINDS
+    """
+    form = form or detect_form(lines=rawdata)
+    statements = assemble_statements(rawdata, form)
+    data = split_rawdata([st.text for st in statements], form)
+    tree = scope_tree(data)
+    nodes = tree.scopes()
+    owner = tree.owners()
+    scopes = [[node.name, statements[node.istart].first,
+               statements[min(node.iend, len(data) - 1)].last]
+              for node in nodes]
+
+    postings: Dict[str, List[int]] = {}
+    kinds = []
+    for index, words in enumerate(data):
+        if statements[index].text.lstrip().startswith('#'):
+            continue
+        line = statements[index].first
+        kind = words.folded[0].split('(')[0] if len(words) else ''
+        if kind in STATEMENT_KINDS:
+            kinds.append([line, kind])
+        for start, end in words.code_pieces():
+            for name in _IDENT_RE.findall(words.buffer, start, end):
+                if not name[0].isdigit():
+                    postings.setdefault(name, []).extend(
+                        (owner[index], line))
+    return {'scopes': scopes, 'postings': postings, 'kinds': kinds}
+
+
+class ProjectIndex:
+    """Where the identifiers of the indexed files are used.
+
+    The names are looked up in any case, unless asked for as written.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = DEFAULT_INDEX_DIR):
+        """Start an empty index.
+
+        Args:
+            cache_dir (Optional[str]): where the indexed files are kept,
+                                       None to keep them in memory only
+        """
+        self.cache_dir = cache_dir
+        # the indexed content of each file, see index_lines:
+        self.files: Dict[str, Dict[str, list]] = {}
+        # (mtime, size, key) of each file, when last indexed:
+        self._manifest: Dict[str, list] = {}
+        if cache_dir is not None:
+            manifest = _read_json(os.path.join(cache_dir, 'manifest.json'))
+            if isinstance(manifest, dict):
+                self._manifest = manifest
+        # the spellings of each lowercase name and their files:
+        self._names: Dict[str, Dict[str, Set[str]]] = {}
+
+    def update(self, paths: Iterable[str]):
+        """Index the files, only reading the ones changed since they were
+        last indexed.
+
+        Args:
+            paths (Iterable[str]): the files
+        """
+        changed = False
+        for path in map(str, paths):
+            stat = os.stat(path)
+            known = self._manifest.get(path)
+            if known is not None and known[:2] == [stat.st_mtime_ns,
+                                                   stat.st_size]:
+                key = known[2]
+                if path in self.files:
+                    continue
+                indexed = self._load(key)
+            else:
+                indexed = None
+            if indexed is None:
+                with open(path, 'r') as f:
+                    rawdata = f.readlines()
+                key = _content_key(rawdata)
+                indexed = self._load(key)
+                if indexed is None:
+                    indexed = index_lines(rawdata, detect_form(path, rawdata))
+                    self._save(key, indexed)
+                self._manifest[path] = [stat.st_mtime_ns, stat.st_size, key]
+                changed = True
+            self._forget(path)
+            self.files[path] = indexed
+            for name in indexed['postings']:
+                self._names.setdefault(name.lower(), {}).setdefault(
+                    name, set()).add(path)
+        if changed and self.cache_dir is not None:
+            _write_json(os.path.join(self.cache_dir, 'manifest.json'),
+                        self._manifest)
+
+    def files_using(self, names: Iterable[str],
+                    exact: bool = False) -> Set[str]:
+        """Get the indexed files using any of the names.
+
+        Args:
+            names (Iterable[str]): the identifiers
+            exact (bool): to only match the names as written
+
+        Returns:
+            Set[str]: the files
+        """
+        files = set()
+        for name in names:
+            for spelling, where in self._spellings(name, exact):
+                files.update(where)
+        return files
+
+    def used(self, names: Iterable[str],
+             files: Optional[Iterable[str]] = None) -> Set[str]:
+        """Get the names used in the files.
+
+        Args:
+            names (Iterable[str]): the identifiers
+            files (Optional[Iterable[str]]): the files, all if not given
+
+        Returns:
+            Set[str]: the names used, as given
+        """
+        files = None if files is None else set(map(str, files))
+        return {name for name in names
+                if any(files is None or not files.isdisjoint(where)
+                       for _, where in self._spellings(name))}
+
+    def postings(self, name: str, files: Optional[Iterable[str]] = None,
+                 exact: bool = False,
+                 skip: Iterable[str] = ()) -> List[Posting]:
+        """Get the uses of a name.
+
+        Args:
+            name (str): the identifier
+            files (Optional[Iterable[str]]): the files, all if not given
+            exact (bool): to only match the name as written
+            skip (Iterable[str]): kinds of statements to leave out, see
+                                  STATEMENT_KINDS
+
+        Returns:
+            List[Posting]: the uses, by file and line
+        """
+        files = None if files is None else set(map(str, files))
+        found = []
+        for spelling, where in self._spellings(name, exact):
+            for path in where:
+                if files is not None and path not in files:
+                    continue
+                indexed = self.files[path]
+                skipped = _lines_of(indexed, skip)
+                flat = indexed['postings'][spelling]
+                for i in range(0, len(flat), 2):
+                    if flat[i + 1] in skipped:
+                        continue
+                    iscope = flat[i]
+                    found.append(Posting(
+                        path, indexed['scopes'][iscope][0]
+                        if iscope >= 0 else None, flat[i + 1]))
+        found.sort(key=lambda posting: (posting.file, posting.line))
+        return found
+
+    def scopes(self, path: str) -> List[Tuple[str, int, int]]:
+        """Get the scopes of an indexed file.
+
+        Args:
+            path (str): the file
+
+        Returns:
+            List[Tuple[str, int, int]]: the name, first and last line of
+                                        each scope, in file order
+        """
+        return [tuple(scope) for scope in self.files[str(path)]['scopes']]
+
+    def occurrences(self, path: str,
+                    skip: Iterable[str] = ()) -> List[Tuple[Counter, Counter]]:
+        """Count the identifiers of each scope of an indexed file, in one
+        pass over its postings.
+
+        Args:
+            path (str): the file
+            skip (Iterable[str]): kinds of statements to leave out, see
+                                  STATEMENT_KINDS
+
+        Returns:
+            List[Tuple[Counter, Counter]]: the occurrences of the lowercase
+                                           names in the first statement of
+                                           each scope and in the rest of it
+        """
+        indexed = self.files[str(path)]
+        scopes = indexed['scopes']
+        skipped = _lines_of(indexed, skip)
+        counts = [(Counter(), Counter()) for _ in scopes]
+        for name, flat in indexed['postings'].items():
+            name = name.lower()
+            for i in range(0, len(flat), 2):
+                iscope = flat[i]
+                if iscope >= 0 and flat[i + 1] not in skipped:
+                    head = flat[i + 1] == scopes[iscope][1]
+                    counts[iscope][0 if head else 1][name] += 1
+        return counts
+
+    def _spellings(self, name: str,
+                   exact: bool = False) -> List[Tuple[str, Set[str]]]:
+        """Get the spellings of a name and the files using them."""
+        spellings = self._names.get(name.lower(), {})
+        if exact:
+            return [(name, spellings[name])] if name in spellings else []
+        return list(spellings.items())
+
+    def _forget(self, path: str):
+        """Remove the names of a file from the index."""
+        indexed = self.files.pop(path, None)
+        if indexed is None:
+            return
+        for name in indexed['postings']:
+            spellings = self._names[name.lower()]
+            spellings[name].discard(path)
+            if not spellings[name]:
+                del spellings[name]
+
+    def _load(self, key: str) -> Optional[Dict[str, list]]:
+        """Read an indexed file from the disk cache, None if missing."""
+        if self.cache_dir is None:
+            return None
+        indexed = _read_json(os.path.join(self.cache_dir, key + '.json'))
+        if not isinstance(indexed, dict) or \
+                not {'scopes', 'postings', 'kinds'} <= indexed.keys():
+            return None
+        return indexed
+
+    def _save(self, key: str, indexed: Dict[str, list]):
+        """Write an indexed file to the disk cache, if possible."""
+        if self.cache_dir is not None:
+            _write_json(os.path.join(self.cache_dir, key + '.json'), indexed)
+
+
+def _lines_of(indexed: Dict[str, list], kinds: Iterable[str]) -> Set[int]:
+    """Get the first lines of the statements of some kinds in an indexed
+    file."""
+    kinds = frozenset(kinds)
+    return {line for line, kind in indexed['kinds'] if kind in kinds}
+
+
+def _content_key(rawdata: List[str]) -> str:
+    """Hash the content of a file and the format of the index."""
+    digest = hashlib.sha256(b'%d\n' % _FORMAT)
+    for rd in rawdata:
+        digest.update(rd.encode())
+    return digest.hexdigest()
+
+
+def _read_json(path: str):
+    """Read a json file, None if missing or broken."""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path: str, content):
+    """Write a json file in one go, if possible."""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.part', 'w') as f:
+            json.dump(content, f)
+        os.replace(path + '.part', path)
+    except OSError:
+        pass
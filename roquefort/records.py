@@ -0,0 +1,197 @@
+"""Records of the scopes and of what is declared or imported in them.
+
+Whole-project runs create many of them: the classes have slots instead of
+a per-instance __dict__. The attributes a scope gets from its analysis are
+computed when first read, by the part of the analysis that fills them.
+"""
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+class _Record:
+    """Base of the slotted records: repr and comparison over the slots."""
+
+    __slots__ = ()
+
+    def _fields(self) -> Tuple[str, ...]:
+        return self.__slots__
+
+    def _values(self) -> tuple:
+        return tuple(getattr(self, name) for name in self._fields())
+
+    def __eq__(self, other: Any) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        return self._values() == other._values()
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return '%s(%s)' % (type(self).__name__, ', '.join(
+            '%s=%r' % (name, getattr(self, name))
+            for name in self._fields()))
+
+
+class ImportedVar(_Record):
+    """A variable imported by a use statement, and its number of uses."""
+
+    __slots__ = ('name', 'count')
+
+    def __init__(self, name: str, count: Optional[int] = None):
+        self.name = name
+        self.count = count
+
+
+class UseImport(_Record):
+    """A use statement: the module, its line in the scope and the imported
+    variables."""
+
+    __slots__ = ('name', 'iline', 'total_count', 'var')
+
+    def __init__(self, name: str, iline: int,
+                 var: Optional[List[ImportedVar]] = None):
+        self.name = name
+        self.iline = iline
+        self.total_count = 0
+        self.var = [] if var is None else var
+
+
+class Declaration(_Record):
+    """The variables of a declaration and their dimensions, 'None' for the
+    scalars."""
+
+    __slots__ = ('variables', 'dimensions')
+
+    def __init__(self, variables: List[str], dimensions: List[str]):
+        self.variables = variables
+        self.dimensions = dimensions
+
+
+class Symbol(_Record):
+    """A name declared in a scope: its type and kind, None if not declared
+    by a type statement, its attributes, array spec and initializer."""
+
+    __slots__ = ('name', 'type', 'kind', 'attributes', 'dimensions',
+                 'initializer')
+
+    def __init__(self, name: str, type_: Optional[str] = None,
+                 kind: Optional[str] = None,
+                 attributes: Tuple[str, ...] = (),
+                 dimensions: Optional[str] = None,
+                 initializer: Optional[str] = None):
+        self.name = name
+        self.type = type_
+        self.kind = kind
+        self.attributes = attributes
+        self.dimensions = dimensions
+        self.initializer = initializer
+
+
+# The attributes of a scope filled by its analysis, and their part of it:
+SCOPE_PARTS = {
+    'module': 'module',
+    'floats': 'declarations',
+    'integers': 'declarations',
+    'characters': 'declarations',
+    'complexes': 'declarations',
+    'parameters': 'declarations',
+    'dimensions': 'declarations',
+    'symbols': 'declarations',
+    'bulky_var': 'bulky_var',
+    'implicit': 'implicit',
+}
+
+
+# All the parts of the analysis:
+_PARTS = frozenset(SCOPE_PARTS.values())
+
+
+def _empty(name: str) -> Any:
+    """The value of an attribute of a scope before its analysis."""
+    return {} if name == 'symbols' else None if name == 'implicit' else []
+
+
+def _analysed(name: str, part: str) -> property:
+    """An attribute of a scope, filled by its part of the analysis when it
+    is first read, or empty when first read if there is none to do."""
+    private = '_' + name
+
+    def get(self):
+        if part in self._pending:
+            self.analyser(self, part)
+        try:
+            return getattr(self, private)
+        except AttributeError:
+            value = _empty(name)
+            setattr(self, private, value)
+            return value
+
+    def set(self, value):
+        setattr(self, private, value)
+
+    return property(get, set, doc='The %s of the scope.' % name)
+
+
+class Scope(_Record):
+    """A program unit or procedure, as a range of statements, with what is
+    found in it.
+
+    With an analyser, the attributes found in the data are computed when
+    first read: analyser(scope, part) fills the attributes of the part,
+    see SCOPE_PARTS, after scope.begin(part). Without it, they start empty
+    and are filled by the caller.
+    """
+
+    __slots__ = ('name', 'istart', 'iend', 'data', 'tokens', 'parent',
+                 'analyser', 'also_no_only', '_pending') + tuple(
+                     '_' + name for name in SCOPE_PARTS)
+
+    def __init__(self, name: str, istart: int, iend: int,
+                 data: Sequence[Sequence[str]], tokens: Any = None,
+                 parent: Optional['Scope'] = None,
+                 analyser: Optional[Callable[['Scope', str], None]] = None):
+        self.name = name
+        self.istart = istart
+        self.iend = iend
+        self.data = data
+        self.tokens = tokens
+        # the host scope:
+        self.parent = parent
+        self.analyser = analyser
+        # to also keep the 'use' statements without 'only':
+        self.also_no_only = False
+        # (the attributes are only made when first read)
+        self._pending = frozenset() if analyser is None else _PARTS
+
+    module: List[UseImport] = _analysed('module', 'module')
+    floats: List[Declaration] = _analysed('floats', 'declarations')
+    integers: List[Declaration] = _analysed('integers', 'declarations')
+    characters: List[Declaration] = _analysed('characters', 'declarations')
+    complexes: List[Declaration] = _analysed('complexes', 'declarations')
+    parameters: list = _analysed('parameters', 'declarations')
+    dimensions: List[Declaration] = _analysed('dimensions', 'declarations')
+    # the declared symbols, by lowercase name:
+    symbols: Dict[str, Symbol] = _analysed('symbols', 'declarations')
+    bulky_var: List[str] = _analysed('bulky_var', 'bulky_var')
+    # the implicit type of each letter:
+    implicit: Optional[Tuple[Optional[str], ...]] = _analysed('implicit',
+                                                              'implicit')
+
+    def _fields(self) -> Tuple[str, ...]:
+        # (not the data nor the host, nor the analysis, forced if read)
+        return ('name', 'istart', 'iend')
+
+    def pending(self, part: str) -> bool:
+        """Tell if a part of the analysis is still to be done."""
+        return part in self._pending
+
+    def begin(self, part: str):
+        """Start a part of the analysis: its attributes are emptied, and no
+        longer pending.
+
+        Args:
+            part (str): 'module', 'declarations', 'bulky_var' or 'implicit'
+        """
+        self._pending = self._pending - {part}
+        for name, owner in SCOPE_PARTS.items():
+            if owner == part:
+                setattr(self, '_' + name, _empty(name))
@@ -2,16 +2,20 @@
 import re
 import traceback
 import logging
+from roquefort.source_form import FREE_FORM, detect_form
 log = logging.getLogger()
 
 
 def refac_do(filename,args):
+  try:
+    contents = open(filename,"r").readlines()
+  except:
+    log.error(traceback.format_exc())
+    return
+
   if (not args.free_form) and (not args.fixed_form):
-    #autodetermine form
-    if filename[-3:] == "f90":
-      free_form = True
-    else:
-      free_form = False
+    #autodetermine form, from the extension and the content
+    free_form = detect_form(filename, contents) == FREE_FORM
   else:
     free_form = args.free_form
 
@@ -36,12 +40,6 @@ def refac_do(filename,args):
   # indent of said do's
   do_indent = []
 
-  try:
-    contents = open(filename,"r").readlines()
-  except:
-    log.error(traceback.format_exc())
-    return
-
   for i in range(len(contents)):
     line = contents[i]
     # search for statements
@@ -1,8 +1,11 @@
 #!/usr/bin/env python
 """Parser of arguments."""
 from roquefort.clean_common import Refactor
-from roquefort.clean_use_and_implicit import clean_statements, move_variable
+from roquefort.clean_use_and_implicit import (clean_statements, move_variable,
+                                              stream_statements)
 from roquefort.condense_use import condense_use
+from roquefort.preprocessor import DEFAULT_CACHE_DIR
+from roquefort.project_index import DEFAULT_INDEX_DIR, ProjectIndex
 from pathlib import Path
 import argparse
 from argparse import RawTextHelpFormatter
@@ -44,6 +47,11 @@ def main():
                               type=str,
                               help="Path to champ.",
                               default=".")
+    clean_common.add_argument('--index_dir',
+                              type=str,
+                              help="Directory of the index of the "
+                                   "identifiers of the project",
+                              default=DEFAULT_INDEX_DIR)
 
     # 2. --action clean_use subarguments:
     clean_use = \
@@ -112,6 +120,33 @@ def main():
                                 help='Overwrite the inputfile')
     condense_use_p.add_argument("filename", type=str, help="Fortran filename")
 
+    # Streaming of the commands cleaning a file:
+    for command in ['clean_use', 'clean_implicit']:
+        subparsers.choices[command].add_argument(
+            '--stream',
+            action='store_true',
+            help="Clean the file one top-level program unit at a time, "
+                 "for the files too large to hold in memory")
+
+    # Preprocessor options of the commands working on a single file:
+    for command in ['clean_use', 'clean_implicit', 'move_var',
+                    'condense_use']:
+        subparsers.choices[command].add_argument(
+            '-D', '--define',
+            action='append',
+            metavar='NAME[=VALUE]',
+            help="Macro defined for the #if directives, can be repeated")
+        subparsers.choices[command].add_argument(
+            '--cache_dir',
+            type=str,
+            help="Directory of the cache of the preprocessed files",
+            default=DEFAULT_CACHE_DIR)
+        subparsers.choices[command].add_argument(
+            '-j', '--jobs',
+            type=int,
+            help="Number of processes analysing the scopes of the file",
+            default=1)
+
     args = parser.parse_args()
 
     # Rise errors if arguments are not properly given:
@@ -127,10 +162,14 @@ def main():
 
     # Execute program depending on the command:
     if args.command == "clean_common":
-        rs = Refactor(args.common_block_name, Path(args.path_to_source))
+        rs = Refactor(args.common_block_name, Path(args.path_to_source),
+                      ProjectIndex(args.index_dir))
         rs.refactor()
     elif args.command == "clean_use" or args.command == "clean_implicit":
-        _ = clean_statements(args)
+        if args.stream:
+            stream_statements(args)
+        else:
+            _ = clean_statements(args)
     elif args.command == 'move_var':
         _ = move_variable(args)
     elif args.command == 'condense_use':
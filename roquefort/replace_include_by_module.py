@@ -2,6 +2,8 @@
 from types import SimpleNamespace
 from typing import List, Optional, Tuple
 import re
+from roquefort.records import Scope
+from roquefort.scope_tree import scope_tree
 
 
 def flatten_string_list(l: List[List[str]]) -> List[str]:
@@ -58,7 +60,7 @@ def process_data(rawdata: List[str]) -> List[List[str]]:
     return [split_string(rd) if len(rd) > 0 else rd for rd in rawdata]
 
 
-def separate_scope(data: List[str]) -> List[SimpleNamespace]:
+def separate_scope(data: List[str]) -> List[Scope]:
     """Find the scope regions of the data
 
     Args:
@@ -67,26 +69,10 @@ def separate_scope(data: List[str]) -> List[SimpleNamespace]:
     Returns:
         List[List[str]]: each scope separated
     """
+    return [Scope(node.name, node.istart, node.body_end,
+                  data[node.istart:node.body_end])
+            for node in scope_tree(data).scopes()]
 
-    # identifier for scoping
-    start_keyword = ['subroutine', 'function', 'module']
-    end_keyword = ['end', 'end\n']
-
-    # get the index of start/end scope
-    name, idx_start, idx_end = [], [], []
-    for i, d in enumerate(data):
-
-        if len(d) == 0:
-            continue
-
-        if d[0] in start_keyword:
-            idx_start.append(i)
-            name.append(d[1].split('(')[0])
-
-        if d[0] in end_keyword:
-            idx_end.append(i)
-
-    return [SimpleNamespace(name=name, istart=istart, data=data[istart:iend]) for name, istart, iend in zip(name, idx_start, idx_end)]
 
 
 def find_include(scope: SimpleNamespace, include_name: str) -> SimpleNamespace:
@@ -0,0 +1,147 @@
+"""Index of the raw lines of the scopes, kept valid while rawdata is edited.
+
+The scopes are sorted by their first line and searched with bisect. The
+lines inserted in or deleted from rawdata are recorded as offsets over the
+original lines, in a Fenwick tree: the original lines are mapped to their
+current position, and back, in O(log n).
+"""
+from bisect import bisect_right
+from typing import List, Optional, Sequence, Tuple
+from roquefort.records import Scope
+from roquefort.statements import Statement
+
+
+class ScopeIndex:
+    """The raw line ranges of the scopes of a file."""
+
+    __slots__ = ('scopes', 'starts', 'ends', 'parents', 'size', '_tree',
+                 '_order')
+
+    def __init__(self, scopes: Sequence[Scope],
+                 statements: List[Statement], size: int):
+        """Index the scopes.
+
+        Args:
+            scopes (Sequence[Scope]): the scopes, from istart to iend
+            statements (List[Statement]): the statements they refer to
+            size (int): number of lines of rawdata
+        """
+        # (the enclosing ranges first):
+        ranges = sorted(
+            (statements[s.istart].first, -statements[s.iend - 1].last - 1, i)
+            for i, s in enumerate(scopes) if s.iend > s.istart)
+        self.scopes = [scopes[i] for _, _, i in ranges]
+        self.starts = [start for start, _, _ in ranges]
+        self.ends = [-end for _, end, _ in ranges]
+        self._order = {id(s): i for i, s in enumerate(self.scopes)}
+
+        # the enclosing range of each one, -1 at the top:
+        self.parents = []
+        stack = []
+        for i, start in enumerate(self.starts):
+            while stack and self.ends[stack[-1]] <= start:
+                stack.pop()
+            self.parents.append(stack[-1] if stack else -1)
+            stack.append(i)
+
+        self.size = size
+        # offsets of the original lines, 1-based:
+        self._tree = [0] * (size + 2)
+
+    def line(self, original: int) -> int:
+        """Get the current position of an original line.
+
+        A deleted line takes the position of the line that followed it.
+
+        Args:
+            original (int): index of the line in the original rawdata
+
+        Returns:
+            int: its index in the edited rawdata
+        """
+        i = original + 1
+        offset = 0
+        while i > 0:
+            offset += self._tree[i]
+            i -= i & -i
+        return original + offset
+
+    def original(self, line: int) -> int:
+        """Get the last original line at or before a current position.
+
+        Args:
+            line (int): index in the edited rawdata
+
+        Returns:
+            int: index in the original rawdata, -1 before the first line
+        """
+        # largest i such that i + offset(i) <= line + 1, 1-based:
+        i, offset = 0, 0
+        step = 1 << len(self._tree).bit_length()
+        while step:
+            j = i + step
+            if j < len(self._tree) and j + offset + self._tree[j] <= line + 1:
+                i, offset = j, offset + self._tree[j]
+            step >>= 1
+        return i - 1
+
+    def statement(self, statement: Statement) -> Statement:
+        """Get a statement with its lines at their current position."""
+        moved = Statement(statement.text,
+                          [self.line(i) for i in statement.lines])
+        moved.prefix = statement.prefix
+        moved.trailing = statement.trailing
+        return moved
+
+    def line_range(self, scope: Scope) -> Tuple[int, int]:
+        """Get the current range of lines of a scope.
+
+        Args:
+            scope (Scope): an indexed scope
+
+        Returns:
+            Tuple[int, int]: its first line and the line after its last one
+        """
+        i = self._order[id(scope)]
+        return self.line(self.starts[i]), self.line(self.ends[i])
+
+    def scope_at(self, line: int) -> Optional[Scope]:
+        """Get the innermost scope holding a line.
+
+        Args:
+            line (int): index in the edited rawdata
+
+        Returns:
+            Optional[Scope]: the scope, None outside of them
+        """
+        original = self.original(line)
+        i = bisect_right(self.starts, original) - 1
+        while i >= 0 and self.ends[i] <= original:
+            i = self.parents[i]
+        return self.scopes[i] if i >= 0 else None
+
+    def insert(self, line: int, count: int = 1):
+        """Record lines inserted in rawdata before a current position.
+
+        Args:
+            line (int): where the lines were inserted
+            count (int): number of lines
+        """
+        self._add(self.original(line - 1) + 1, count)
+
+    def delete(self, line: int, count: int = 1):
+        """Record lines deleted from rawdata at a current position.
+
+        Args:
+            line (int): the first deleted line
+            count (int): number of lines
+        """
+        for _ in range(count):
+            self._add(self.original(line) + 1, -1)
+
+    def _add(self, original: int, delta: int):
+        """Shift the original lines from original on."""
+        i = original + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
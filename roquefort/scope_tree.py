@@ -0,0 +1,346 @@
+"""Scope tree of a file: its program units, procedures and interfaces."""
+from collections import OrderedDict
+from typing import Iterable, Iterator, List, Optional, Sequence
+from roquefort.source_form import (BLANK, COMMENT_LINE, CONTINUATION,
+                                   line_classifier)
+from roquefort.spans import TokenLine
+from roquefort.statements import code_end
+from roquefort.string_utils import split_rawdata
+from roquefort.symbols import TokenStore
+
+# Kinds of the nodes of the tree
+PROGRAM = 'program'
+MODULE = 'module'
+SUBMODULE = 'submodule'
+SUBROUTINE = 'subroutine'
+FUNCTION = 'function'
+INTERFACE = 'interface'
+
+_PROCEDURES = frozenset([SUBROUTINE, FUNCTION])
+_UNITS = frozenset([PROGRAM, MODULE, SUBMODULE, SUBROUTINE, FUNCTION,
+                    INTERFACE])
+
+# Words that may precede 'subroutine' or 'function' in their statement:
+_PREFIXES = frozenset(['recursive', 'pure', 'elemental', 'impure',
+                       'non_recursive', 'module', 'precision'])
+_TYPE_PREFIXES = ('integer', 'real', 'double', 'logical', 'complex',
+                  'character', 'type(', 'class(')
+
+# Number of trees kept for the files of the run:
+_CACHE_SIZE = 16
+_TREES: 'OrderedDict[int, ScopeTree]' = OrderedDict()
+
+
+class ScopeNode:
+    """A program unit, procedure or interface block, as a range of
+    statements."""
+
+    __slots__ = ('kind', 'name', 'istart', 'iend', 'contains', 'parent',
+                 'children')
+
+    def __init__(self, kind: str, name: str, istart: int,
+                 parent: Optional['ScopeNode'] = None):
+        """Open a node at its first statement."""
+        self.kind = kind
+        self.name = name
+        self.istart = istart
+        # index of the end statement, excluded from the node:
+        self.iend = None
+        # index of the 'contains' statement, if any:
+        self.contains = None
+        self.parent = parent
+        self.children = []
+
+    @property
+    def body_end(self) -> int:
+        """End of the statements of the node itself, before its contained
+        procedures."""
+        return self.iend if self.contains is None else self.contains
+
+    @property
+    def in_interface(self) -> bool:
+        """True for the interface blocks and the procedures they declare."""
+        node = self
+        while node is not None:
+            if node.kind == INTERFACE:
+                return True
+            node = node.parent
+        return False
+
+    def walk(self) -> Iterator['ScopeNode']:
+        """Iterate over the node and its descendants, in file order."""
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def __repr__(self) -> str:
+        return '<%s %s [%d:%s]>' % (self.kind, self.name, self.istart,
+                                    self.iend)
+
+
+class ScopeTree:
+    """The nested scopes of the statements of a file."""
+
+    def __init__(self, data: Sequence[Sequence[str]]):
+        """Build the tree in a single pass over the statements.
+
+        Args:
+            data (Sequence[Sequence[str]]): the words of the statements
+        """
+        self.data = data
+        self.roots: List[ScopeNode] = []
+        self._tokens = None
+        # the nodes still open:
+        self._stack: List[ScopeNode] = []
+
+        for index, words in enumerate(data):
+            self.add(index, words)
+
+        # the units left open end with the file:
+        for node in self._stack:
+            node.iend = len(data)
+
+    def add(self, index: int, words: Sequence[str]):
+        """Add the next statement to the tree.
+
+        Args:
+            index (int): index of the statement
+            words (Sequence[str]): its words
+        """
+        head = _head(words)
+        if not head:
+            return
+        stack = self._stack
+        first = head[0]
+        if first == 'contains':
+            if stack:
+                stack[-1].contains = index
+        elif first.startswith('end'):
+            _close(stack, first, head, index)
+        else:
+            kind, position = _opening(head)
+            if kind is None:
+                return
+            parent = stack[-1] if stack else None
+            node = ScopeNode(kind, _name(words, position), index, parent)
+            (parent.children if parent else self.roots).append(node)
+            stack.append(node)
+
+    @property
+    def depth(self) -> int:
+        """Number of nodes open after the statements added so far."""
+        return len(self._stack)
+
+    @property
+    def tokens(self) -> TokenStore:
+        """The identifiers of the statements, interned once for the file."""
+        if self._tokens is None:
+            self._tokens = TokenStore(self.data)
+        return self._tokens
+
+    def nodes(self) -> Iterator[ScopeNode]:
+        """Iterate over all the nodes, in file order."""
+        for root in self.roots:
+            yield from root.walk()
+
+    def scopes(self) -> List[ScopeNode]:
+        """Get the program units and procedures holding code, in file order:
+        the interface blocks and their procedures are left out."""
+        return [node for node in self.nodes() if not node.in_interface]
+
+    def owners(self) -> List[int]:
+        """Get the innermost scope of each statement, as its index in
+        scopes(), -1 outside of them: the statements of the interface
+        blocks belong to the scope holding them.
+
+        Returns:
+            List[int]: the index of the scope of each statement
+        """
+        owner = [-1] * len(self.data)
+        # (the outer scopes first, the inner ones overwrite them):
+        for iscope, node in enumerate(self.scopes()):
+            for index in range(node.istart, min(node.iend + 1,
+                                                len(self.data))):
+                owner[index] = iscope
+        return owner
+
+    def scope_of(self, index: int) -> Optional[ScopeNode]:
+        """Get the innermost node containing a statement, its end statement
+        included.
+
+        Args:
+            index (int): index of the statement
+
+        Returns:
+            Optional[ScopeNode]: the node, None outside of any unit
+        """
+        found = None
+        nodes = self.roots
+        while nodes:
+            for node in nodes:
+                if node.istart <= index <= node.iend:
+                    found, nodes = node, node.children
+                    break
+            else:
+                break
+        return found
+
+
+def scope_tree(data: Sequence[Sequence[str]]) -> ScopeTree:
+    """Get the scope tree of the statements of a file, building it only
+    once for all the tools working on the same data.
+
+    Args:
+        data (Sequence[Sequence[str]]): the words of the statements
+
+    Returns:
+        ScopeTree: the tree
+    """
+    key = id(data)
+    tree = _TREES.get(key)
+    if tree is None or tree.data is not data:
+        tree = _TREES[key] = ScopeTree(data)
+        if len(_TREES) > _CACHE_SIZE:
+            _TREES.popitem(last=False)
+    else:
+        _TREES.move_to_end(key)
+    return tree
+
+
+def forget_tree(data: Sequence[Sequence[str]]):
+    """Drop the tree of statements from the cache, once no tool works on
+    them any more: the streaming mode only holds one unit at a time.
+
+    Args:
+        data (Sequence[Sequence[str]]): the words of the statements
+    """
+    key = id(data)
+    tree = _TREES.get(key)
+    if tree is not None and tree.data is data:
+        del _TREES[key]
+
+
+def read_units(lines: Iterable[str], form: str) -> Iterator[List[str]]:
+    """Read the lines of a file one top-level program unit at a time.
+
+    A chunk ends with the statement closing its unit, continuation lines
+    included, and holds the lines before the unit; the lines after the last
+    unit make the last chunk. A chunk is not closed inside a preprocessor
+    conditional, nor after a '#define' or '#undef', whose macros hold for
+    the rest of the file.
+
+    Args:
+        lines (Iterable[str]): the lines of the file, read as they come
+        form (str): FIXED_FORM or FREE_FORM
+
+    Yields:
+        List[str]: the lines of each chunk, in order
+    """
+    classify = line_classifier(form)
+    tree = ScopeTree([])
+    chunk: List[str] = []
+    index = 0
+    closed = trailing = whole = False
+    conditionals = 0
+
+    for line in lines:
+        stripped = line.lstrip(' \t')
+        if stripped.startswith('#'):
+            # (a directive is a line of its own, as a comment)
+            kind, directive = COMMENT_LINE, stripped[1:].lstrip(' \t')
+            if directive.startswith('if'):
+                conditionals += 1
+            elif directive.startswith('endif'):
+                conditionals -= 1
+            elif directive.startswith(('define', 'undef')):
+                whole = True
+        else:
+            kind, _ = classify(line)
+        continued = kind == CONTINUATION or \
+            trailing and kind not in (BLANK, COMMENT_LINE)
+        if closed and not continued:
+            yield chunk
+            chunk, closed = [], False
+            tree = ScopeTree([])
+        chunk.append(line)
+        if kind in (BLANK, COMMENT_LINE):
+            continue
+
+        _, trailing = code_end(line)
+        if not continued:
+            depth = tree.depth
+            tree.add(index, split_rawdata([line], form)[0])
+            index += 1
+            closed = depth > 0 and tree.depth == 0 and not conditionals \
+                and not whole
+
+    if chunk:
+        yield chunk
+
+
+def _head(words: Sequence[str]) -> List[str]:
+    """The first words of the code of a statement, lowercase: a trailing
+    comment is left out."""
+    if isinstance(words, TokenLine):
+        words = words.folded[:4]
+    else:
+        words = [word.lower() for word in words[:4]]
+    head = []
+    for word in words:
+        word = word.strip()
+        if word.startswith('!'):
+            break
+        if word:
+            head.append(word)
+    return head
+
+
+def _opening(head: List[str]) -> tuple:
+    """Find the kind of the unit a statement opens, and the position of
+    the word before its name."""
+    first = head[0]
+    second = head[1] if len(head) > 1 else ''
+    if first == PROGRAM:
+        return PROGRAM, 0
+    if first == MODULE and second not in ('procedure', 'subroutine',
+                                          'function'):
+        return MODULE, 0
+    if first == SUBMODULE:
+        return SUBMODULE, len(head) - 2
+    if first == INTERFACE:
+        return INTERFACE, 0
+    if first == 'abstract' and second == INTERFACE:
+        return INTERFACE, 1
+    type_name = False
+    for position, word in enumerate(head):
+        if type_name:
+            # the derived type of 'type(t)', split from its keyword:
+            type_name = False
+            continue
+        if word.split('(')[0] in _PROCEDURES:
+            return word.split('(')[0], position
+        if word in ('type', 'class'):
+            type_name = True
+        elif word not in _PREFIXES and not word.startswith(_TYPE_PREFIXES):
+            break
+    return None, None
+
+
+def _name(words: Sequence[str], position: int) -> str:
+    """Read the name following the keyword of an opening statement."""
+    if position + 1 >= len(words):
+        return ''
+    return words[position + 1].split('(')[0].strip()
+
+
+def _close(stack: List[ScopeNode], first: str, head: List[str], index: int):
+    """Close the node ended by an 'end' statement, if it ends one."""
+    kind = first[3:] or (head[1].split('(')[0] if len(head) > 1 else '')
+    if kind and kind not in _UNITS:
+        # 'end if', 'enddo', 'end type', ...
+        return
+    while stack:
+        node = stack.pop()
+        node.iend = index
+        if not kind or node.kind == kind:
+            return
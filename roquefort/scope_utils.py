@@ -1,89 +1,57 @@
 """Utilities to build-up scopes."""
-from typing import List
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence, Set, Tuple
 from types import SimpleNamespace
-from roquefort.string_utils import (flatten_string_list, has_number,
-                                    split_string_hard, list_to_string,
-                                    split_string_medium,
-                                    split_string_with_parenthesis)
-import string
+from roquefort.string_utils import split_string_hard, split_string_medium
+from roquefort.lexer import CODE, LITERAL
+from roquefort.statements import (Statement, drop_statements,
+                                  format_statement, replace_statement)
+from roquefort.declarations import (IMPLICIT_DEFAULT, compile_implicit,
+                                    declare, parse_implicit, parse_statement,
+                                    refactored_type)
+from roquefort.preprocessor import inactive_names
+from roquefort.records import (SCOPE_PARTS, Declaration, ImportedVar, Scope,
+                               Symbol, UseImport)
+from roquefort.scope_index import ScopeIndex
+from roquefort.scope_tree import scope_tree
+from roquefort.source_form import detect_form
+from roquefort.spans import TokenLine
 import re
 
 
-def separate_scope(data: List[str]) -> List[SimpleNamespace]:
+def separate_scope(data: List[str]) -> List[Scope]:
     """Find the scope regions of the data.
 
+    The scope of a unit holding procedures stops at its 'contains'
+    statement, its procedures having their own scopes, with the scope of
+    the unit as parent. Their attributes are analysed when first read.
+
     Args:
         data (List[str]): data read in the file
 
     Returns:
         List[List[str]]: each scope separated
     """
-
-    # identifier for scoping
-    start_keyword = ['subroutine', 'function', 'program', 'module']
-    end_keyword = ['end', 'end\n', 'contains', 'contains\n', 'END', 'END\n']
-
-    skip_keyword = ['interface', 'interface\n']
-    skip_block = False
-
-    # get the index of start/end scope
-    name, idx_start, idx_end = [], [], []
-    for i, d in enumerate(data):
-
-        d = [el.strip().lower() for el in d]
-
-        if len(d) == 0:
-            continue
-
-        if d[0].lower() in skip_keyword:
-            skip_block = True
-
-        if skip_block:
-
-            if d[0].lower() in end_keyword:
-                if len(d) > 1:
-                    if d[1].lower() in skip_keyword:
-                        skip_block = False
-
-            continue
-
-        if d[0].lower() in start_keyword:
-            idx_start.append(i)
-            name.append(d[1].split('(')[0].rstrip('\n'))
-
-        if d[0] in end_keyword:
-
-            if len(d) > 1 and d[1] == "if":
-                continue
-            if len(d) > 1 and d[1].startswith("module"):
-                if len(idx_start) > len(idx_end):
-                    idx_end.append(i)
-                    continue
-            else:
-                idx_end.append(i)
-
-    return [
-        SimpleNamespace(name=name,
-                        istart=istart,
-                        iend=iend,
-                        data=data[istart:iend],
-                        module=[],
-                        floats=[],
-                        integers=[],
-                        characters=[],
-                        complexes=[],
-                        parameters=[],
-                        dimensions=[],
-                        bulky_var=[])
-        for name, istart, iend in zip(name, idx_start, idx_end)
-    ]
+    tree = scope_tree(data)
+    scopes = {}
+    for node in tree.scopes():
+        scopes[node] = Scope(node.name.lower(), node.istart, node.body_end,
+                             data[node.istart:node.body_end], tree.tokens,
+                             scopes.get(node.parent), analyse_scope)
+    return list(scopes.values())
 
 
 def fill_scopes(rawdata: List[str],
-                scopes: List[SimpleNamespace],
+                scopes: List[Scope],
                 clean_implicit: bool,
-                also_no_only: bool = False) -> List[SimpleNamespace]:
-    """Fills attributes of SimpleNamespace scopes.
+                also_no_only: bool = False,
+                jobs: int = 1) -> List[Scope]:
+    """Fills attributes of scopes.
+
+    Each scope is analysed from its own data only: with jobs > 1, the
+    scopes are filled by a pool of processes, the largest ones first, and
+    their attributes are merged back into the scopes in their order.
 
     :param rawdata: List of the bulky content of the read file.
 
@@ -91,500 +59,433 @@ def fill_scopes(rawdata: List[str],
 
     :param clean_implicit: Boolean to replace or not the implicit real.
 
+    :param also_no_only: Boolean to also keep the 'use' without 'only'.
+
+    :param jobs: Number of processes filling the scopes.
+
     :param return: List of entry scopes with attributes populated.
     """
+    if jobs > 1 and len(scopes) > 1:
+        _fill_in_pool(scopes, clean_implicit, also_no_only, jobs)
+        filled = True
+    else:
+        filled = False
+
     for scope in scopes:
 
         print('  - Adding scope: %s \n' % scope.name)
-        # Find variables in use statements:
-        print('  \t+ Filling module attribute.')
-        scope = fill_module(scope, also_no_only)
-
-        # Find possible variables on the bulky of the scope:
         if clean_implicit:
-            print('  \t+ Filling floats attribute.')
-            scope = fill_floats(scope)
-            print('  \t+ Filling integers attribute.')
-            scope = fill_integers(scope)
-            print('  \t+ Filling characters attribute.')
-            scope = fill_characters(scope)
-            print('  \t+ Filling complex attribute.')
-            scope = fill_complexes(scope)
-            print('  \t+ Filling parameters attribute.')
-            scope = fill_parameters(scope)
-            print('  \t+ Filling dimensions attribute.')
-            scope = fill_dimensions(scope)
-            print('  \t+ Filling bulky_var attribute.')
-            scope = fill_bulky_var(scope)
+            print('  \t+ Filling module, declaration and bulky_var '
+                  'attributes.')
+        else:
+            print('  \t+ Filling module attribute.')
+        if not filled:
+            scope = fill_scope(scope, clean_implicit, also_no_only)
+        if clean_implicit:
             print('')
 
     return scopes
 
 
-def fill_module(scope: SimpleNamespace,
-                also_no_only: bool = False) -> SimpleNamespace:
-    """
-    Populate scope.module = SimpleNamespace with imported variables via
-    'use' statements:
-    E.g.: 'use ghostatom, only: newghostype, nghostcent'
+def _fill_in_pool(scopes: List[Scope], clean_implicit: bool,
+                  also_no_only: bool, jobs: int):
+    """Fill the scopes in a pool of processes.
 
-    :param scope: Scope whose attribute scope.module needs to be filled-in.
+    Each process receives the data of the scopes once, without their parent
+    and token store, then fills them by index, the largest ones first so
+    that the pool ends evenly. The implicit types are compiled once the
+    scopes are merged, over the ones of their host.
 
-    :return: the same entry scope with scope.module attribute populated.
-    """
+    :param scopes: List of scopes, hosts first.
 
-    for iline, sori in enumerate(scope.data):
+    :param clean_implicit: Boolean to fill the declarations and bulky_var.
 
-        s = [so.strip() for so in sori if len(so.strip()) > 0]
+    :param also_no_only: Boolean to also keep the 'use' without 'only'.
 
-        if len(s) == 0:
-            continue
-
-        if len(s) == 2 and s[0].lower() == "use" and also_no_only:
-            module_name = s[1].rstrip('\n')
-            mod = SimpleNamespace(name=module_name, iline=iline, total_count=0)
-            mod.var = []
-            scope.module.append(mod)
-            continue
+    :param jobs: Number of processes.
+    """
+    order = sorted(range(len(scopes)), key=lambda i: -len(scopes[i].data))
+    detached = [(s.name, s.istart, s.iend, s.data) for s in scopes]
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_pool,
+                             initargs=(detached, )) as pool:
+        filled = list(pool.map(_fill_detached,
+                               [(i, clean_implicit, also_no_only)
+                                for i in order]))
 
-        if len(s) > 2:
+    parts = _fill_parts(clean_implicit)
+    for i, values in zip(order, filled):
+        scope = scopes[i]
+        scope.also_no_only = also_no_only
+        for part in parts:
+            scope.begin(part)
+        for name, value in values.items():
+            setattr(scope, name, value)
+    # (the implicit types are compiled over the ones of the host)
+    if "implicit" in parts:
+        for scope in scopes:
+            analyse_scope(scope, "implicit")
 
-            if s[0].lower() == 'use' and s[2].strip().startswith('only'):
 
-                module_name = s[1].rstrip('\n')
-                mod = SimpleNamespace(name=module_name,
-                                      iline=iline,
-                                      total_count=0)
-                mod.var = []
+# The scopes of a process of the pool, see _fill_in_pool:
+_DETACHED = []
 
-                for icol in range(3, len(s)):
-                    varname = s[icol].rstrip('\n')
-                    if len(varname) > 0:
-                        mod.var.append(
-                            SimpleNamespace(name=varname, count=None))
 
-                scope.module.append(mod)
+def _init_pool(detached: list):
+    """Receive the scopes in a process of the pool."""
+    _DETACHED[:] = detached
 
-    return scope
 
+def _fill_detached(task: tuple) -> dict:
+    """Fill a scope in a process of the pool, see fill_scope.
 
-def fill_floats(scope: SimpleNamespace) -> SimpleNamespace:
-    """Populate scope.floats with reals already declared.
+    :param task: The index of the scope and the arguments of fill_scope.
 
-    :param scope: Namespace containing the data.
-
-    :return scope: Return the same SimpleNamespace with the
-                   scope.floats attribute populated by a
-                   SimpleNamespace with variables declared
-                   as real numbers.
+    :return: The filled attributes of the scope, by name.
     """
-    for sd in scope.data:
-        if sd[0].lower().startswith("real") or \
-           sd[0].lower().startswith("real(dp)") or\
-           sd[0].lower().startswith("real(kind=8)"):
-            if (sd[1].lower().startswith("dimension") and
-                sd[2].lower().startswith("allocatable")) or \
-               (sd[1].lower().startswith("allocatable") and
-                    sd[2].lower().startswith("save")):
-                declaration = separate_dimensions(list_to_string(sd[4:]))
-            elif (sd[1].lower().startswith("dimension(:")
-                  and sd[3].lower().startswith("allocatable")):
-                declaration = separate_dimensions(list_to_string(sd[5:]))
-            else:
-                declaration = separate_dimensions(list_to_string(sd[1:]))
-            scope.floats.append(declaration)
-    return scope
-
-
-def fill_integers(scope: SimpleNamespace) -> SimpleNamespace:
-    """Populate scope.integers with integers already declared.
-
-    :param scope: Namespace containing the data.
-
-    :return scope: Return the same SimpleNamespace with the
-                   scope.floats attribute populated by a
-                   SimpleNamespace with variables declared
-                   as real numbers.
+    i, clean_implicit, also_no_only = task
+    scope = fill_scope(Scope(*_DETACHED[i]), clean_implicit, also_no_only)
+    parts = _fill_parts(clean_implicit)
+    return {name: getattr(scope, name)
+            for name, part in SCOPE_PARTS.items()
+            if part in parts and part != "implicit"}
+
+
+# Avoid lines with the following starting-words:
+_AVOID_ANALYSIS = frozenset([
+    "implicit", "program", "endif", "enddo", "return", "continue",
+    "function", "use", "go", "goto", "include", "format",
+    "integer", "logical", "real*4", "real*8", "real(dp)"
+    "parameter", "dimension", "allocate", "public", "contains", "\n"
+])
+
+# Avoid Fortran keywords and the separators left in the words:
+_KEYWORDS = frozenset([
+    "&", "dimension", "parameter", "if", "endif", "else", "elseif", "end",
+    "open", "close", "do", "call", "write", "goto", "enddo", "then", "to",
+    "return", "data", "status", "format", "file", "unit", "read", "save",
+    "rewind", "character", "backspace", "common", "real", "integer",
+    "complex", "complex*16", "only", "while", "logical", "form",
+    "allocate", "allocatable", "deallocate", "print", "stop", "subroutine",
+    "continue", "module", "+", "=", "::", "\t", "\n"
+])
+
+# Avoid the intrinsic functions and the MPI constants:
+_INTRINSICS = frozenset([
+    "min", "max", "nint", "abs", "float", "log", "dlog", "exp", "dexp",
+    "mod", "sign", "int", "cmplx", "allocated", "dreal", "dfloat", "dsqrt",
+    "dcos", "dsin", "sin", "cos", "sqrt", "mpi_real8", "mpi_status_size",
+    "mpi_integer", "mpi_sum", "mpi_max", "mpi_comm_world",
+    "mpi_double_precision"
+])
+
+# Avoid some variables or external functions defined by the user:
+_USER_EXCLUDE = frozenset([
+    "rannyu", "gauss", "int_from_cart", "gammai", "nterms4", "idiff",
+    "rnorm_nodes_num", "psinl", "psianl", "dpsianl", "psia", "psib",
+    "dpsibnl"
+])
+
+
+def fill_scope(scope: Scope, clean_implicit: bool = True,
+               also_no_only: bool = False) -> Scope:
+    """Fill the attributes of a scope in a single sweep of scope.data.
+
+    Only scope.module is filled, unless clean_implicit: then the
+    declarations fill the symbol table scope.symbols and the lists
+    scope.floats, integers, characters, complexes, parameters and
+    dimensions, the 'implicit' statements scope.implicit and the
+    candidates for scope.bulky_var are gathered on the way. The other
+    attributes are computed when first read, see analyse_scope.
+
+    :param scope: Scope to fill-in.
+
+    :param clean_implicit: Boolean to fill the declarations and bulky_var.
+
+    :param also_no_only: Boolean to also keep the 'use' without 'only'.
+
+    :return: the same entry scope with its attributes populated.
     """
-    for sd in scope.data:
-        if sd[0].lower().startswith("integer"):
-            if sd[1].lower().startswith("dimension") and \
-               sd[2].lower().startswith("allocatable"):
-                declaration = separate_dimensions(list_to_string(sd[4:]))
-            else:
-                declaration = separate_dimensions(list_to_string(sd[1:]))
-            scope.integers.append(declaration)
+    scope.also_no_only = also_no_only
+    _sweep(scope, _fill_parts(clean_implicit))
     return scope
 
 
-def fill_characters(scope: SimpleNamespace) -> SimpleNamespace:
-    """Populate scope.characters with integers already declared.
+def _fill_parts(clean_implicit: bool) -> Tuple[str, ...]:
+    """The parts of the analysis done by fill_scope."""
+    if clean_implicit:
+        return ("module", "declarations", "bulky_var", "implicit")
+    return ("module", )
 
-    :param scope: Namespace containing the data.
-
-    :return scope: Return the same SimpleNamespace with the
-                   scope.characters attribute populated by a
-                   SimpleNamespace with variables declared
-                   as characters.
-    """
-    for sd in scope.data:
-        if sd[0].lower().startswith("character"):
-            if sd[1].isdigit():
-                declaration = separate_dimensions(list_to_string(sd[2:]))
-            else:
-                declaration = separate_dimensions(list_to_string(sd[1:]))
-            scope.characters.append(declaration)
-    return scope
 
+def analyse_scope(scope: Scope, part: str):
+    """Fill the attributes of a part of the analysis of a scope, when one
+    of them is first read (see records.SCOPE_PARTS).
 
-def fill_complexes(scope: SimpleNamespace) -> SimpleNamespace:
-    """Populate scope.complexes with complexes already declared.
+    The bulky_var are found once the module and declarations are known:
+    the pending ones are filled in the same sweep.
 
-    :param scope: Namespace containing the data.
+    :param scope: Scope to analyse.
 
-    :return scope: Return the same SimpleNamespace with the
-                   scope.complexes attribute populated by a
-                   SimpleNamespace with variables declared
-                   as complex numbers.
+    :param part: 'module', 'declarations', 'bulky_var' or 'implicit'.
     """
-    for sd in scope.data:
-        if sd[0].lower().startswith("complex") or \
-           sd[0].lower().startswith("complex(dp)"):
-            if (sd[1].lower().startswith("dimension") and
-                sd[2].lower().startswith("allocatable")) or \
-               (sd[1].lower().startswith("allocatable") and
-                    sd[2].lower().startswith("save")):
-                declaration = separate_dimensions(list_to_string(sd[4:]))
-            else:
-                declaration = separate_dimensions(list_to_string(sd[1:]))
-            scope.complexes.append(declaration)
-    return scope
+    parts = [part]
+    if part == "bulky_var":
+        parts.extend(p for p in ("module", "declarations")
+                     if scope.pending(p))
+    _sweep(scope, parts)
 
 
-def fill_parameters(scope: SimpleNamespace) -> SimpleNamespace:
-    """Populate scope.parameters with parameter-declared variables.
+def _sweep(scope: Scope, parts: Sequence[str]):
+    """Fill parts of the analysis of a scope in a single sweep.
 
-    :param scope: Namespace containing the data.
-
-    :return scope: Return the same SimpleNamespace with the
-                   scope.parameters attribute populated by a
-                   SimpleNamespace containing all the variables
-                   declared as parameters.
-    """
-    for sd in scope.data:
-        if sd[0].lower() == "parameter":
-            declaration = separate_parameters(list_to_string(sd[1:]))
-            scope.parameters.append(declaration)
-    return scope
+    Each statement is dispatched on its leading keyword. The candidates for
+    scope.bulky_var are filtered once all the declarations are known, and
+    the 'implicit' statements are compiled over the table of the parent
+    scope.
 
+    :param scope: Scope to fill-in.
 
-def separate_parameters(s: str) -> SimpleNamespace:
-    """Separate a parameters-string line declaration into variables and values.
-    The result is stored in a SimpleNamestpace with attributes variables and
-    values.
-
-    :param s: Entry string with the dimension declaration.
-
-    :return: SimpleNamespace.variables and SimpleNamespace.values.
+    :param parts: The parts of the analysis, see analyse_scope.
     """
-
-    variables, values = [], []
-
-    if "!" in s:  # Avoid ! comments at the end of the line.
-        s = s[:s.index("!")]
-    s_splitted = (s[1:].replace("\n", ""))[:-1].split(",")
-
-    for i in s_splitted:
-
-        variables.append(i.split("=")[0])
-        values.append(i.split("=")[1])
-    return SimpleNamespace(variables=variables, values=values)
-
-
-def fill_dimensions(scope: SimpleNamespace) -> SimpleNamespace:
-    """
-    Populate scope.dimension = List[SimpleNamespace] of a scope
-    with variables names and array dimensions.
-
-    Args:
-        :param scope: Namespace containing the data.
-
-    Returns:
-        :return scope: Return the same entry SimpleNamespace with the
-                       scope.dimensions attribute populated by a
-                       List[SimpleNamespace] containing the variable
-                       names and dimensions.
+    for part in parts:
+        scope.begin(part)
+    module, implicit = "module" in parts, "implicit" in parts
+    declarations, bulky = "declarations" in parts, "bulky_var" in parts
+
+    # (word, lowercase word, number of exclusions made before it):
+    candidates = []
+    # the exclusions made along the sweep, with their number:
+    excluded_at = {}
+    implicits = []
+
+    for iline, sd in enumerate(scope.data):
+        if not len(sd):
+            continue
+        first = sd.folded[0]
+
+        if first == "use":
+            if module:
+                fill_module(scope, iline, sd, scope.also_no_only)
+        elif first == "implicit":
+            if implicit:
+                implicits.append(parse_implicit(
+                    sd.buffer, sd.start, sd.end, sd.lower) or ())
+
+        if declarations and first.startswith(_DECLARATION_WORDS):
+            symbols = parse_statement(sd)
+            if symbols:
+                fill_declaration(scope, symbols)
+        if bulky:
+            _bulky_candidates(sd, candidates, excluded_at)
+
+    if implicit:
+        host = scope.parent
+        scope.implicit = compile_implicit(
+            implicits, host is not None and host.implicit or IMPLICIT_DEFAULT)
+    if bulky:
+        scope.bulky_var = _filter_bulky_var(scope, candidates, excluded_at)
+
+
+def fill_module(scope: Scope, iline: int, sori: TokenLine,
+                also_no_only: bool = False):
     """
-    for sd in scope.data:
-        if sd[0] == 'dimension':
-            declaration = separate_dimensions(list_to_string(sd[1:]))
-            scope.dimensions.append(declaration)
-    return scope
+    Add to scope.module the variables imported by a 'use' statement:
+    E.g.: 'use ghostatom, only: newghostype, nghostcent'
 
+    :param scope: Scope whose attribute scope.module is filled-in.
 
-def separate_dimensions(s: str) -> SimpleNamespace:
-    """Separate a dimension-string line into variables and dimensions. The
-    result is stored in a SimpleNamestpace with attributes variables and
-    dimensions.
+    :param iline: Index of the statement in scope.data.
 
-    :param s: Entry string with the dimension declaration.
+    :param sori: The 'use' statement.
 
-    :return: SimpleNamespace.variables and SimpleNamespace.dimensions.
+    :param also_no_only: Boolean to also keep the 'use' without 'only'.
     """
-    variables, dimensions = [], []
-    variable = ""
-    if "!" in s:  # Avoid ! comments at the end of the line.
-        s = s[:s.index("!")]
-    if "(" in s:
-        s_splitted = split_string_with_parenthesis(s)
-        for variable in s_splitted:
-            if "(" and ")" in variable:
-                variables.append(variable[:variable.index("(")])
-                dimensions.append(variable[variable.index("("):])
-            else:
-                variables.append(variable)
-                dimensions.append("None")
-    else:
-        s_splitted = (s.replace(",", " ")).split()
-        for variable in s_splitted:
-            variables.append(variable)
-            dimensions.append("None")
-    return SimpleNamespace(variables=variables, dimensions=dimensions)
+    s = [so.strip() for so in sori if len(so.strip()) > 0]
 
+    if len(s) == 2 and also_no_only:
+        module_name = s[1].rstrip('\n')
+        scope.module.append(UseImport(module_name, iline))
 
-def fill_bulky_var(scope: SimpleNamespace) -> SimpleNamespace:
-    """Filter variables in the bulky scope.data that are not imported by the
-    use statements.
+    elif len(s) > 2 and s[2].lower().startswith('only'):
+        module_name = s[1].rstrip('\n')
+        mod = UseImport(module_name, iline)
 
-    :param scope: Namespace containing the data.
+        for icol in range(3, len(s)):
+            varname = s[icol].rstrip('\n')
+            if len(varname) > 0:
+                mod.var.append(ImportedVar(varname))
 
-    :return scope: Return the same SimpleNamespace with the
-                   scope.bulky_var attribute populated by a simple
-                   list[] containing all the unique variables found
-                   in scope.data that are not imported by the use imports.
-    """
-    # Avoid lines with the following starting-words:
-    avoid_analysis = [
-        "implicit", "program", "endif", "enddo", "return", "continue", "!",
-        "c", "C", "function", "use", "go", "goto", "include", "format",
-        "integer", "logical", "real*4", "real*8", "real(dp)"
-        "parameter", "dimension", "allocate", "public", "contains", "\n"
-    ]
-
-    # Avoid Fortran keywords that are not variables:
-    exclude = [
-        "&", "dimension", "parameter", "if", "endif", "else", "elseif", "end",
-        "open", "close", "do", "call", "write", "goto", "enddo", "then", "to",
-        "return", "min", "max", "nint", "abs", "float", "data", "log", "dlog",
-        "exp", "dexp", "mod", "sign", "int", "status", "format", "file",
-        "unit", "read", "save", "rewind", "character", "backspace", "common",
-        "real", "integer", "cmplx", "complex", "complex*16", "only", "while",
-        "logical", "form", "allocate", "allocated", "allocatable",
-        "deallocate", "dreal", "print", "stop", "subroutine", "dfloat",
-        "dsqrt", "dcos", "dsin", "sin", "cos", "sqrt", "continue", "mpi_real8",
-        "+", "=", "module", "mpi_status_size", "mpi_integer", "mpi_sum",
-        "mpi_max", "mpi_comm_world", "mpi_double_precision", "::", "\t", "\n"
-    ]
-
-    # Avoid some variables or external functions defined by the user:
-    user_exclude = [
-        "rannyu", "gauss", "int_from_cart", "gammai", "nterms4", "idiff",
-        "rnorm_nodes_num", "psinl", "psianl", "dpsianl", "psia", "psib",
-        "dpsibnl"
-    ]
-
-    # Initiate booleans to discern quotes:
-    in_quotes, double_quote, quoted_one_word = False, False, False
-    quoted_sign = ""
-
-    # Exclude all variables imported by the use statements:
-    exclude.extend(gather_use_variables(scope))
-
-    # Exclude variables already declared as reals:
-    for sd in scope.floats:
-        exclude.extend(x.lower() for x in sd.variables)
-
-    # Exclude variables already declared as integers:
-    for si in scope.integers:
-        exclude.extend(x.lower() for x in si.variables)
-
-    # Exclude variables already declared as characters:
-    for sc in scope.characters:
-        exclude.extend(x.lower() for x in sc.variables)
-
-    # Exclude variables already declared as characters:
-    for sc in scope.complexes:
-        exclude.extend(x.lower() for x in sc.variables)
-
-    # Exclude variables declared as parameters:
-    for sp in scope.parameters:
-        exclude.extend(x.lower() for x in sp.variables)
-
-    # Exclude variables declared with dimensions:
-    for sd in scope.dimensions:
-        exclude.extend(sd.variables)
-
-    # Analyse the whole scope.data:
-    bulky_var = []  # carry all the selected variables in scope.data.
-
-    for sd in scope.data:
-        # carry the selected variables per scope.data line.
-        sd_copy = []
-        sd_strip = []  # a copy of sd without ending lines.
-
-        for var in sd:
-            sd_strip.append(var.strip("\n").strip("\t").rstrip(","))
-
-        if len(sd_strip) == 0:
-            continue
+        scope.module.append(mod)
 
-        # Avoid use without only statements:
-        if len(sd_strip) == 2 and sd_strip[0] == "use":
-            continue
 
-        if len(sd_strip) >= 2:
+# Attribute of the scope listing the declarations of each type:
+_CATEGORIES = {
+    "real": "floats",
+    "double precision": "floats",
+    "integer": "integers",
+    "character": "characters",
+    "complex": "complexes",
+    "double complex": "complexes",
+}
 
-            if sd_strip[0].lower() in avoid_analysis:
-                continue
+# Leading words of the statements that may be declarations:
+_DECLARATION_WORDS = ("real", "double", "integer", "character", "complex",
+                      "logical", "type", "class", "dimension", "parameter")
 
-            # Add variables declared as characters to the exclude list:
-            if sd_strip[0].lower() == "character":
-                character_var = [x for x in sd_strip[1:] if not x.isdigit()]
-                exclude.extend(character_var)
 
-            starting_point = 0
+def fill_declaration(scope: Scope, symbols: List[Symbol]):
+    """Add the symbols of a declaration statement to the symbol table of a
+    scope, and to the list of declarations of their type.
 
-            # Exclude xxx in "subroutine xxx(a, b, c)":
-            if sd_strip[0] == "subroutine":
-                starting_point = 2
+    :param scope: Scope whose attributes are filled-in.
 
-            # Exclude xxx in call to subroutines/functions like "call xxx":
-            if sd_strip[0] == "call" or sd_strip[0] == "entry":
-                starting_point = 2
+    :param symbols: The symbols of the statement, see parse_statement.
+    """
+    for symbol in symbols:
+        declare(scope.symbols, symbol)
+
+    first = symbols[0]
+    if first.type is None and "parameter" in first.attributes:
+        scope.parameters.append(SimpleNamespace(
+            variables=[s.name for s in symbols],
+            values=[s.initializer for s in symbols]))
+        return
+    if first.type is None:
+        category = "dimensions"
+    else:
+        category = _CATEGORIES.get(first.type)
+    if category is not None:
+        getattr(scope, category).append(Declaration(
+            [s.name for s in symbols],
+            [s.dimensions or "None" for s in symbols]))
 
-            # Exclude xxx in call to subroutines/functions like "21 call xxx":
-            if (sd_strip[0].isdigit() or sd_strip[0] == "&") and \
-               sd_strip[1] == "call":
-                starting_point = 3
 
-            # Exclude lines like "20 format(....)":
-            if sd_strip[0].isdigit() and sd_strip[1] == "format":
-                continue
+def _bulky_candidates(sd: TokenLine, candidates: list, excluded_at: dict):
+    """Gather the words of a statement that may be undeclared variables.
 
-            # Start the main loop:
-            s_iter = iter(x for x in sd_strip[starting_point:] if len(x))
-            for x in s_iter:
-                # Skip xxx variables in lines like 'if() call xxx()':
-                if x == "call":
-                    next(s_iter)
+    :param sd: The statement.
 
-                # Skip commented text, e.g. " ier = 0  ! nullify error":
-                if x == "!":
-                    break
-                if "!" in x:
-                    x = x[:x.index("!")]
-                    if not len(x):
-                        break
-                # Deal with quotes ', '', ":
-                if not in_quotes:
-                    if x[0] == "\'":
-                        if len(x) > 1:
-                            if x[:2] == "\'\'":
-                                quoted_sign = "\'\'"
-                                double_quote = True
-                            else:
-                                quoted_sign = "\'"
-                        else:
-                            quoted_sign = "\'"
-
-                    if x[0] == "\"":
-                        quoted_sign = "\""
-
-                    if quoted_sign:
-                        in_quotes = True
-
-                    # Deal with quoted one-words:
-                    if len(x) > 2:
-                        if double_quote and x[-2:] == quoted_sign:
-                            quoted_one_word = True
-                        if (not double_quote) and x[-1:] == quoted_sign:
-                            quoted_one_word = True
-                else:
-                    if len(x) > 1:
-                        if double_quote:
-                            if x[-2:] == quoted_sign:
-                                in_quotes, double_quote = False, False
-                                quoted_sign = ""
-                        else:
-                            if x[-1:] == quoted_sign and x[-2:] != "\'\'":
-                                in_quotes = False
-                                quoted_sign = ""
-                    else:
-                        if x[-1:] == quoted_sign:
-                            in_quotes = False
-                            quoted_sign = ""
-
-                # Make sure that the potential variable is not a digit
-                # or digit in scientific notation,
-                # and has no point or ampersand, etc., and is not a
-                # single-quoted word or quoted text:
-                is_scientific_number = False
-                if has_number(x) and sum(c.isalpha() for c in x) == 1 and \
-                   (x.lower()).count('e') == 1:
-                    is_scientific_number = True
-
-                if (not x.isdigit()) and \
-                   not any(a in x for a in (".", "&", "(",
-                                            ")", "\'", "\"")) \
-                   and not in_quotes:
-                    variable = x
-                    # Raise waring if the variable is the user_exclude list:
-                    if variable in user_exclude:
-                        print("\t --- WARNING! ignoring user-defined "
-                              "variable: %s" % x)
-                        exclude.extend(user_exclude)
-                        print("\t --- is it a function? An interface is"
-                              "required!")
-                # Make sure it has some length, and is not in the
-                # exclude list:
-                    if len(variable) > 0 and variable.lower() \
-                       not in exclude and not is_scientific_number:
-                        sd_copy.append(variable)
-
-                # Reset booleans if x is a quoted_one_word:
-                if quoted_one_word:
-                    quoted_one_word, in_quotes = False, False
-                    if double_quote:
-                        double_quote = False
-                    quoted_sign = ""
-
-            if len(sd_copy):
-                bulky_var.append(sd_copy)
-
-    # Finish by deleting redundancies:
-    scope.bulky_var = (list(dict.fromkeys(flatten_string_list(bulky_var))))
-    return scope
+    :param candidates: Receives the (word, lowercase word, number of
+                       exclusions made so far) of the candidates.
 
-
-def gather_use_variables(scope: SimpleNamespace) -> List[str]:
-    """Add to a list all the variables imported by use statements in a
+    :param excluded_at: The exclusions made along the sweep, the words
+                        excluded by the statement are added.
+    """
+    kinds = [sd.kind(i) for i in range(len(sd))]
+    code = [i for i, kind in enumerate(kinds) if kind == CODE]
+    # a copy of the code words of sd (no literals, strings or comments)
+    # without ending lines, and its lowercase twin for the comparisons:
+    sd_strip = [sd[i].strip("\n").strip("\t").rstrip(",") for i in code]
+    fd = sd.folded
+    fd_strip = [fd[i].strip("\n").strip("\t").rstrip(",") for i in code]
+
+    if len(sd_strip) == 0:
+        return
+
+    # Avoid use without only statements:
+    if len(sd_strip) == 2 and fd_strip[0] == "use":
+        return
+
+    if len(sd_strip) + kinds.count(LITERAL) < 2 or \
+       fd_strip[0] in _AVOID_ANALYSIS:
+        return
+
+    # Add variables declared as characters to the exclude list:
+    if fd_strip[0] == "character":
+        _exclude(excluded_at, fd_strip[1:])
+
+    starting_point = 0
+
+    # Exclude xxx in "subroutine xxx(a, b, c)":
+    if fd_strip[0] == "subroutine":
+        starting_point = 2
+
+    # Exclude xxx in call to subroutines/functions like "call xxx":
+    if fd_strip[0] == "call" or fd_strip[0] == "entry":
+        starting_point = 2
+
+    # Exclude xxx in call to subroutines/functions like "& call xxx"
+    # (the labels, e.g. in "21 call xxx", are literals):
+    if fd_strip[0] == "&" and fd_strip[1:2] == ["call"]:
+        starting_point = 3
+
+    # Start the main loop:
+    s_iter = iter((x, lower) for x, lower in
+                  zip(sd_strip[starting_point:],
+                      fd_strip[starting_point:]) if len(x))
+    for x, lower in s_iter:
+        # Skip xxx variables in lines like 'if() call xxx()':
+        if lower == "call":
+            next(s_iter)
+
+        # Make sure that the potential variable has no point or
+        # ampersand, etc. (the numbers are already left out):
+        if not any(a in x for a in (".", "&", "(", ")")):
+            # Raise waring if the variable is the user_exclude list:
+            if lower in _USER_EXCLUDE:
+                print("\t --- WARNING! ignoring user-defined "
+                      "variable: %s" % x)
+                _exclude(excluded_at, _USER_EXCLUDE)
+                print("\t --- is it a function? An interface is"
+                      "required!")
+            if len(x) > 0:
+                candidates.append((x, lower, excluded_at.get(None, 0)))
+
+
+def _exclude(excluded_at: dict, words):
+    """Exclude words from the bulky variables from now on: the number of
+    exclusions is kept under the None key."""
+    number = excluded_at.get(None, 0) + 1
+    excluded_at[None] = number
+    for word in words:
+        excluded_at.setdefault(word, number)
+
+
+def _filter_bulky_var(scope: Scope, candidates: list,
+                      excluded_at: dict) -> List[str]:
+    """Filter the candidates of a scope that are not imported by the use
+    statements nor declared.
+
+    :param scope: Scope with its module and declarations filled-in.
+
+    :param candidates: The candidates found by _bulky_candidates.
+
+    :param excluded_at: The exclusions made along the sweep.
+
+    :return: List[] containing all the unique variables found in
+             scope.data that are not imported by the use imports.
+    """
+    # The layers of exclusion, none of them copied: the keywords, the
+    # intrinsics, the variables imported by the use statements and the
+    # declared variables:
+    imported = gather_use_variables(scope)
+    declared = scope.symbols
+
+    # (the words excluded along the sweep only drop the later candidates)
+    never = float('inf')
+    return list(dict.fromkeys(
+        x for x, lower, number in candidates
+        if lower not in _KEYWORDS and lower not in _INTRINSICS
+        and lower not in imported and lower not in declared
+        and excluded_at.get(lower, never) > number))
+
+
+def gather_use_variables(scope: Scope) -> Set[str]:
+    """Gather in a set all the variables imported by use statements in a
     scope.module.
 
     :param scope:
 
-    :return: List with the variable names.
+    :return: Set with the lowercase variable names.
     """
-    variable_list = []
-    for sm in scope.module:
-        for v in sm.var:
-            variable_list.append(v.name.lower())
+    variables = {v.name.lower() for sm in scope.module for v in sm.var}
     # Quick fix, move somewhere else:
-    variable_list.append("mpi_status_size")
-    return variable_list
+    variables.add("mpi_status_size")
+    return variables
 
 
-def gather_use_names(scope: SimpleNamespace) -> List[str]:
-    """Add to a list all the 'use'-imported modules of scope SimpleNamespace.
+def gather_use_names(scope: Scope) -> List[str]:
+    """Add to a list all the 'use'-imported modules of a scope.
 
     :param scope:
 
@@ -596,52 +497,66 @@ def gather_use_names(scope: SimpleNamespace) -> List[str]:
     return module_names
 
 
-def modify_rawdata(rawdata: List[str], scopes: List[SimpleNamespace],
-                   clean_use: bool, clean_implicit: bool) -> List[str]:
+def modify_rawdata(rawdata: List[str], statements: List[Statement],
+                   scopes: List[Scope], clean_use: bool,
+                   clean_implicit: bool,
+                   form: Optional[str] = None) -> List[str]:
     """Modify rawdata input according to scopes and argument flags.
 
     :param rawdata: List of the bulky content of the read file.
 
+    :param statements: Logical statements of rawdata the scopes refer to.
+
     :param scopes: List of scopes.
 
     :param clean_use: Boolean to replace or not the implicit real.
 
     :param clean_implicit: Boolean to replace or not the implicit real.
 
+    :param form: Form of rawdata, detected from its lines if not given.
+
     :return: rawdata with modifications.
     """
-    for index, scope in enumerate(scopes):
+    form = form or detect_form(lines=rawdata)
+    # The lines of the scopes, while lines are added and deleted:
+    lines = ScopeIndex(scopes, statements, len(rawdata))
+    if clean_use:
+        # the names used by the other builds of the file:
+        kept = inactive_names(rawdata, statements, form)
+    for scope in scopes:
         print('  - Modifying rawdata of scope: %s' % scope.name)
         if clean_use:
             # Count the number of var calls per var per module in scope:
-            scope = count_var(scope)
+            scope = count_var(scope, kept, contained_scopes(scope, scopes))
 
             # clean the raw data
-            rawdata = clean_raw_data(rawdata, scope)
+            rawdata = clean_raw_data(rawdata, statements, scope, lines)
 
         # add undeclared variables:
         if clean_implicit:
             if len(scope.bulky_var):
-                rawdata = add_undeclared_variables(rawdata, scope, index)
-                rawdata = add_use_precision_kinds(rawdata, scope, index)
-                rawdata = delete_parameters(rawdata)
-                rawdata = delete_dimensions(rawdata)
+                rawdata = add_undeclared_variables(rawdata, scope, lines)
+                rawdata = add_use_precision_kinds(rawdata, scope, lines)
+                rawdata = delete_parameters(rawdata, lines, form)
+                rawdata = delete_dimensions(rawdata, lines, form)
             else:
-                rawdata = add_parameters(rawdata, scope, index)
-                rawdata = delete_parameters(rawdata)
+                rawdata = add_parameters(rawdata, scope, lines)
+                rawdata = delete_parameters(rawdata, lines, form)
                 print('      No potential variables found in the scope.')
 
         print('    ... done!\n')
     return rawdata
 
 
-def modify_rawdata_move_var(rawdata: List[str], scopes: List[SimpleNamespace],
-                            var_name: str, new_module: str,
-                            from_module: str) -> List[str]:
+def modify_rawdata_move_var(rawdata: List[str], statements: List[Statement],
+                            scopes: List[Scope], var_name: str,
+                            new_module: str, from_module: str) -> List[str]:
     """Modify rawdata input according to scopes and argument flags.
 
     :param rawdata: List of the bulky content of the read file.
 
+    :param statements: Logical statements of rawdata the scopes refer to.
+
     :param scopes: List of scopes.
 
     :param var_name: Name of the new variable.
@@ -650,83 +565,94 @@ def modify_rawdata_move_var(rawdata: List[str], scopes: List[SimpleNamespace],
 
     :return: rawdata with modifications.
     """
+    lines = ScopeIndex(scopes, statements, len(rawdata))
     insert_lines = []
-    for index, scope in enumerate(scopes):
+    for scope in scopes:
         print('  - Modifying rawdata of scope: %s' % scope.name)
 
         # clean the raw data
-        rawdata, isrt_line = remove_variable(rawdata, scope, var_name,
-                                             new_module, from_module)
+        rawdata, isrt_line = remove_variable(rawdata, statements, scope,
+                                             var_name, new_module,
+                                             from_module, lines)
 
         if isrt_line is not None:
             insert_lines.append(isrt_line)
         print('    ... done!\n')
 
     rewrite = False
-    for idx, isrt_line in enumerate(insert_lines):
+    for isrt_line in insert_lines:
         rewrite = True
-        index = idx + isrt_line[0]
+        index = lines.line(isrt_line[0])
         line = isrt_line[1]
         rawdata.insert(index, line)
+        lines.insert(index)
     return rawdata, rewrite
 
 
-def count_var(scope: SimpleNamespace) -> SimpleNamespace:
+def count_var(scope: Scope, kept: Optional[Counter] = None,
+              contained: Sequence[Scope] = ()) -> Scope:
     """[summary]
 
+    The procedures contained in the scope see its imports: their
+    statements are counted with the ones of the scope.
+
     Args:
-        scope (SimpleNamespace): [description]
+        scope (Scope): [description]
+        kept (Optional[Counter]): occurrences of the lowercase names to
+                                  count too, e.g. from inactive_names
+        contained (Sequence[Scope]): the scopes contained in scope
 
     Returns:
-        SimpleNamespace: [description]
+        Scope: [description]
     """
-    # Avoid to count variables in commented lines
-    # and in use statements
-    exclude = ["c", "C", "!", "use"]
-    # data_copy = [var for index, var in enumerate(scope.data)
-    #              if var[0] not in exclude]
-
-    # remove commented lines and comment tha
-    # are in the middle of the line
-    data_copy = []
-    for index, var in enumerate(scope.data):
-        if var[0] not in exclude:
-            idx = [ii for ii, v in enumerate(var) if v.startswith('!')]
-            if len(idx) > 0:
-                data_copy.append(var[:idx[0]])
-            else:
-                data_copy.append(var)
+    # Avoid to count variables in use statements, the store leaves
+    # comments and strings out; the identifiers are counted in one pass:
+    counts = scope.tokens.occurrences(
+        index for part in (scope, *contained)
+        for index, var in enumerate(part.data, part.istart)
+        if var.folded[0] != "use")
 
     for mod in scope.module:
         for var in mod.var:
-            c = count(data_copy, var.name)
+            c = scope.tokens.tally(counts, var.name)
+            if kept:
+                c += kept[var.name.lower()]
             var.count = c
             mod.total_count += c
     return scope
 
 
-def count(scope_data: List[str], varname: str) -> int:
-    """Count the number of time a variable appears in the.
+def contained_scopes(scope: Scope, scopes: Sequence[Scope]) -> List[Scope]:
+    """Get the scopes of the procedures contained in a scope, at any depth.
 
     Args:
-        scope_data (List[str]): data of the scope
-        var (str): name of the vairable
+        scope (Scope): the host scope
+        scopes (Sequence[Scope]): the scopes of the file
 
     Returns:
-        int: count
+        List[Scope]: the contained ones, in file order
     """
-    joined_data = ' ' + \
-        ' '.join(flatten_string_list(scope_data)) + ' '
-    pattern = re.compile('[\W\s]' + varname + '[\W\s]', re.IGNORECASE)
-    return len(pattern.findall(joined_data))
+    contained = []
+    for other in scopes:
+        parent = other.parent
+        while parent is not None and parent is not scope:
+            parent = parent.parent
+        if parent is not None:
+            contained.append(other)
+    return contained
 
 
-def clean_raw_data(rawdata: List[str], scope: SimpleNamespace) -> List[str]:
-    """
+def clean_raw_data(rawdata: List[str], statements: List[Statement],
+                   scope: Scope,
+                   lines: Optional[ScopeIndex] = None) -> List[str]:
+    """Remove the unused variables from the use statements of a scope.
 
     Args:
         rawdata (List[str]): [description]
-        scope (SimpleNamespace): [description]
+        statements (List[Statement]): statements of rawdata
+        scope (Scope): [description]
+        lines (Optional[ScopeIndex]): the lines of the scopes, if rawdata
+                                      was edited since statements were read
 
     Returns:
         List[str]: [description]
@@ -735,47 +661,48 @@ def clean_raw_data(rawdata: List[str], scope: SimpleNamespace) -> List[str]:
     for mod in scope.module:
 
         print('  --  Module : %s' % mod.name)
-        idx_rawdata = scope.istart + mod.iline
+        statement = statements[scope.istart + mod.iline]
+        if lines is not None:
+            statement = lines.statement(statement)
 
         if mod.total_count == 0:
             print('      No variable called, removing the entire module')
-            rawdata[idx_rawdata] = ''
-            idx_rawdata += 1
-            while rawdata[idx_rawdata].lstrip(' ').startswith('&'):
-                rawdata[idx_rawdata] = ''
-                idx_rawdata += 1
+            rawdata = replace_statement(rawdata, statement, '')
 
         else:
 
-            ori_line = rawdata[idx_rawdata]
-            line = ori_line.split('use')[0] + 'use ' + mod.name + ', only: '
+            ori_line = rawdata[statement.first]
+            head = re.split('use', ori_line, 1, re.IGNORECASE)[0] + \
+                'use ' + mod.name + ', only: '
 
+            names = []
             for var in mod.var:
                 if var.count != 0:
-                    line += var.name + ', '
+                    names.append(var.name)
                 else:
                     print('  ---   removing unused variable %s' % var.name)
-            rawdata[idx_rawdata] = line.rstrip(', ') + '\n'
-
-            # remove the unwanted
-            idx_rawdata += 1
-            while rawdata[idx_rawdata].lstrip(' ').startswith('&'):
-                rawdata[idx_rawdata] = ''
-                idx_rawdata += 1
+            rawdata = replace_statement(
+                rawdata, statement, format_statement(statement, head, names))
 
     return rawdata
 
 
-def remove_variable(rawdata: List[str], scope: SimpleNamespace, var_name: str,
-                    new_module: str, from_module: str) -> List[str]:
+def remove_variable(rawdata: List[str], statements: List[Statement],
+                    scope: Scope, var_name: str, new_module: str,
+                    from_module: str,
+                    lines: Optional[ScopeIndex] = None) -> List[str]:
     """
 
     Args:
         rawdata (List[str]): [description]
-        scope (SimpleNamespace): [description]
+        statements (List[Statement]): statements of rawdata
+        scope (Scope): [description]
+        lines (Optional[ScopeIndex]): the lines of the scopes, if rawdata
+                                      was edited since statements were read
 
     Returns:
-        List[str]: [description]
+        List[str]: [description], the line to insert is at its position
+                   in the original rawdata
     """
 
     add_var = False
@@ -799,7 +726,9 @@ def remove_variable(rawdata: List[str], scope: SimpleNamespace, var_name: str,
 
         if contains_var:
 
-            idx_rawdata = scope.istart + mod.iline
+            statement = statements[scope.istart + mod.iline]
+            if lines is not None:
+                statement = lines.statement(statement)
 
             if nvar == 0:
 
@@ -807,68 +736,60 @@ def remove_variable(rawdata: List[str], scope: SimpleNamespace, var_name: str,
                 print(
                     '      Only variable %s in module %s, removing the entire module'
                     % (var_name, mod.name))
-                rawdata[idx_rawdata] = ''
-                idx_rawdata += 1
-                while rawdata[idx_rawdata].lstrip(' ').startswith('&'):
-                    rawdata[idx_rawdata] = ''
-                    idx_rawdata += 1
+                rawdata = replace_statement(rawdata, statement, '')
 
             else:
 
-                ori_line = rawdata[idx_rawdata]
-                line = ori_line.split(
-                    'use')[0] + 'use ' + mod.name + ', only: '
+                ori_line = rawdata[statement.first]
+                head = re.split('use', ori_line, 1, re.IGNORECASE)[0] + \
+                    'use ' + mod.name + ', only: '
 
-                for var in mod.var:
+                names, comment = [], ''
+                for index, var in enumerate(mod.var):
 
                     if var.name == '!':
-                        print(line)
-                        line = line[:-2] + ' ! '
-                        print(line)
+                        comment = ' ' + ' '.join(
+                            v.name for v in mod.var[index:])
+                        break
 
                     elif var.name != var_name:
-                        line += var.name + ', '
+                        names.append(var.name)
 
                     else:
                         add_var = True
                         print('  ---   removing variable %s' % var.name)
-                rawdata[idx_rawdata] = line.rstrip(', ') + '\n'
-
-                # remove the unwanted
-                idx_rawdata += 1
-                while rawdata[idx_rawdata].lstrip(' ').startswith('&'):
-                    rawdata[idx_rawdata] = ''
-                    idx_rawdata += 1
+                rawdata = replace_statement(
+                    rawdata, statement,
+                    format_statement(statement, head, names, comment))
 
     # add a new line to the module use
     insert_line = None
     if add_var:
         print('  --  Adding variable %s to module %s' % (var_name, new_module))
         idx_use = [
-            idx for idx, line in enumerate(rawdata[scope.istart:scope.iend])
-            if line.lstrip().startswith('use')
+            statements[scope.istart + idx].last
+            for idx, sd in enumerate(scope.data)
+            if sd and sd[0].strip() == 'use'
         ]
-        # new_line = rawdata[idx_use[-1]]
         new_line = '      ' + 'use ' + new_module + ', only: ' + var_name + '\n'
         if len(idx_use) > 0:
-            offset = idx_use[-1] + 1
+            insert_index = idx_use[-1] + 1
         else:
-            offset = 2
-        insert_line = (scope.istart + offset, new_line)
-        # rawdata.insert(scope.istart+idx_use[-1]+1, new_line)
+            insert_index = statements[scope.istart].first + 2
+        insert_line = (insert_index, new_line)
 
     return rawdata, insert_line
 
 
-def add_undeclared_variables(rawdata: List[str], scope: SimpleNamespace,
-                             index: int) -> List[str]:
+def add_undeclared_variables(rawdata: List[str], scope: Scope,
+                             lines: ScopeIndex) -> List[str]:
     """Add undeclared variables of a scope in rawdata.
 
     :param rawdata: Entry rawdata to add undeclared variables to.
 
     :param scope: Scope with the undeclared variables.
 
-    :param index: index of scope in the precendent SimpleNamespace.
+    :param lines: Index of the lines of the scopes in rawdata.
 
     :return: Entry rawdata with the new variables declared.
     """
@@ -887,11 +808,15 @@ def add_undeclared_variables(rawdata: List[str], scope: SimpleNamespace,
     max_line_length = 10  # Here change the maximum of length line.
     new_integer_line = False
     new_float_line = False
+    # The variables of the other types, by type:
+    new_others = {}
 
+    # (the implicit types of the scope, one lookup per variable)
+    types = scope.implicit or IMPLICIT_DEFAULT
     for var in sorted(scope.bulky_var):
-        integer_variables = string.ascii_lowercase[8:14]
+        type_ = refactored_type(types, var)
         # Collect potential integer variables:
-        if var[0] in integer_variables:
+        if type_ == 'integer':
             if len(new_integers) >= max_line_length * index_integer:
                 index_integer += 1
                 new_integers.extend(["\n", '      integer', ' :: '])
@@ -906,6 +831,10 @@ def add_undeclared_variables(rawdata: List[str], scope: SimpleNamespace,
             else:
                 new_integers.extend([var])
 
+        # Collect potential variables of other types:
+        elif type_ != 'real(dp)':
+            new_others.setdefault(type_, []).append(var)
+
         # Collect potential float variables:
         else:
             if len(new_floats) >= max_line_length * index_float:
@@ -932,7 +861,8 @@ def add_undeclared_variables(rawdata: List[str], scope: SimpleNamespace,
     if len(scope.parameters):
         for sd in scope.parameters:
             for variable_index, variable in enumerate(sd.variables):
-                if variable[0] in integer_variables:
+                type_ = refactored_type(types, variable)
+                if type_ == 'integer':
                     new_integer_parameters.extend([
                         '      integer', ', ', 'parameter', ' :: ',
                         sd.variables[variable_index], ' = ',
@@ -940,7 +870,7 @@ def add_undeclared_variables(rawdata: List[str], scope: SimpleNamespace,
                     ])
                 else:
                     new_float_parameters.extend([
-                        '      real(dp)', ', ', 'parameter', ' :: ',
+                        '      ' + type_, ', ', 'parameter', ' :: ',
                         sd.variables[variable_index], ' = ',
                         sd.values[variable_index], "\n"
                     ])
@@ -950,7 +880,8 @@ def add_undeclared_variables(rawdata: List[str], scope: SimpleNamespace,
         use_variables = gather_use_variables(scope)
         for sd in scope.dimensions:
             for variable_index, variable in enumerate(sd.variables):
-                if variable[0] in integer_variables:
+                type_ = refactored_type(types, variable)
+                if type_ == 'integer':
                     new_integer_dimensions.extend([
                         '      integer', ', ', 'dimension',
                         sd.dimensions[variable_index], ' :: ',
@@ -958,7 +889,7 @@ def add_undeclared_variables(rawdata: List[str], scope: SimpleNamespace,
                     ])
                 else:
                     new_float_dimensions.extend([
-                        '      real(dp)', ', ', 'dimension',
+                        '      ' + type_, ', ', 'dimension',
                         sd.dimensions[variable_index], ' :: ',
                         sd.variables[variable_index], "\n"
                     ])
@@ -1036,12 +967,17 @@ def add_undeclared_variables(rawdata: List[str], scope: SimpleNamespace,
                                         + new_floats \
                                         + new_float_dimensions \
                                         + new_float_parameters
-
-    # Add declared missed variables to raw data after an "implicit none"
-    # declaration:
-    implicit_indexes = list_duplicates(rawdata, "implicit none")
-    rawdata[implicit_indexes[index] +
-            1:implicit_indexes[index]] = new_variables_to_add
+    for type_, names in sorted(new_others.items()):
+        new_variables_to_add.extend(
+            ['      ' + type_, ' :: ', ', '.join(names), "\n"])
+
+    # Add declared missed variables to raw data after the "implicit none"
+    # declaration of the scope:
+    implicit_index = find_implicit_none(rawdata, scope, lines)
+    if implicit_index is None:
+        return rawdata
+    rawdata[implicit_index + 1:implicit_index + 1] = new_variables_to_add
+    lines.insert(implicit_index + 1, len(new_variables_to_add))
 
     # For future references, add new_variables_to_add to scope after
     # the last 'use':
@@ -1059,8 +995,8 @@ def add_undeclared_variables(rawdata: List[str], scope: SimpleNamespace,
     return rawdata
 
 
-def add_use_precision_kinds(rawdata: List[str], scope: SimpleNamespace,
-                            index: int) -> List[str]:
+def add_use_precision_kinds(rawdata: List[str], scope: Scope,
+                            lines: ScopeIndex) -> List[str]:
     """Add 'use precision_kinds, only: dp' to rawdata and scope if a 'real(dp)'
     declaration is found in scope.
 
@@ -1068,7 +1004,7 @@ def add_use_precision_kinds(rawdata: List[str], scope: SimpleNamespace,
 
     :param scope: Scope to be queried.
 
-    :param index: index of scope in the precendent SimpleNamespace.
+    :param lines: Index of the lines of the scopes in rawdata.
 
     :return: Entry rawdata with the 'use precision_kinds' statement inserted.
     """
@@ -1076,44 +1012,43 @@ def add_use_precision_kinds(rawdata: List[str], scope: SimpleNamespace,
     # True if a 'use precision_kinds' is declared.
     precision_kinds = False
 
-    # Get indexes:
-    implicit_indexes = list_duplicates(rawdata, "implicit none")
-
     # Discern if the addition is needed:
     for sm in scope.data:
-        if "real(dp)" in [x.lstrip() for x in sm]:
+        if any(x.lstrip() in ("real(dp)", "complex(dp)") for x in sm):
             new_floats = True
     for sm in scope.module:
         if 'precision_kinds' in sm.name and sm.var[0].name == "dp":
             precision_kinds = True
 
-    # Add statement to rawdata:
-    if new_floats and not precision_kinds:
+    # Add statement to rawdata, before the "implicit none":
+    implicit_index = find_implicit_none(rawdata, scope, lines)
+    if new_floats and not precision_kinds and implicit_index is not None:
         use_statement = ["      use precision_kinds, only: dp\n"]
-        rawdata[
-            implicit_indexes[index]:implicit_indexes[index]] = use_statement
+        rawdata[implicit_index:implicit_index] = use_statement
+        lines.insert(implicit_index)
 
     return rawdata
 
 
-def add_parameters(rawdata: List[str], scope: SimpleNamespace,
-                   index: int) -> List[str]:
+def add_parameters(rawdata: List[str], scope: Scope,
+                   lines: ScopeIndex) -> List[str]:
     """Add parmeters in case of a empty bulky_var.
 
     :param rawdata: Entry rawdata to add undeclared variables to.
 
     :param scope: Scope with the parameters to add.
 
-    :param index: index of scope in the precendent SimpleNamespace.
+    :param lines: Index of the lines of the scopes in rawdata.
 
     :return: Entry rawdata with the new variables declared.
     """
     if len(scope.parameters):
         new_integer_parameters, new_float_parameters = [], []
-        integer_variables = string.ascii_lowercase[8:14]
+        types = scope.implicit or IMPLICIT_DEFAULT
         for sd in scope.parameters:
             for variable_index, variable in enumerate(sd.variables):
-                if variable[0] in integer_variables:
+                type_ = refactored_type(types, variable)
+                if type_ == 'integer':
                     new_integer_parameters.extend([
                         '      integer', ', ', 'parameter', ' :: ',
                         sd.variables[variable_index], ' = ',
@@ -1121,7 +1056,7 @@ def add_parameters(rawdata: List[str], scope: SimpleNamespace,
                     ])
                 else:
                     new_float_parameters.extend([
-                        '      real(dp)', ', ', 'parameter', ' :: ',
+                        '      ' + type_, ', ', 'parameter', ' :: ',
                         sd.variables[variable_index], ' = ',
                         sd.values[variable_index], "\n"
                     ])
@@ -1130,11 +1065,13 @@ def add_parameters(rawdata: List[str], scope: SimpleNamespace,
         new_variables_to_add = new_integer_parameters \
             + new_float_parameters
 
-        # Add declared missed variables to raw data after an "implicit none"
-        # declaration:
-        implicit_indexes = list_duplicates(rawdata, "implicit none")
-        rawdata[implicit_indexes[index] +
-                1:implicit_indexes[index]] = new_variables_to_add
+        # Add declared missed variables to raw data after the "implicit
+        # none" declaration of the scope:
+        implicit_index = find_implicit_none(rawdata, scope, lines)
+        if implicit_index is None:
+            return rawdata
+        rawdata[implicit_index + 1:implicit_index + 1] = new_variables_to_add
+        lines.insert(implicit_index + 1, len(new_variables_to_add))
 
         # For future references, add new_variables_to_add to scope after
         # the last 'use':
@@ -1152,64 +1089,89 @@ def add_parameters(rawdata: List[str], scope: SimpleNamespace,
     return rawdata
 
 
+def find_implicit_none(rawdata: List[str], scope: Scope,
+                       lines: ScopeIndex) -> Optional[int]:
+    """Find the "implicit none" declaration of a scope in rawdata.
+
+    :param rawdata: Entry rawdata, possibly edited.
+
+    :param scope: Scope to be queried.
+
+    :param lines: Index of the lines of the scopes in rawdata.
+
+    :return: Index of the declaration in rawdata, None if the scope has none.
+    """
+    start, end = lines.line_range(scope)
+    indexes = list_duplicates(rawdata[start:end], "implicit none")
+    if not indexes:
+        print('      No "implicit none" found in the scope.')
+        return None
+    return start + indexes[0]
+
+
 def list_duplicates(seq: list, item: str):
     """Find indexes of duplicate items in a list.
 
     :param seq: Entry list[] to inspect.
 
-    :param item: Item to look for in the seq list.
+    :param item: Item to look for in the seq list, lowercase.
 
     :return indexes: Output list with the indexes where item appears.
     """
-    start_at = -1
-    indexes = []
-    # Fist, strip and lowercase the entry list:
-    seq_copy = [rd.lstrip().strip("\n").lower() for rd in seq]
-
-    while True:
-        try:
-            loc = seq_copy.index(item, start_at + 1)
-        except ValueError:
-            break
-        else:
-            indexes.append(loc)
-            start_at = loc
-    return indexes
+    # Match the stripped lines without lowercasing the entry list:
+    match = re.compile(r'\s*%s\n*' % re.escape(item), re.IGNORECASE).fullmatch
+    return [index for index, rd in enumerate(seq) if match(rd)]
 
 
-def delete_parameters(rawdata: List[str]) -> List[str]:
-    """Delete lines starting with the word parameter, e.g: parameter(zero.
+def delete_parameters(rawdata: List[str],
+                      lines: Optional[ScopeIndex] = None,
+                      form: Optional[str] = None) -> List[str]:
+    """Delete statements starting with the word parameter, e.g: parameter(zero.
 
     =0.d0, one=1.0d0)
 
     Args:
         rawdata (List[str]): [description]
+        lines (Optional[ScopeIndex]): records the deleted lines, if given
+        form (Optional[str]): form of rawdata, detected if not given
 
     Returns:
         List[List[str]]: [description]
     """
-    rawdata = [
-        rd for rd in rawdata
-        if not ((rd.lstrip(" ").startswith("parameter") and not rd.lstrip(" ")
-                 == "parameters") and len(rd.lstrip(" ")) > 9)
-    ]
-
-    return rawdata
-
-
-def delete_dimensions(rawdata: List[str]) -> List[str]:
-    """Delete lines starting with the word dimensions, e.g: dimension
+    dropped = []
+    rawdata = drop_statements(
+        rawdata, lambda rd: rd.lstrip(" ").startswith("parameter") and
+        not rd.lstrip(" ") == "parameters" and len(rd.lstrip(" ")) > 9,
+        dropped, form)
+    return _record_deletions(rawdata, dropped, lines)
+
+
+def delete_dimensions(rawdata: List[str],
+                      lines: Optional[ScopeIndex] = None,
+                      form: Optional[str] = None) -> List[str]:
+    """Delete statements starting with the word dimensions, e.g: dimension
     r(3),r_basis(3)
 
     Args:
         rawdata (List[str]): [description]
+        lines (Optional[ScopeIndex]): records the deleted lines, if given
+        form (Optional[str]): form of rawdata, detected if not given
 
     Returns:
         List[List[str]]: [description]
     """
-    rawdata = [
-        rd for rd in rawdata if not (
-            rd.lstrip(" ").startswith("dimension") and len(rd.lstrip(" ")) > 9)
-    ]
-
+    dropped = []
+    rawdata = drop_statements(
+        rawdata, lambda rd: rd.lstrip(" ").startswith("dimension") and
+        len(rd.lstrip(" ")) > 9, dropped, form)
+    return _record_deletions(rawdata, dropped, lines)
+
+
+def _record_deletions(rawdata: List[str], dropped: List[int],
+                      lines: Optional[ScopeIndex]) -> List[str]:
+    """Record the deleted lines in the index of the scopes, if any."""
+    if lines is not None:
+        # the last ones first, for the others to keep their position:
+        for index in reversed(dropped):
+            lines.delete(index)
     return rawdata
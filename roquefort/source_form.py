@@ -0,0 +1,134 @@
+"""Source form of the Fortran files: detection and line classification."""
+from itertools import islice
+from os.path import splitext
+from typing import Callable, Iterable, Optional, Tuple
+from roquefort.lexer import is_comment_line
+
+# Source forms
+FIXED_FORM = 'fixed'
+FREE_FORM = 'free'
+
+# Kinds of physical lines
+BLANK = 'blank'
+COMMENT_LINE = 'comment'
+CONTINUATION = 'continuation'
+INITIAL = 'initial'
+
+# Extensions of the free-form files, the others are taken as fixed form:
+FREE_EXTENSIONS = frozenset(['.f90', '.f95', '.f03', '.f08', '.f18'])
+
+# Number of lines looked at by the content sniff:
+SNIFF_LINES = 200
+
+# Characters of column 6 that do not continue a fixed-form line:
+_NOT_CONTINUED = (' ', '0', '\t', '\n')
+
+
+def detect_form(filename: Optional[str] = None,
+                lines: Optional[Iterable[str]] = None) -> str:
+    """Tell if a file is written in fixed or free form.
+
+    The extension gives a first guess, which the
+    first lines of the file confirm or overrule: comments and continuation
+    marks in the fixed columns vote for fixed form, statements starting in
+    the first five columns and trailing '&' vote for free form. The
+    extension breaks the ties.
+
+    Args:
+        filename (Optional[str], optional): name of the file
+        lines (Optional[Iterable[str]], optional): the lines of the file
+
+    Returns:
+        str: FIXED_FORM or FREE_FORM
+    """
+    extension = splitext(filename)[1].lower() if filename else ''
+    guess = FREE_FORM if extension in FREE_EXTENSIONS else FIXED_FORM
+    if lines is None:
+        return guess
+
+    fixed = free = 0
+    trailing = False
+    for line in islice(lines, SNIFF_LINES):
+        if not line.strip():
+            continue
+        if is_comment_line(line):
+            if line[0] != '!':
+                fixed += 1
+            continue
+        code = line.split('!', 1)[0].rstrip()
+        if not code:
+            continue
+        if not trailing and _fixed_continuation_mark(line):
+            fixed += 1
+        elif code[0] != '\t' and code[:5].lstrip()[:1].isalpha():
+            # (a tab in column 1 stands for the fixed columns)
+            free += 1
+        trailing = code.endswith('&')
+        free += trailing
+
+    if fixed == free:
+        return guess
+    return FIXED_FORM if fixed > free else FREE_FORM
+
+
+def _fixed_continuation_mark(line: str) -> bool:
+    """Check if column 6 holds a continuation mark, telling it apart from
+    free-form code or labels starting there."""
+    if len(line) < 7 or line[:5] != '     ':
+        return False
+    mark = line[5]
+    if mark.isdigit():
+        return line[6] not in ' \t' and not line[6].isdigit()
+    return mark not in _NOT_CONTINUED and not mark.isalpha() and mark != '_'
+
+
+def classify_fixed_line(line: str) -> Tuple[str, int]:
+    """Classify a fixed-form line.
+
+    The column rules are applied by slicing: a comment mark in column 1,
+    a continuation mark in column 6 below blank label columns.
+
+    Args:
+        line (str): the physical line
+
+    Returns:
+        Tuple[str, int]: the kind of line and where its code starts
+    """
+    if is_comment_line(line):
+        return COMMENT_LINE, 0
+    if len(line) > 6 and line[5] not in _NOT_CONTINUED and \
+       not line[:5].strip():
+        return CONTINUATION, 6
+    return classify_free_line(line)
+
+
+def classify_free_line(line: str) -> Tuple[str, int]:
+    """Classify a free-form line, without any column rule.
+
+    Args:
+        line (str): the physical line
+
+    Returns:
+        Tuple[str, int]: the kind of line and where its code starts
+    """
+    stripped = line.lstrip()
+    if not stripped:
+        return BLANK, 0
+    if stripped[0] == '!':
+        return COMMENT_LINE, 0
+    if stripped[0] == '&':
+        return CONTINUATION, len(line) - len(stripped) + 1
+    return INITIAL, 0
+
+
+def line_classifier(form: str) -> Callable[[str], Tuple[str, int]]:
+    """Get the line classifier of a source form.
+
+    Args:
+        form (str): FIXED_FORM or FREE_FORM
+
+    Returns:
+        Callable[[str], Tuple[str, int]]: classify_fixed_line or
+                                          classify_free_line
+    """
+    return classify_fixed_line if form == FIXED_FORM else classify_free_line
@@ -0,0 +1,217 @@
+"""Words stored as spans of a shared text buffer."""
+from array import array
+from bisect import bisect_right
+from collections.abc import Sequence
+from typing import Iterable, Iterator, Optional, Pattern, Tuple
+import string
+from roquefort.lexer import (CODE, COMMENT, LITERAL, STRING, Mask, is_literal,
+                             mask_line)
+
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+class TokenLine(Sequence):
+    """The words of a statement, stored as (start, end) offsets into the
+    text buffer of the file.
+
+    It behaves as a read-only list of str, each word being sliced out of
+    the buffer only when it is accessed. The string literals and the
+    comment of the statement (its mask) are found once, when first needed,
+    and shared by the slices of the line. So is the lowercase shadow of the
+    buffer, which the keyword and identifier comparisons slice the folded
+    words from.
+    """
+
+    __slots__ = ('buffer', 'spans', 'start', 'end', '_mask', '_lower',
+                 '_folded')
+
+    def __init__(self,
+                 buffer: str,
+                 spans: Iterable[int] = (),
+                 start: int = 0,
+                 end: Optional[int] = None,
+                 mask: Optional[Mask] = None,
+                 lower: Optional[str] = None):
+        """Initialize the line from flat start/end pairs of the buffer.
+
+        Args:
+            buffer (str): the text holding the words
+            spans (Iterable[int]): flat start/end pairs of the words
+            start (int, optional): offset of the statement in the buffer
+            end (Optional[int], optional): end of the statement
+            mask (Optional[Mask], optional): the mask, if already known
+            lower (Optional[str], optional): the buffer folded to lowercase,
+                                             if already known
+        """
+        self.buffer = buffer
+        self.spans = spans if isinstance(spans, array) else array('l', spans)
+        self.start = start
+        self.end = len(buffer) if end is None else end
+        self._mask = mask
+        self._lower = lower
+        self._folded = None
+
+    def __len__(self) -> int:
+        return len(self.spans) // 2
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return TokenLine(self.buffer,
+                                 self.spans[2 * start:2 * max(start, stop)],
+                                 self.start, self.end, self.mask,
+                                 self._lower)
+            return [self[i] for i in range(start, stop, step)]
+        start, end = self.span(index)
+        return self.buffer[start:end]
+
+    def __iter__(self):
+        buffer, spans = self.buffer, self.spans
+        for i in range(0, len(spans), 2):
+            yield buffer[spans[i]:spans[i + 1]]
+
+    def span(self, index: int) -> Tuple[int, int]:
+        """Get the offsets of a word in the buffer.
+
+        Args:
+            index (int): index of the word
+
+        Returns:
+            Tuple[int, int]: start and end offsets
+        """
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('TokenLine index out of range')
+        return self.spans[2 * index], self.spans[2 * index + 1]
+
+    @property
+    def mask(self) -> Mask:
+        """The string literals and the comment of the statement."""
+        if self._mask is None:
+            self._mask = mask_line(self.buffer, self.start, self.end)
+        return self._mask
+
+    @property
+    def lower(self) -> str:
+        """The buffer folded to lowercase, offsets unchanged."""
+        if self._lower is None:
+            self._lower = fold_case(self.buffer)
+        return self._lower
+
+    @property
+    def folded(self) -> 'TokenLine':
+        """The same words in lowercase, sliced from the lowercase buffer."""
+        if self._folded is None:
+            lower = self.lower
+            self._folded = TokenLine(lower, self.spans, self.start, self.end,
+                                     self._mask, lower)
+        return self._folded
+
+    def kind(self, index: int) -> str:
+        """Tell if a word is code, is a literal constant, is (or holds) a
+        string literal, or is in the comment.
+
+        Args:
+            index (int): index of the word
+
+        Returns:
+            str: CODE, LITERAL, STRING or COMMENT
+        """
+        start, end = self.span(index)
+        strings, comment = self.mask
+        if comment is not None and start >= comment:
+            return COMMENT
+        if is_literal(self.buffer, start, end):
+            return LITERAL
+        i = bisect_right(strings, start)
+        if i % 2 or (i < len(strings) and strings[i] < end):
+            return STRING
+        return CODE
+
+    def code_pieces(self) -> Iterator[Tuple[int, int]]:
+        """Iterate over the parts of the words that are code.
+
+        Yields:
+            Tuple[int, int]: start and end offsets in the buffer
+        """
+        strings, comment = self.mask
+        if comment is None:
+            comment = self.end
+        spans = self.spans
+        for index in range(0, len(spans), 2):
+            start, end = spans[index], min(spans[index + 1], comment)
+            if start >= comment:
+                return
+            i = bisect_right(strings, start)
+            if i % 2:
+                # the word starts in a string, resume after it:
+                start = strings[i]
+                i += 1
+            while i < len(strings) and strings[i] < end:
+                if strings[i] > start:
+                    yield start, strings[i]
+                start = strings[i + 1]
+                i += 2
+            if end > start:
+                yield start, end
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Sequence) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and all(
+            a == b for a, b in zip(self, other))
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+def fold_case(text: str) -> str:
+    """Fold text to lowercase without changing the offsets of its
+    characters.
+
+    Args:
+        text (str): the text, e.g. the buffer of a file
+
+    Returns:
+        str: the lowercase text, of the same length
+    """
+    lower = text.lower()
+    if len(lower) != len(text):
+        # a few non-ASCII characters grow when lowercased:
+        lower = text.translate(_ASCII_LOWER)
+    return lower
+
+
+def split_spans(text: str,
+                delimiters: Pattern,
+                start: int = 0,
+                end: Optional[int] = None) -> TokenLine:
+    """Split text[start:end] at the matches of a compiled pattern, without
+    copying the non-empty words in between.
+
+    Args:
+        text (str): the buffer
+        delimiters (Pattern): compiled regex of the delimiters
+        start (int, optional): where to start in the buffer. Defaults to 0.
+        end (Optional[int], optional): where to stop. Defaults to the end.
+
+    Returns:
+        TokenLine: the words as spans of text
+    """
+    if end is None:
+        end = len(text)
+    first = start
+    spans = array('l')
+    for match in delimiters.finditer(text, start, end):
+        if match.start() > start:
+            spans.append(start)
+            spans.append(match.start())
+        start = match.end()
+    if end > start:
+        spans.append(start)
+        spans.append(end)
+    return TokenLine(text, spans, first, end)
@@ -0,0 +1,239 @@
+"""Assemble the physical lines of a file into logical statements."""
+from typing import Callable, List, Optional, Tuple
+from roquefort.lexer import COMMENT, OPERATOR, tokenize
+from roquefort.source_form import (BLANK, COMMENT_LINE, CONTINUATION,
+                                   FIXED_FORM, FREE_FORM, detect_form,
+                                   line_classifier)
+
+
+class Statement:
+    """A logical statement and the physical lines it is made of."""
+
+    def __init__(self, text: str, lines: List[int]):
+        """Initialize a statement from its first physical line."""
+        self.text = text
+        # indexes in rawdata of the lines holding code of the statement:
+        self.lines = lines
+        # text preceding the code on the continuation lines, e.g. '     &':
+        self.prefix = None
+        # True if the lines are continued with a trailing '&':
+        self.trailing = False
+
+    @property
+    def first(self) -> int:
+        """Index of the first physical line of the statement."""
+        return self.lines[0]
+
+    @property
+    def last(self) -> int:
+        """Index of the last physical line of the statement."""
+        return self.lines[-1]
+
+
+def continuation_start(line: str, fixed_form: bool = False) -> Optional[int]:
+    """Find where the code of a continuation line starts.
+
+    A line whose first non-blank character is '&' continues the previous
+    one. In fixed form any character in column 6 does the same.
+
+    Args:
+        line (str): the physical line
+        fixed_form (bool): apply the column 6 rule
+
+    Returns:
+        Optional[int]: index after the continuation mark, None if the line
+                       is not a continuation line
+    """
+    classify = line_classifier(FIXED_FORM if fixed_form else FREE_FORM)
+    kind, start = classify(line)
+    return start if kind == CONTINUATION else None
+
+
+def code_end(line: str) -> Tuple[int, bool]:
+    """Find where the code of a line ends, before any comment and trailing
+    '&'.
+
+    Args:
+        line (str): the physical line
+
+    Returns:
+        Tuple[int, bool]: the end of the code and whether the line is
+                          continued with a trailing '&'
+    """
+    end = len(line.rstrip())
+    if '&' not in line and '!' not in line:
+        return end, False
+
+    # The comment lines are sorted out by the callers:
+    tokens = tokenize(line, fixed_form=False)
+    if tokens and tokens[-1].kind == COMMENT:
+        tokens.pop()
+        end = tokens[-1].end if tokens else 0
+    if len(tokens) > 1 and tokens[-1].kind == OPERATOR and \
+       line[tokens[-1].start] == '&':
+        return tokens[-1].start, True
+    return end, False
+
+
+def assemble_statements(rawdata: List[str],
+                        form: Optional[str] = None) -> List[Statement]:
+    """Join the continuation lines of rawdata into logical statements, in a
+    single pass.
+
+    Comment and blank lines are statements of their own, unless they sit
+    between the lines of a continued statement.
+
+    Args:
+        rawdata (List[str]): the physical lines
+        form (Optional[str]): FIXED_FORM or FREE_FORM, detected from the
+                              lines if not given
+
+    Returns:
+        List[Statement]: the statements, in the order of rawdata
+    """
+    statements = []
+    segments = []  # (line, start, end) of the code in the open statement
+    iopen = None  # index in statements of the open statement
+    trailing = False
+    classify = line_classifier(form or detect_form(lines=rawdata))
+
+    for iline, line in enumerate(rawdata):
+        kind, start = classify(line)
+        if kind in (BLANK, COMMENT_LINE):
+            statements.append(Statement(line, [iline]))
+            continue
+
+        if kind != CONTINUATION:
+            start = None
+        if iopen is not None and (trailing or start is not None):
+            statement = statements[iopen]
+            # Comments in between belong to the continued statement:
+            del statements[iopen + 1:]
+            if statement.prefix is None:
+                if start is None:
+                    statement.prefix = line[:len(line) - len(line.lstrip())]
+                else:
+                    statement.prefix = line[:start]
+                statement.trailing = trailing
+            statement.lines.append(iline)
+        else:
+            _close_statement(statements, iopen, segments)
+            iopen = len(statements)
+            statements.append(Statement(line, [iline]))
+            segments = []
+
+        end, trailing = code_end(line)
+        segments.append((line, start or 0, end))
+
+    _close_statement(statements, iopen, segments)
+    return statements
+
+
+def _close_statement(statements: List[Statement], iopen: Optional[int],
+                     segments: List[Tuple[str, int, int]]):
+    """Build the text of a statement spanning several lines.
+
+    Only the comment of the last line is kept.
+    """
+    if iopen is None or len(segments) < 2:
+        return
+    line, start, end = segments[0]
+    parts = [line[:end].rstrip()]
+    for line, start, end in segments[1:-1]:
+        parts.append(line[start:end].strip())
+    line, start, end = segments[-1]
+    parts.append(line[start:].lstrip())
+    statements[iopen].text = ' '.join(parts)
+
+
+def format_statement(statement: Statement,
+                     head: str,
+                     items: List[str],
+                     tail: str = '',
+                     max_length: int = 72) -> str:
+    """Write a statement made of a head and a comma separated list of items.
+
+    If the original statement was continued, the new one is wrapped at
+    max_length with the same continuation marks.
+
+    Args:
+        statement (Statement): the statement to rewrite
+        head (str): the beginning of the new line, e.g. '      use m, only: '
+        items (List[str]): the items to list after head
+        tail (str): text appended after the items, e.g. a comment
+        max_length (int): maximum length of the continued lines
+
+    Returns:
+        str: the new text of the statement, with its end of line
+    """
+    single = head + ', '.join(items) + tail
+    if statement.prefix is None or len(single) <= max_length:
+        return single.rstrip() + '\n'
+
+    mark = ' &' if statement.trailing else ''
+    lines = [head]
+    for index, item in enumerate(items):
+        if index > 0:
+            if len(lines[-1]) + len(item) + len(mark) + 2 > max_length:
+                lines[-1] += ',' + mark
+                lines.append(statement.prefix + ' ')
+            else:
+                lines[-1] += ', '
+        lines[-1] += item
+    lines[-1] += tail
+    return '\n'.join(ln.rstrip() for ln in lines) + '\n'
+
+
+def replace_statement(rawdata: List[str], statement: Statement,
+                      text: str) -> List[str]:
+    """Write text over the physical lines of a statement.
+
+    Args:
+        rawdata (List[str]): the physical lines
+        statement (Statement): the statement to replace
+        text (str): the new text, possibly spanning several lines
+
+    Returns:
+        List[str]: rawdata with the statement replaced
+    """
+    rawdata[statement.first] = text
+    for iline in statement.lines[1:]:
+        rawdata[iline] = ''
+    return rawdata
+
+
+def drop_statements(rawdata: List[str],
+                    predicate: Callable[[str], bool],
+                    dropped: Optional[List[int]] = None,
+                    form: Optional[str] = None) -> List[str]:
+    """Remove the statements whose first line satisfies predicate, together
+    with their continuation lines.
+
+    Args:
+        rawdata (List[str]): the physical lines
+        predicate (Callable[[str], bool]): test on the first line
+        dropped (Optional[List[int]]): receives the indexes of the removed
+                                       lines, if given
+        form (Optional[str]): FIXED_FORM or FREE_FORM, detected from the
+                              lines if not given
+
+    Returns:
+        List[str]: the remaining lines
+    """
+    form = form or detect_form(lines=rawdata)
+    classify = line_classifier(form)
+    free_form = form == FREE_FORM
+    kept = []
+    dropping, trailing = False, False
+    for index, rd in enumerate(rawdata):
+        if dropping and (trailing or classify(rd)[0] == CONTINUATION):
+            trailing = free_form and code_end(rd)[1]
+        else:
+            dropping = predicate(rd)
+            if not dropping:
+                kept.append(rd)
+                continue
+            trailing = free_form and code_end(rd)[1]
+        if dropped is not None:
+            dropped.append(index)
+    return kept
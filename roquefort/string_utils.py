@@ -1,29 +1,168 @@
 """ Utilities for string manipulation."""
-from typing import List
-from pyparsing import (quotedString, OneOrMore, Word, originalTextFor,
-                       nestedExpr, delimitedList, printables)
+from array import array
+from itertools import chain
+from typing import FrozenSet, List, Optional, Pattern
 import re
+from roquefort.lexer import (NAME_PATTERN, NO_MASK, NUMBER_PATTERN,
+                             STRING_PATTERN, Mask, is_comment_line,
+                             mask_line)
+from roquefort.source_form import FIXED_FORM
+from roquefort.spans import TokenLine, fold_case, split_spans
 
+# Operators splitting the words of a statement, see split_string_hard:
+HARD_DELIMITERS = frozenset([
+    ',', ':', '::', '=', '==', '=>', '*', '**', '-', '+', '(', ')', '>', '<',
+    '>=', '<=', '/', '//', '/=', '$', '.eq.', '.lt.', '.le.', '.gt.', '.ge.',
+    '.ne.', '.or.', '.and.', '.not.'
+])
 
-def split_rawdata(rawdata: List[str]) -> List[str]:
-    """Separate rawdata according to different patterns."""
-    rawdata_split = []
+
+def _words_regex(delimiters: FrozenSet[str]) -> Pattern:
+    """Compile the scanner of the words of a statement.
+
+    A word is a run of adjacent tokens of the lexer grammar, broken by
+    whitespace and by the operators in delimiters. Each match is a word, a
+    comment or the empty tail of the line.
+
+    Args:
+        delimiters (FrozenSet[str]): operators breaking the words
+
+    Returns:
+        Pattern: the compiled scanner
+    """
+    dotted = [op[1:-1] for op in delimiters if op[0] == '.']
+    chars = re.escape(''.join(
+        sorted(set(''.join(op for op in delimiters if op[0] != '.')))))
+    skip = r'[\s%s]' % chars
+    single = r'[^\s%s!\'"]' % chars
+    if dotted:
+        names = '|'.join(sorted(dotted))
+        skip = r'(?:%s|\.(?i:%s)\.)' % (skip, names)
+        single = r'(?:[^\s%s!\'".]|\.(?!(?i:%s)\.))' % (chars, names)
+    word = '(?:%s|%s|%s|%s)+' % (STRING_PATTERN, NUMBER_PATTERN,
+                                 NAME_PATTERN, single)
+    return re.compile(r'%s*(?:(?P<comment>!.*)|(?P<word>%s))?' % (skip, word))
+
+
+# Without strings, comments, dotted operators or signed exponents, the
+# words of a statement are the plain runs of non-delimiter characters:
+_TRICKY_RE = re.compile(r"""['"!]|\.[a-zA-Z]+\.|[\d.][eEdDqQ][+-]\d""")
+
+# (plain, lexer grammar) scanners of the words of the statements:
+_HARD_WORDS = (re.compile(r'[^\s$()*+,\-/:<=>]+'),
+               _words_regex(HARD_DELIMITERS))
+_WHOLE_WORDS = (re.compile(r'\S+'), _words_regex(frozenset()))
+
+# Declarations keep their words whole, characters break at '*':
+_DECLARATION_WORDS = {
+    'real': _WHOLE_WORDS,
+    'integer': _WHOLE_WORDS,
+    'complex': _WHOLE_WORDS,
+    'parameter': _WHOLE_WORDS,
+    'dimension': _WHOLE_WORDS,
+    'character': (re.compile(r'[^\s*]+'), _words_regex(frozenset(['*'])))
+}
+
+_HEAD_RE = re.compile(r'\s*(%s)' % NAME_PATTERN)
+_WORDS_RE = _WHOLE_WORDS[0]
+_span = re.Match.span
+
+
+def split_rawdata(rawdata: List[str],
+                  form: str = FIXED_FORM) -> List[TokenLine]:
+    """Separate rawdata according to different patterns.
+
+    The declaration statements keep their whitespace-separated words (plus
+    '*' for characters), the rest is split at every operator of
+    ``HARD_DELIMITERS``. The words of all the lines are spans of a single
+    buffer holding the whole text, folded to lowercase once for all the
+    lines. The fixed-form comment lines are only looked for in fixed form.
+    """
+    buffer = ''.join(rawdata)
+    lower = fold_case(buffer)
+    fixed_form = form == FIXED_FORM
+    data = []
+    start = 0
     for rd in rawdata:
-        if rd.lstrip(" ")[0:4] == "real":
-            rawdata_split.append(split_string_very_soft(rd))
-        elif rd.lstrip(" ")[0:7] == "integer":
-            rawdata_split.append(split_string_very_soft(rd))
-        elif rd.lstrip(" ")[0:9] == "character":
-            rawdata_split.append(split_string_soft(rd))
-        elif rd.lstrip(" ")[0:7] == "complex":
-            rawdata_split.append(split_string_very_soft(rd))
-        elif rd.lstrip(" ")[0:9] == "parameter":
-            rawdata_split.append(split_string_very_soft(rd))
-        elif rd.lstrip(" ")[0:9] == "dimension":
-            rawdata_split.append(split_string_very_soft(rd))
+        end = start + len(rd)
+        data.append(split_line(buffer, start, end, fixed_form, lower))
+        start = end
+    return data
+
+
+def split_line(line: str, start: int = 0, end: Optional[int] = None,
+               fixed_form: bool = True,
+               lower: Optional[str] = None) -> TokenLine:
+    """Split a line into words according to its leading keyword.
+
+    The line is scanned once. If it holds strings, comments, dotted
+    operators or signed exponents, the scan follows the token grammar of
+    the lexer so that the operators inside them (e.g. in 1.d-5) do not
+    break the words. Comments are split at whitespace only.
+
+    Args:
+        line (str): the line, or a buffer containing it
+        start (int, optional): offset of the line in the buffer
+        end (Optional[int], optional): end of the line in the buffer
+        fixed_form (bool, optional): look for the fixed-form comment lines
+        lower (Optional[str], optional): the buffer folded to lowercase
+
+    Returns:
+        TokenLine: the words of the line, the last one carrying the
+                   end of line character
+    """
+    if end is None:
+        end = len(line)
+    if fixed_form and is_comment_line(line, start, end):
+        return _end_of_line(line, _split_words(line, start, end), start, end,
+                            Mask(NO_MASK.strings, start), lower)
+
+    plain, grammar = _HARD_WORDS
+    head = _HEAD_RE.match(line, start, end)
+    if head and head.group(1).lower() in _DECLARATION_WORDS:
+        plain, grammar = _DECLARATION_WORDS[head.group(1).lower()]
+
+    if _TRICKY_RE.search(line, start, end) is None:
+        spans = _split_words(line, start, end, plain)
+        mask = NO_MASK
+    else:
+        mask = mask_line(line, start, end, fixed_form)
+        spans = array('l')
+        for match in grammar.finditer(line, start, end):
+            kind = match.lastindex
+            if kind == 2:
+                spans.extend(match.span(2))
+            elif kind == 1:
+                comment = _split_words(line, *match.span(1))
+                # A comment is glued to the word preceding it:
+                if spans and spans[-1] == comment[0]:
+                    spans[-1] = comment[1]
+                    del comment[:2]
+                spans.extend(comment)
+
+    # The values of 'parameter(a=1)' start a new word:
+    if head and spans and spans[0] < head.end() < spans[1] and \
+       head.group(1).lower() == 'parameter':
+        spans[1:1] = array('l', (head.end(), head.end()))
+    return _end_of_line(line, spans, start, end, mask, lower)
+
+
+def _split_words(line: str, start: int, end: int,
+                 regex: Pattern = _WORDS_RE) -> array:
+    """Get the flat spans of the matches of regex in line[start:end]."""
+    return array('l', chain.from_iterable(
+        map(_span, regex.finditer(line, start, end))))
+
+
+def _end_of_line(line: str, spans: array, start: int, end: int,
+                 mask: Mask, lower: Optional[str]) -> TokenLine:
+    """Attach the end of line character to the last word."""
+    if line[end - 1:end] == '\n':
+        if spans and spans[-1] == end - 1:
+            spans[-1] = end
         else:
-            rawdata_split.append(split_string_hard(rd))
-    return rawdata_split
+            spans.extend((end - 1, end))
+    return TokenLine(line, spans, start, end, mask, lower)
 
 
 def flatten_string_list(l: List[List[str]]) -> List[str]:
@@ -43,7 +182,7 @@ def split_string_very_soft(s: str,
                            str =
                            r''' |
                             ''') ->\
-                           List[str]:
+                           TokenLine:
     """Split a string using the regex delimiters
 
     Args:
@@ -52,10 +191,9 @@ def split_string_very_soft(s: str,
                                     Defaults to ' |, | ,|, | etc ...'.
 
     Returns:
-        List[str]: the splitted string
+        TokenLine: the splitted string, as spans of s
     """
-    split_str = re.split(delimiters, s)
-    return list(filter(None, split_str))
+    return split_spans(s, re.compile(delimiters))
 
 
 def split_string_soft(s: str,
@@ -64,7 +202,7 @@ def split_string_soft(s: str,
                       r''' |
                       |\* | \*|\*|
                        ''') ->\
-                      List[str]:
+                      TokenLine:
     """Split a string using the regex delimiters
 
     Args:
@@ -73,10 +211,9 @@ def split_string_soft(s: str,
                                     Defaults to ' |, | ,|, | etc ...'.
 
     Returns:
-        List[str]: the splitted string
+        TokenLine: the splitted string, as spans of s
     """
-    split_str = re.split(delimiters, s)
-    return list(filter(None, split_str))
+    return split_spans(s, re.compile(delimiters))
 
 
 def split_string_medium(s: str,
@@ -92,7 +229,7 @@ def split_string_medium(s: str,
                         |\< | \<|\<|
                         |\$ | \$|\$|
                          ''') ->\
-                        List[str]:
+                        TokenLine:
     """Split a string using the regex delimiters
 
     Args:
@@ -101,10 +238,9 @@ def split_string_medium(s: str,
                                     Defaults to ' |, | ,|, | etc ...'.
 
     Returns:
-        List[str]: the splitted string
+        TokenLine: the splitted string, as spans of s
     """
-    split_str = re.split(delimiters, s)
-    return list(filter(None, split_str))
+    return split_spans(s, re.compile(delimiters))
 
 
 def split_string_hard(s: str,
@@ -133,7 +269,7 @@ def split_string_hard(s: str,
                       |\.and\.|
                       |\.not\.|
                        ''') ->\
-                      List[str]:
+                      TokenLine:
     """Split a string using the regex delimiters
 
     Args:
@@ -142,10 +278,22 @@ def split_string_hard(s: str,
                                     Defaults to ' |, | ,|, | etc ...'.
 
     Returns:
-        List[str]: the splitted string
+        TokenLine: the splitted string, as spans of s
     """
-    split_str = re.split(delimiters, s)
-    return list(filter(None, split_str))
+    return split_spans(s, re.compile(delimiters))
+
+
+def split_string(s: str, delimiters: str = ' |, | ,|,') -> TokenLine:
+    """Split a string using the regex delimiters
+
+    Args:
+        s (str): the string
+        delimiters (str, optional): regex delimiters. Defaults to ' |, | ,|,'.
+
+    Returns:
+        TokenLine: the splitted string, as spans of s
+    """
+    return split_spans(s, re.compile(delimiters))
 
 
 def has_number(input_string: str) -> bool:
@@ -177,13 +325,96 @@ def split_string_with_parenthesis(s: str) -> list:
     s = "index(3,4), n,indx(n, m),m,nstack" ->
                      ['index(3,4)', 'n', 'indx(n, m)', 'm', 'nstack']
 
+    The string is scanned once, tracking the depth of the parenthesis and
+    the quoted strings. Like a parser, it stops at the first item it cannot
+    read (e.g. an unbalanced parenthesis).
+
     :param s: str to be divided.
 
     :return: list with the string splitted.
     """
-    value = (quotedString
-             | originalTextFor(OneOrMore(Word(printables, excludeChars="(),")
-                                         | nestedExpr())))
-    # define an overall expression, with surrounding ()'s
-    expr = delimitedList(value)
-    return expr.parseString(s).asList()
+    # Tabs are expanded, as the former pyparsing grammar did:
+    s = s.expandtabs()
+    items = []
+    start = _skip_whites(s, 0)
+    while True:
+        end = _item_end(s, start)
+        if end is None:
+            if not items:
+                raise ValueError('No item to split in %r' % s)
+            return items
+        items.append(s[start:end])
+        comma = _skip_whites(s, end)
+        if s[comma:comma + 1] != ',':
+            return items
+        start = _skip_whites(s, comma + 1)
+
+
+# Quoted strings, with doubled quotes or backslash escapes. The body is
+# matched atomically (no backtracking), then the closing quote:
+_QUOTED_RE = re.compile(
+    r""""(?=((?:[^"\n\r\\]|""|\\(?:[^x]|x[0-9a-fA-F]+))*))\1"|"""
+    r"""'(?=((?:[^'\n\r\\]|''|\\(?:[^x]|x[0-9a-fA-F]+))*))\2'""")
+_BARE_WORD_RE = re.compile(r'[^\s(),]+')
+_NESTING_RE = re.compile(r'[()\'"]')
+_WHITES_RE = re.compile(r'[ \t\n\r]*')
+
+
+def _skip_whites(s: str, index: int) -> int:
+    """Get the index of the first non-blank character from index."""
+    return _WHITES_RE.match(s, index).end()
+
+
+def _item_end(s: str, start: int) -> Optional[int]:
+    """Find the end of the item of a comma separated list starting at start:
+    a quoted string, or words and balanced parenthesis.
+
+    Returns:
+        Optional[int]: the end of the item, None if there is no item
+    """
+    quoted = _QUOTED_RE.match(s, start)
+    if quoted:
+        return quoted.end()
+
+    end, index = None, start
+    while True:
+        index = _skip_whites(s, index)
+        if s[index:index + 1] == '(':
+            index = closing_parenthesis(s, index)
+        else:
+            word = _BARE_WORD_RE.match(s, index)
+            index = word.end() if word else None
+        if index is None:
+            return end
+        end = index
+
+
+def closing_parenthesis(s: str, start: int) -> Optional[int]:
+    """Find the end of the parenthesis opened at s[start], skipping the
+    parenthesis in quoted strings.
+
+    Args:
+        s (str): the string
+        start (int): index of the opening parenthesis
+
+    Returns:
+        Optional[int]: the index after the closing parenthesis, None if it
+                       is not closed
+    """
+    depth = 0
+    match = _NESTING_RE.search(s, start)
+    while match:
+        char = match.group()
+        index = match.end()
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth == 0:
+                return index
+        else:
+            quoted = _QUOTED_RE.match(s, match.start())
+            if quoted:
+                index = quoted.end()
+        match = _NESTING_RE.search(s, index)
+    return None
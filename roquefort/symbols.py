@@ -0,0 +1,159 @@
+"""Identifiers interned as integer ids, shared by the files of a project."""
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+import re
+import sys
+from roquefort.spans import TokenLine
+
+# The identifiers of a word, as the regex r'[\W\s]name[\W\s]' sees them:
+_IDENT_RE = re.compile(r'\w+')
+
+
+class SymbolTable:
+    """Map the (case-insensitive) identifiers to integer ids."""
+
+    __slots__ = ('ids', 'names')
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.names: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name.lower() in self.ids
+
+    def intern(self, name: str) -> int:
+        """Get the id of an identifier, adding it to the table if needed.
+
+        Args:
+            name (str): the identifier, lowercase
+
+        Returns:
+            int: its id
+        """
+        ident = self.ids.get(name)
+        if ident is None:
+            ident = self.ids[name] = len(self.names)
+            self.names.append(sys.intern(name))
+        return ident
+
+    def lookup(self, name: str) -> Optional[int]:
+        """Get the id of an identifier without adding it.
+
+        Args:
+            name (str): the identifier, in any case
+
+        Returns:
+            Optional[int]: its id, None if it was never seen
+        """
+        return self.ids.get(name.lower())
+
+    def name(self, ident: int) -> str:
+        """Get the (lowercase) identifier of an id."""
+        return self.names[ident]
+
+
+# Table of the project, shared by the files processed in the same run:
+SYMBOLS = SymbolTable()
+
+
+class TokenStore:
+    """The identifiers in the code of the statements of a file, as ids of a
+    SymbolTable.
+
+    The ids of all the statements are stored back to back in one
+    array('I'): statement i owns ids[starts[i]:starts[i + 1]]. String
+    literals and comments are left out.
+    """
+
+    __slots__ = ('symbols', 'ids', 'starts')
+
+    def __init__(self,
+                 data: Iterable[TokenLine],
+                 symbols: SymbolTable = SYMBOLS):
+        """Intern the identifiers of the code of each statement.
+
+        Args:
+            data (Iterable[TokenLine]): the words of the statements
+            symbols (SymbolTable, optional): the table of the project
+        """
+        self.symbols = symbols
+        self.ids = array('I')
+        self.starts = array('I', [0])
+        intern, ids = symbols.intern, self.ids
+        for words in data:
+            lower = words.lower
+            for start, end in words.code_pieces():
+                ids.extend(map(intern, _IDENT_RE.findall(lower, start, end)))
+            self.starts.append(len(ids))
+
+    def __len__(self) -> int:
+        return len(self.starts) - 1
+
+    def statement_ids(self, index: int) -> array:
+        """Get the ids of a statement.
+
+        Args:
+            index (int): index of the statement
+
+        Returns:
+            array: the ids
+        """
+        return self.ids[self.starts[index]:self.starts[index + 1]]
+
+    def gather(self, indexes: Iterable[int]) -> array:
+        """Get the ids of several statements, back to back.
+
+        Args:
+            indexes (Iterable[int]): indexes of the statements
+
+        Returns:
+            array: the ids
+        """
+        gathered = array('I')
+        for index in indexes:
+            gathered.extend(self.statement_ids(index))
+        return gathered
+
+    def count(self, ids: array, name: str) -> int:
+        """Count the occurrences of an identifier among ids.
+
+        Args:
+            ids (array): ids, e.g. from gather
+            name (str): the identifier, in any case
+
+        Returns:
+            int: the number of occurrences
+        """
+        ident = self.symbols.lookup(name)
+        return 0 if ident is None else ids.count(ident)
+
+    def occurrences(self, indexes: Iterable[int]) -> Counter:
+        """Count all the identifiers of several statements in one pass.
+
+        Args:
+            indexes (Iterable[int]): indexes of the statements
+
+        Returns:
+            Counter: the number of occurrences of each id, see tally
+        """
+        counts = Counter()
+        for index in indexes:
+            counts.update(self.statement_ids(index))
+        return counts
+
+    def tally(self, counts: Counter, name: str) -> int:
+        """Get the number of occurrences of an identifier, in O(1).
+
+        Args:
+            counts (Counter): occurrences of the ids, from occurrences
+            name (str): the identifier, in any case
+
+        Returns:
+            int: the number of occurrences
+        """
+        ident = self.symbols.lookup(name)
+        return 0 if ident is None else counts[ident]
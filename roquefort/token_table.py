@@ -0,0 +1,278 @@
+"""Columnar table of the tokens of a project, for vectorized queries.
+
+Each token of the code is a row: the ids of its file, scope and symbol,
+the first line of its statement and its kind, each column a numpy array.
+The census queries over the whole project (the scopes holding a statement,
+the number of files using a name, the length of the use lists) are masks,
+np.unique and np.bincount over the columns instead of Python loops over
+the statements, e.g.:
+
+    python -m roquefort.token_table src/*.f90 -o tokens.npz
+
+numpy is an optional dependency: pip install roquefort[analysis].
+"""
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from roquefort.lexer import (COMMENT, IDENTIFIER, KEYWORD, LABEL, LOGICAL,
+                             NUMBER, OPERATOR, STRING, tokenize)
+from roquefort.scope_tree import scope_tree
+from roquefort.source_form import FIXED_FORM, detect_form
+from roquefort.statements import assemble_statements
+from roquefort.string_utils import split_rawdata
+from roquefort.symbols import SymbolTable
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# The kinds of the tokens, by their code in the kind column:
+KINDS = (IDENTIFIER, KEYWORD, NUMBER, OPERATOR, STRING, LABEL, LOGICAL)
+_KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+# The codes of the kinds of the names:
+_NAMES = (_KIND_CODES[IDENTIFIER], _KIND_CODES[KEYWORD])
+
+COLUMNS = ('file', 'scope', 'line', 'token', 'kind')
+# Type codes of the columns, as arrays and numpy arrays:
+_TYPECODES = ('i', 'i', 'i', 'I', 'B')
+
+
+class TokenTable:
+    """The tokens of the code of a project, as numpy columns.
+
+    The statements are told apart by their file and first line; the scope
+    is -1 outside of the program units and procedures.
+    """
+
+    __slots__ = ('files', 'scopes', 'symbols') + COLUMNS
+
+    def __init__(self, files: List[str], scopes: List[Tuple[int, str]],
+                 symbols: SymbolTable, columns: Sequence):
+        """Wrap the columns.
+
+        Args:
+            files (List[str]): the paths, by file id
+            scopes (List[Tuple[int, str]]): the file id and name, by scope
+                                            id
+            symbols (SymbolTable): the lowercase text, by token id
+            columns (Sequence): the columns, in the order of COLUMNS
+        """
+        _require_numpy()
+        self.files = files
+        self.scopes = scopes
+        self.symbols = symbols
+        for name, typecode, column in zip(COLUMNS, _TYPECODES, columns):
+            setattr(self, name, np.asarray(column, dtype=np.dtype(typecode)))
+
+    def __len__(self) -> int:
+        return len(self.token)
+
+    def ids(self, words: Iterable[str]) -> 'np.ndarray':
+        """Get the token ids of words, -1 for the ones never seen."""
+        return np.array([-1 if ident is None else ident for ident in
+                         map(self.symbols.lookup, words)], dtype=np.int64)
+
+    def statements(self) -> 'np.ndarray':
+        """Get the statement id of each row, from 0."""
+        return np.cumsum(self._statement_starts()) - 1
+
+    def scopes_with(self, words: Sequence[str]) -> List[Tuple[str, str]]:
+        """Find the scopes holding a sequence of tokens in a statement,
+        e.g. ['implicit', 'real', '*', '8'].
+
+        Args:
+            words (Sequence[str]): the tokens, in any case
+
+        Returns:
+            List[Tuple[str, str]]: the file and name of the scopes
+        """
+        size = len(self) - len(words) + 1
+        if size <= 0 or not words:
+            return []
+        statements = self.statements()
+        found = np.ones(size, dtype=bool)
+        for shift, ident in enumerate(self.ids(words)):
+            found &= self.token[shift:shift + size] == ident
+            found &= statements[shift:shift + size] == statements[:size]
+        scopes = np.unique(self.scope[:size][found])
+        return [(self.files[self.scopes[i][0]], self.scopes[i][1])
+                for i in scopes[scopes >= 0].tolist()]
+
+    def file_counts(self,
+                    names: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """Count the files using each name.
+
+        Args:
+            names (Optional[Iterable[str]]): the names, all if not given
+
+        Returns:
+            Dict[str, int]: the number of files of the names used
+        """
+        rows = np.isin(self.kind, _NAMES)
+        if names is not None:
+            rows &= np.isin(self.token, self.ids(names))
+        # the distinct (token, file) pairs:
+        pairs = np.unique(self.token[rows].astype(np.int64) * len(self.files)
+                          + self.file[rows])
+        counts = np.bincount(pairs // max(len(self.files), 1))
+        return {self.symbols.name(ident): int(counts[ident])
+                for ident in np.flatnonzero(counts).tolist()}
+
+    def common_variables(self) -> List[str]:
+        """Get the variables of the common statements, without the names
+        of the blocks and the dimensions."""
+        starts = self._statement_starts()
+        statements = np.cumsum(starts) - 1
+        first = np.flatnonzero(starts)
+        rows = self.token[first][statements] == self._id('common')
+        rows &= np.isin(self.kind, _NAMES) & ~starts
+
+        # the block names are between two slashes:
+        slash = self.token == self._id('/')
+        rows[1:-1] &= ~(slash[:-2] & slash[2:])
+        # the dimensions are inside parentheses:
+        nesting = np.cumsum((self.token == self._id('(')).astype(np.int64)
+                            - (self.token == self._id(')')))
+        rows &= nesting == nesting[first][statements]
+        return sorted(map(self.symbols.name,
+                          np.unique(self.token[rows]).tolist()))
+
+    def use_list_lengths(self) -> 'np.ndarray':
+        """Get the number of names listed after 'only:' by each use
+        statement, 0 for a whole module: np.bincount of it is the histogram
+        of the lengths."""
+        starts = self._statement_starts()
+        statements = np.cumsum(starts) - 1
+        first = np.flatnonzero(starts)
+        uses = self.token[first] == self._id('use')
+
+        # the rows after the 'only:' of their statement:
+        only = np.zeros(len(self), dtype=bool)
+        only[:-1] = (self.token[:-1] == self._id('only')) & \
+            (self.token[1:] == self._id(':')) & ~starts[1:]
+        seen = np.cumsum(only)
+        listed = seen > (seen - only)[first][statements]
+        listed &= ~only
+        # a renamed name, 'local => name', is one item of two names:
+        items = np.bincount(statements, minlength=len(first),
+                            weights=listed & np.isin(self.kind, _NAMES)) - \
+            np.bincount(statements, minlength=len(first),
+                        weights=listed & (self.token == self._id('=>')))
+        return items[uses].astype(np.int64)
+
+    def save(self, path: str):
+        """Write the table to a .npz file."""
+        np.savez_compressed(
+            path, files=np.array(self.files, dtype=str),
+            scope_files=np.array([f for f, _ in self.scopes], dtype=np.int32),
+            scope_names=np.array([n for _, n in self.scopes], dtype=str),
+            symbols=np.array(self.symbols.names, dtype=str),
+            **{'column_' + name: getattr(self, name) for name in COLUMNS})
+
+    def _statement_starts(self) -> 'np.ndarray':
+        """Tell which rows start a statement."""
+        starts = np.ones(len(self), dtype=bool)
+        starts[1:] = (self.file[1:] != self.file[:-1]) | \
+            (self.line[1:] != self.line[:-1])
+        return starts
+
+    def _id(self, word: str) -> int:
+        """Get the token id of a word, -1 if never seen."""
+        ident = self.symbols.lookup(word)
+        return -1 if ident is None else ident
+
+
+def token_table(paths: Iterable[str]) -> TokenTable:
+    """Export the tokens of the code of files into a table.
+
+    Args:
+        paths (Iterable[str]): the files
+
+    Returns:
+        TokenTable: their tokens
+    """
+    _require_numpy()
+    files, scopes, symbols = [], [], SymbolTable()
+    columns = [array(typecode) for typecode in _TYPECODES]
+    for path in map(str, paths):
+        with open(path, 'r') as f:
+            rawdata = f.readlines()
+        files.append(path)
+        _add_tokens(columns, scopes, symbols, len(files) - 1, rawdata,
+                    detect_form(path, rawdata))
+    return TokenTable(files, scopes, symbols, columns)
+
+
+def load_token_table(path: str) -> TokenTable:
+    """Read a table written by TokenTable.save."""
+    _require_numpy()
+    with np.load(path) as saved:
+        symbols = SymbolTable()
+        for name in saved['symbols'].tolist():
+            symbols.intern(name)
+        return TokenTable(saved['files'].tolist(),
+                          list(zip(saved['scope_files'].tolist(),
+                                   saved['scope_names'].tolist())),
+                          symbols,
+                          [saved['column_' + name] for name in COLUMNS])
+
+
+def _add_tokens(columns: List[array], scopes: List[Tuple[int, str]],
+                symbols: SymbolTable, ifile: int, rawdata: List[str],
+                form: str):
+    """Append the tokens of the code of a file to the columns."""
+    statements = assemble_statements(rawdata, form)
+    tree = scope_tree(split_rawdata([st.text for st in statements], form))
+    first_scope = len(scopes)
+    scopes.extend((ifile, node.name) for node in tree.scopes())
+    fixed_form = form == FIXED_FORM
+    intern = symbols.intern
+    files, scope_ids, lines, tokens, kinds = columns
+    for statement, owner in zip(statements, tree.owners()):
+        text = statement.text
+        if text.lstrip().startswith('#'):
+            continue
+        iscope = first_scope + owner if owner >= 0 else -1
+        for start, end, kind in tokenize(text, fixed_form=fixed_form):
+            if kind == COMMENT:
+                continue
+            files.append(ifile)
+            scope_ids.append(iscope)
+            lines.append(statement.first)
+            tokens.append(intern(text[start:end].lower()))
+            kinds.append(_KIND_CODES[kind])
+
+
+def _require_numpy():
+    """Fail if numpy, an optional dependency, is missing."""
+    if np is None:
+        raise ImportError(
+            "the token table needs numpy: pip install roquefort[analysis]")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Export the tokens of Fortran files to numpy columns")
+    parser.add_argument("filenames", nargs='+', help="the files")
+    parser.add_argument('-o', '--output', help="the .npz file to write")
+    parser.add_argument('-n', '--min_files', type=int, default=1,
+                        help="report the common variables used in more "
+                             "files than that")
+    args = parser.parse_args()
+
+    table = token_table(args.filenames)
+    if args.output:
+        table.save(args.output)
+    print("%d tokens, %d scopes, %d files" %
+          (len(table), len(table.scopes), len(table.files)))
+    print("scopes with implicit real*8: %d" %
+          len(table.scopes_with(['implicit', 'real', '*', '8'])))
+    counts = table.file_counts(table.common_variables())
+    print("common variables in more than %d files: %s" % (
+        args.min_files, ', '.join(sorted(
+            name for name, count in counts.items()
+            if count > args.min_files))))
+    print("use list lengths: %s" %
+          np.bincount(table.use_list_lengths()).tolist())
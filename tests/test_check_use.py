@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+""" Tests of the occurrences reported by check_use """
+from types import SimpleNamespace
+
+from roquefort.check_use import Occurrences, check_var, count, get_scope
+from roquefort.project_index import ProjectIndex
+from roquefort.string_utils import split_string
+
+
+def test_occurrences():
+    """Test the counts and the contexts sliced around the occurrences."""
+    data = [split_string(rd) for rd in [
+        "      x = nstep + NStep*2 ! nstep\n",
+        "      print *, 'nstep', nstep_max\n",
+        "      call run(nstep)\n"]]
+    occurrences = Occurrences(data)
+    assert occurrences.count('NSTEP') == 3
+    assert occurrences.count('c') == 0
+    assert list(occurrences.contexts('nstep')) == [
+        " x = nstep + NS", "ep + NStep*2 ", " run(nstep)"]
+    assert count(data, 'nstep_max') == (1, ["ep', nstep_max"])
+
+
+def test_check_var_index(tmp_path, capsys):
+    """Test that the index and the scan of the file report the same
+    missing variables, the write statements left out."""
+    filename = tmp_path / "run.f90"
+    filename.write_text(
+        "subroutine run()\n  write(6,*) nstep\n  x = wtot\n"
+        "end subroutine run\n")
+    modules = [SimpleNamespace(name='sizes', var=['nstep', 'wtot'])]
+    outputs = []
+    for index in (None, ProjectIndex(None)):
+        check_var(get_scope(str(filename)), modules, index, str(filename))
+        outputs.append(capsys.readouterr().out)
+    assert outputs[0] == outputs[1]
+    assert 'missing variable wtot' in outputs[0]
+    assert 'nstep' not in outputs[0]
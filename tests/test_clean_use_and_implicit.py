@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+""" Tests of the cleaning of the files """
+from argparse import Namespace
+
+from roquefort.clean_use import clean_use_statement
+from roquefort.clean_use_and_implicit import (clean_statements,
+                                              stream_statements)
+from roquefort.scope_tree import _TREES
+
+RAWDATA = [
+    "      module sizes\n", "      integer :: n, m\n", "      end module\n",
+    "c     the units\n", "      subroutine foo(a)\n",
+    "      use sizes, only: n, m\n", "      implicit real*8(a-h,o-z)\n",
+    "      dimension a(n)\n", "      x = a(1) + k\n", "      end\n",
+    "      function bar(i)\n", "      use sizes, only: n\n",
+    "      implicit real*8(a-h,o-z)\n", "      bar = i * y\n", "      end\n"
+]
+
+
+def test_stream_statements(tmp_path):
+    """Test that the streaming mode writes the output of the whole file,
+    leaving no tree of its units in the cache."""
+    for command in ("clean_use", "clean_implicit"):
+        outputs = []
+        for clean in (clean_statements, stream_statements):
+            filename = tmp_path / "units.f"
+            filename.write_text(''.join(RAWDATA))
+            _TREES.clear()
+            clean(Namespace(command=command, filename=str(filename),
+                            overwrite=True, define=None, cache_dir=None,
+                            jobs=1))
+            outputs.append(filename.read_text())
+        assert not _TREES
+        assert outputs[0] == outputs[1]
+        assert outputs[0] != ''.join(RAWDATA)
+
+
+def test_fixed_form_continuations(tmp_path):
+    """Test that the continuation lines of the parameter and dimension
+    statements are deleted with them in fixed form."""
+    filename = tmp_path / "continued.f"
+    filename.write_text(
+        "      subroutine foo(x)\n      implicit real*8(a-h,o-z)\n"
+        "      parameter (aa=1.d0,\n     +  bb=2.d0)\n"
+        "      dimension z(3),\n     +  y(4)\n"
+        "      x = aa + bb + z(1) + y(2)\n      end\n")
+    clean_statements(Namespace(command="clean_implicit",
+                               filename=str(filename), overwrite=True,
+                               define=None, cache_dir=None, jobs=1))
+    cleaned = filename.read_text()
+    assert "     +" not in cleaned
+    assert "real(dp), parameter :: bb = 2.d0\n" in cleaned
+    assert "real(dp), dimension(4) :: y\n" in cleaned
+
+
+def test_inactive_branches(tmp_path):
+    """Test that the names used in an inactive #ifdef branch are kept in
+    the use statements."""
+    source = [
+        "module comm\n", "  integer :: nproc, rank, unused\n",
+        "end module comm\n", "subroutine run()\n",
+        "  use comm, only: nproc, rank, unused\n", "  implicit none\n",
+        "#ifdef MPI\n", "  print *, nproc\n", "#endif\n",
+        "  print *, rank\n", "end subroutine run\n"]
+    filename = tmp_path / "comm.F90"
+    for define in (None, ['MPI']):
+        for clean in (clean_statements, stream_statements):
+            filename.write_text(''.join(source))
+            clean(Namespace(command="clean_use", filename=str(filename),
+                            overwrite=True, define=define, cache_dir=None,
+                            jobs=1))
+            assert filename.read_text().splitlines()[4] == \
+                "  use comm, only: nproc, rank"
+
+
+def test_contained_procedures(tmp_path):
+    """Test that the imports used by the contained procedures only are
+    kept, by both clean_use tools."""
+    source = [
+        "subroutine host()\n", "  use sizes, only: n, m, k\n",
+        "  implicit none\n", "  print *, n\n", "contains\n",
+        "  subroutine inner()\n", "    print *, m\n",
+        "  end subroutine inner\n", "end subroutine host\n"]
+    filename = tmp_path / "host.f90"
+    filename.write_text(''.join(source))
+    clean_statements(Namespace(command="clean_use", filename=str(filename),
+                               overwrite=True, define=None, cache_dir=None,
+                               jobs=1))
+    cleaned = filename.read_text()
+    filename.write_text(''.join(source))
+    clean_use_statement(str(filename), overwrite=True)
+    assert filename.read_text() == cleaned
+    assert cleaned.splitlines()[1] == "  use sizes, only: n, m"
+
+
+def test_uppercase_use(tmp_path):
+    """Test that the use statements are told apart in any case."""
+    filename = tmp_path / "upper.f90"
+    filename.write_text(
+        "SUBROUTINE FOO()\n  USE SIZES, ONLY: N, M\n  IMPLICIT NONE\n"
+        "  PRINT *, N\nEND SUBROUTINE FOO\n")
+    clean_statements(Namespace(command="clean_use", filename=str(filename),
+                               overwrite=True, define=None, cache_dir=None,
+                               jobs=1))
+    assert filename.read_text().splitlines()[1] == "  use SIZES, only: N"
+
+
+def test_end_comments(tmp_path):
+    """Test that the unit ended by a commented end statement is cleaned
+    apart from the next one."""
+    filename = tmp_path / "ends.f90"
+    filename.write_text(
+        "subroutine a()\n  use m, only: x, y\n  print *, x\nend ! of a\n"
+        "subroutine b()\n  use m, only: y\n  print *, y\nend subroutine b\n")
+    clean_statements(Namespace(command="clean_use", filename=str(filename),
+                               overwrite=True, define=None, cache_dir=None,
+                               jobs=1))
+    assert filename.read_text().splitlines()[1] == "  use m, only: x"
+
+
+def test_contained_imports(tmp_path):
+    """Test that the use statements of the contained procedures do not
+    count as uses of the imports of their host, for both tools."""
+    source = [
+        "subroutine host()\n", "  use sizes, only: n, m\n",
+        "  print *, m\n", "contains\n", "  subroutine inner()\n",
+        "    use sizes, only: n\n", "    print *, 1\n",
+        "  end subroutine inner\n", "end subroutine host\n"]
+    filename = tmp_path / "host.f90"
+    filename.write_text(''.join(source))
+    clean_statements(Namespace(command="clean_use", filename=str(filename),
+                               overwrite=True, define=None, cache_dir=None,
+                               jobs=1))
+    cleaned = filename.read_text()
+    filename.write_text(''.join(source))
+    clean_use_statement(str(filename), overwrite=True)
+    assert filename.read_text() == cleaned
+    assert cleaned.splitlines()[1] == "  use sizes, only: m"
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+""" Tests of the declaration parser """
+from roquefort.declarations import (compile_implicit, declare,
+                                    implicit_type, parse_declaration,
+                                    parse_implicit, refactored_type)
+from roquefort.records import Symbol
+
+
+def test_type_declarations():
+    """Test the type spec, attributes in any order and the entities."""
+    (a, b) = parse_declaration(
+        "      real(kind=8), allocatable, dimension(:, :) :: a, "
+        "b(3) = (/1, 2, 3/) ! c\n")
+    assert a == Symbol('a', 'real', '(kind=8)', ('allocatable', 'dimension'),
+                       '(:,:)')
+    assert (b.dimensions, b.initializer) == ('(3)', '(/1,2,3/)')
+    (s, t) = parse_declaration("      character*(*) s, t*8\n")
+    assert (s.kind, t.kind) == ('*(*)', '*8')
+    (x, ) = parse_declaration("  10  double precision x = 1.d-3\n")
+    assert (x.type, x.initializer) == ('double precision', '1.d-3')
+    (p, ) = parse_declaration("type(Foo), pointer :: p => null()")
+    assert (p.type, p.attributes) == ('type(foo)', ('pointer', ))
+
+
+def test_other_statements():
+    """Test the statements that are not declarations, and the others."""
+    assert parse_declaration("      integer function f(x)\n") is None
+    assert parse_declaration("      implicit real*8(a-h,o-z)\n") is None
+    assert parse_declaration("      real, save x\n") is None
+    (c, ) = parse_declaration("      parameter (c = (1., 2.))\n")
+    assert (c.attributes, c.initializer) == (('parameter', ), '(1.,2.)')
+
+    symbols = {}
+    for statement in ("real*8 W", "dimension w(3)", "save :: w"):
+        for symbol in parse_declaration(statement) or ():
+            declare(symbols, symbol)
+    assert symbols == {'w': Symbol('W', 'real', '*8', ('dimension', ),
+                                   '(3)')}
+
+
+def test_implicit():
+    """Test the tables of the implicit types and their inheritance."""
+    assert parse_implicit("      implicit real*8(a-h,o-z)\n") == [
+        ('real*8', 'abcdefghopqrstuvwxyz')]
+    assert parse_implicit("implicit real (x), double precision(d-e)") == [
+        ('real', 'x'), ('double precision', 'de')]
+    assert parse_implicit("      real*8 a\n") is None
+    host = compile_implicit([parse_implicit("implicit complex*16(Z)")])
+    table = compile_implicit([parse_implicit("implicit none")], host)
+    assert (implicit_type(host, 'Zeta'), implicit_type(host, 'M')) == \
+        ('complex*16', 'integer')
+    assert implicit_type(table, 'zeta') is None
+    assert [refactored_type(host, name) for name in ('z', 'k', 'x')] == [
+        'complex(dp)', 'integer', 'real(dp)']
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+""" Tests of the search of the variables spelled in another case """
+from types import SimpleNamespace
+
+from roquefort.fix_case_issue import count_var
+from roquefort.project_index import ProjectIndex
+
+
+def test_count_var(tmp_path, capsys):
+    """Test that the index of the project and the file alone find the
+    same spellings, strings and comments left out."""
+    filename = tmp_path / "run.f90"
+    filename.write_text(
+        "subroutine run()\n  x = NStep + nstep ! NSTEP\n"
+        "  print *, 'Wtot', wtot\n  y = NELEC\nend subroutine run\n")
+    modules = [SimpleNamespace(name='sizes', var=['nstep', 'wtot']),
+               SimpleNamespace(name='elec', var=['nelec'])]
+    index = ProjectIndex(str(tmp_path / 'index'))
+    index.update([filename])
+    outputs = []
+    for given in (None, index):
+        assert count_var(str(filename), modules, given) == [1, 0, 1]
+        outputs.append(capsys.readouterr().out)
+    assert outputs[0] == outputs[1]
+    assert 'found nstep in another case, of sizes' in outputs[0]
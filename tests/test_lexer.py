@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+""" Tests of the Fortran lexer """
+from array import array
+
+from roquefort.lexer import (CODE, COMMENT, IDENTIFIER, KEYWORD, LABEL,
+                             LITERAL, LOGICAL, NUMBER, OPERATOR, STRING,
+                             is_literal, mask_line, tokenize)
+from roquefort.spans import TokenLine, fold_case
+from roquefort.string_utils import split_rawdata
+
+
+def kinds(line):
+    return [(tok.kind, line[tok.start:tok.end]) for tok in tokenize(line)]
+
+
+def test_statement_tokens():
+    """Test the typed tokens of a simple statement."""
+    assert kinds("      x = a(1) + 2.5d0 ! set x\n") == [
+        (IDENTIFIER, 'x'), (OPERATOR, '='), (IDENTIFIER, 'a'),
+        (OPERATOR, '('), (NUMBER, '1'), (OPERATOR, ')'), (OPERATOR, '+'),
+        (NUMBER, '2.5d0'), (COMMENT, '! set x')
+    ]
+
+
+def test_label_keyword_and_string():
+    """Test labels, keywords and quoted strings with doubled quotes."""
+    assert kinds("   10 write(6,'(''it'''')') n\n") == [
+        (LABEL, '10'), (KEYWORD, 'write'), (OPERATOR, '('), (NUMBER, '6'),
+        (OPERATOR, ','), (STRING, "'(''it'''')'"), (OPERATOR, ')'),
+        (IDENTIFIER, 'n')
+    ]
+
+
+def test_dotted_operators():
+    """Test that numbers do not swallow dotted operators."""
+    assert kinds("if (1.eq.n) x = 1.e5") == [
+        (KEYWORD, 'if'), (OPERATOR, '('), (NUMBER, '1'), (OPERATOR, '.eq.'),
+        (IDENTIFIER, 'n'), (OPERATOR, ')'), (IDENTIFIER, 'x'),
+        (OPERATOR, '='), (NUMBER, '1.e5')
+    ]
+
+
+def test_literals():
+    """Test the exponents, kinds, BOZ and logical constants."""
+    assert kinds("x = 1.0d-3*2_dp + 1.5q0 + z'1f' .or. .TRUE._lk") == [
+        (IDENTIFIER, 'x'), (OPERATOR, '='), (NUMBER, '1.0d-3'),
+        (OPERATOR, '*'), (NUMBER, '2_dp'), (OPERATOR, '+'), (NUMBER, '1.5q0'),
+        (OPERATOR, '+'), (NUMBER, "z'1f'"), (OPERATOR, '.or.'),
+        (LOGICAL, '.TRUE._lk')
+    ]
+    assert all(map(is_literal, ['12', '1d5', '3.14_8\n', '.false.']))
+    assert not any(map(is_literal, ['x1', 'e5', '1.eq.', 'd']))
+    words = split_rawdata(["      y = 2_dp*x1 + 1d5\n"])[0]
+    assert [words.kind(i) for i in range(len(words))] == \
+        [CODE, LITERAL, CODE, LITERAL]
+
+
+def test_comment_lines():
+    """Test the fixed-form comment lines."""
+    assert kinds("c a comment\n") == [(COMMENT, 'c a comment')]
+    assert kinds("* another one\n") == [(COMMENT, '* another one')]
+    assert kinds("call foo\n")[0] == (KEYWORD, 'call')
+
+
+def test_split_rawdata():
+    """Test the words produced for the declarations and the statements."""
+    rawdata = [
+        "      real*8 x(3), y\n", "      character*20 fname\n",
+        "      use mod1, only: var1, var2 ! note\n", "      y = x(1)-2\n",
+        "\n"
+    ]
+    assert split_rawdata(rawdata) == [
+        ['real*8', 'x(3),', 'y\n'], ['character', '20', 'fname\n'],
+        ['use', 'mod1', 'only', 'var1', 'var2', '!', 'note\n'],
+        ['y', 'x', '1', '2\n'], ['\n']
+    ]
+
+
+def test_words_are_spans():
+    """Test that the words share the text buffer of the file."""
+    data = split_rawdata(["      x = y\n", "      call foo(x)\n"])
+    assert all(isinstance(words, TokenLine) for words in data)
+    assert data[0].buffer is data[1].buffer
+    assert data[1].span(2) == (27, 28)
+    assert data[1][1:] == ['foo', 'x', '\n']
+
+
+def test_folded_words():
+    """Test the lowercase shadow of the buffer."""
+    data = split_rawdata(["      CALL Foo(X)\n", "      Y = 'ABC'\n"])
+    assert data[0].folded == ['call', 'foo', 'x', '\n']
+    assert data[0].lower is data[1].lower is data[1][1:].lower
+    assert data[1].folded[1:] == ["'abc'\n"]
+    assert len(fold_case("\u0130X")) == 2
+
+
+def test_words_follow_the_tokens():
+    """Test that strings, exponents and comments do not break the words."""
+    rawdata = ["      x = 'a,b' // y(1.d-5) .eq. .true.!c-d\n",
+               "      parameter(a=1.e-3)\n"]
+    assert split_rawdata(rawdata) == [
+        ['x', "'a,b'", 'y', '1.d-5', '.true.!c-d\n'],
+        ['parameter', '(a=1.e-3)\n']
+    ]
+
+
+def test_mask():
+    """Test the string and comment ranges of the statements."""
+    line = "      x = 'a ! b' // y ! z\n"
+    assert mask_line(line) == (array('l', [10, 17]), 23)
+    words = split_rawdata([line, "c x\n", "      x = y\n"])
+    assert [words[0].kind(i) for i in range(len(words[0]))] == \
+        [CODE, STRING, CODE, COMMENT, COMMENT]
+    assert [line[s:e] for s, e in words[0].code_pieces()] == ['x', 'y']
+    assert words[1].kind(0) == COMMENT
+    assert list(words[2][1:].code_pieces()) == [(41, 43)]
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+""" Tests of the preprocessor directives """
+import os
+
+from roquefort import preprocessor
+import pytest
+
+from roquefort.preprocessor import (evaluate, inactive_names, map_statements,
+                                    parse_defines, preprocess)
+from roquefort.statements import assemble_statements
+
+RAWDATA = [
+    "      subroutine foo\n", "#ifdef MPI\n", "      call mpi_init(i,\n",
+    "     &              j)\n", "#elif defined(OMP) && NT > 2\n",
+    "      x = 2\n", "#else\n", "      x = 3\n", "#endif\n",
+    "#include \"sizes.h\"\n", "      end\n"
+]
+
+
+def test_branches():
+    """Test the active lines and the map back to rawdata."""
+    assert list(preprocess(RAWDATA).line_map) == [0, 7, 10]
+    mpi = preprocess(RAWDATA, parse_defines(['MPI']))
+    assert list(mpi.line_map) == [0, 2, 3, 10]
+    assert mpi.includes == ['sizes.h']
+    omp = preprocess(RAWDATA, parse_defines(['OMP', 'NT=4']))
+    assert omp.lines == [RAWDATA[0], RAWDATA[5], RAWDATA[10]]
+
+    statements = assemble_statements(mpi.lines)
+    map_statements(statements, mpi.line_map)
+    assert [st.lines for st in statements] == [[0], [2, 3], [10]]
+
+
+def test_evaluate():
+    """Test the expressions of #if."""
+    defines = {'NDIM': '3', 'TWICE': 'NDIM * 2'}
+    assert evaluate('TWICE == 6 && !defined(MPI)', defines) == 1
+    assert evaluate('defined NDIM && UNDEFINED', defines) == 0
+    assert evaluate('(1 + 2) * 3 - 8 / 4 >= 7', {}) == 1
+    for broken in ('defined', 'defined(', 'defined(MPI', '(1 + 2'):
+        with pytest.raises(ValueError):
+            evaluate(broken, defines)
+    with pytest.raises(ValueError, match='line 2: defined without a macro'):
+        preprocess(["      x = 1\n", "#if defined\n", "#endif\n"])
+
+
+def test_inactive_names():
+    """Test that the names of the inactive branches are counted."""
+    preprocessed = preprocess(RAWDATA)
+    statements = map_statements(assemble_statements(preprocessed.lines),
+                                preprocessed.line_map)
+    assert inactive_names(RAWDATA, statements, 'fixed') == \
+        {'call': 1, 'mpi_init': 1, 'i': 1, 'j': 1, 'x': 1}
+
+
+def test_disk_cache(tmp_path):
+    """Test that the evaluated files are reused from the disk cache."""
+    rawdata = RAWDATA + ["! cached\n"]
+    first = preprocess(rawdata, {'MPI': '1'}, str(tmp_path))
+    (cached, ) = os.listdir(tmp_path)
+    with open(tmp_path / cached, 'w') as f:
+        f.write('{"line_map": [0], "includes": []}')
+    # a new run, with an empty memory cache:
+    preprocessor._CACHE.clear()
+    assert list(preprocess(rawdata, {'MPI': '1'}, str(tmp_path)).line_map) \
+        == [0]
+    assert list(first.line_map) == [0, 2, 3, 10, 11]
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+""" Tests of the index of the identifiers of a project """
+import os
+
+from roquefort.project_index import Posting, ProjectIndex, index_lines
+
+RAWDATA = [
+    "      subroutine Fill(a)\n", "c     Nstep in a comment\n",
+    "      a = nstep +\n", "     &    NStep\n",
+    "      print *, 'nstep'\n", "      end\n",
+    "      program main\n", "      call fill(x)\n", "      end\n"
+]
+
+
+def test_index_lines():
+    """Test the scopes and the postings of a file."""
+    indexed = index_lines(RAWDATA, 'fixed')
+    assert indexed['scopes'] == [['Fill', 0, 5], ['main', 6, 8]]
+    postings = indexed['postings']
+    assert postings['nstep'] == [0, 2]
+    assert postings['NStep'] == [0, 2]
+    assert postings['fill'] == [1, 7]
+    assert 'print' in postings and 'comment' not in postings
+
+
+def test_project_index(tmp_path):
+    """Test the queries, and that only the changed files are read again."""
+    src = tmp_path / 'fill.f'
+    src.write_text(''.join(RAWDATA))
+    other = tmp_path / 'other.f'
+    other.write_text("      z = 1\n")
+    cache = str(tmp_path / 'index')
+    index = ProjectIndex(cache)
+    index.update([src, other])
+    assert index.files_using(['NSTEP']) == {str(src)}
+    assert index.used(['nStep', 'z', 'y'], [other]) == {'z'}
+    assert index.postings('nstep', exact=True) == [
+        Posting(str(src), 'Fill', 2)]
+    assert len(index.postings('nstep')) == 2
+    head, body = index.occurrences(src)[0]
+    assert (head['fill'], body['nstep']) == (1, 2)
+
+    # a new index reads the manifest and the unchanged files from the
+    # cache, a file edited keeping its size and time is not read again:
+    stat = os.stat(src)
+    src.write_text(''.join(RAWDATA).replace('nstep', 'mstep'))
+    os.utime(src, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    reloaded = ProjectIndex(cache)
+    reloaded.update([src, other])
+    assert reloaded.files == index.files
+
+    other.write_text("      y = 1\n")
+    reloaded.update([src, other])
+    assert reloaded.used(['z', 'y']) == {'y'}
+    assert reloaded.files_using(['z']) == set()
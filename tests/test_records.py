@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+""" Tests of the scope and symbol records """
+import pytest
+
+from roquefort.records import ImportedVar, Scope, UseImport
+
+
+def test_records():
+    """Test the slots, defaults and comparison of the records."""
+    mod = UseImport('sizes', 3)
+    mod.var.append(ImportedVar('n'))
+    assert (mod.total_count, mod.var[0].count) == (0, None)
+    assert mod == UseImport('sizes', 3, [ImportedVar('n')])
+    assert repr(mod.var[0]) == "ImportedVar(name='n', count=None)"
+    scope = Scope('foo', 0, 4, [])
+    assert scope.module == [] and scope.module is not scope.floats
+    scope.module.append(UseImport('sizes', 1))
+    assert len(scope.module) == 1 and scope.implicit is None
+    with pytest.raises(AttributeError):
+        scope.extra = 1
+
+    def analyser(scope, part):
+        raise AssertionError('analysed %s' % part)
+
+    inner = Scope('bar', 2, 3, [['x = 1']] * 4, parent=scope,
+                  analyser=analyser)
+    assert repr(inner) == "Scope(name='bar', istart=2, iend=3)"
+    assert inner == Scope('bar', 2, 3, []) and inner != scope
+
+    parts = []
+
+    def fill(scope, part):
+        parts.append(part)
+        scope.begin(part)
+
+    lazy = Scope('baz', 0, 1, [], analyser=fill)
+    assert lazy.floats == [] and lazy.integers == [] and lazy.module == []
+    assert parts == ['declarations', 'module']
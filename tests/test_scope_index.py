@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+""" Tests of the index of the lines of the scopes """
+from roquefort.records import Scope
+from roquefort.scope_index import ScopeIndex
+from roquefort.statements import Statement, drop_statements
+
+# two scopes in a module, statement i on lines 2i and 2i + 1:
+STATEMENTS = [Statement('', [2 * i, 2 * i + 1]) for i in range(10)]
+
+
+def test_lookups():
+    """Test line to scope and scope to lines, with nested ranges."""
+    module, first, second = (Scope('m', 0, 10, []), Scope('a', 1, 4, []),
+                             Scope('b', 5, 9, []))
+    lines = ScopeIndex([second, module, first], STATEMENTS, 20)
+    assert lines.line_range(first) == (2, 8)
+    assert [lines.scope_at(i).name for i in (0, 2, 7, 8, 9, 10, 19)] == \
+        ['m', 'a', 'a', 'm', 'm', 'b', 'm']
+    assert lines.scope_at(20) is None
+
+
+def test_edits():
+    """Test that the index follows the inserted and deleted lines."""
+    first, second = Scope('a', 1, 4, []), Scope('b', 5, 9, [])
+    lines = ScopeIndex([first, second], STATEMENTS, 20)
+    rawdata = ['%d\n' % i for i in range(20)]
+    rawdata[3:3] = ['x\n', 'y\n']
+    lines.insert(3, 2)
+    assert lines.line_range(first) == (2, 10)
+    assert lines.scope_at(4) is first and rawdata[lines.line(5)] == '5\n'
+
+    dropped = []
+    rawdata = drop_statements(rawdata, lambda rd: rd in ('x\n', '11\n'),
+                              dropped)
+    for index in reversed(dropped):
+        lines.delete(index)
+    assert dropped == [3, 13]
+    assert lines.line_range(second) == (11, 18)
+    moved = lines.statement(STATEMENTS[6])
+    assert [rawdata[i] for i in moved.lines] == ['12\n', '13\n']
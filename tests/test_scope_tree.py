@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+""" Tests of the scope tree """
+from roquefort.scope_tree import (FUNCTION, MODULE, SUBROUTINE, forget_tree,
+                                  read_units, scope_tree)
+from roquefort.scope_utils import separate_scope
+from roquefort.string_utils import split_rawdata, split_string
+
+RAWDATA = [
+    "module Sizes\n", "  integer :: n\n", "  interface\n",
+    "    subroutine ext(a)\n", "    end subroutine\n", "  end interface\n",
+    "contains\n", "  recursive subroutine Fill(a)\n", "    if (n > 0) then\n",
+    "      a = 1\n", "    end if\n", "  contains\n",
+    "    pure integer function twice(i)\n", "      twice = 2 * i\n",
+    "    end function\n", "  END SUBROUTINE Fill\n", "end module Sizes\n",
+    "program main\n", "  call fill(x)\n", "end\n"
+]
+
+
+def test_nesting():
+    """Test the nodes and their ranges."""
+    tree = scope_tree(split_rawdata(RAWDATA, 'free'))
+    assert [(node.kind, node.name, node.istart, node.iend)
+            for node in tree.scopes()] == [
+        (MODULE, 'Sizes', 0, 16), (SUBROUTINE, 'Fill', 7, 15),
+        (FUNCTION, 'twice', 12, 14), ('program', 'main', 17, 19)]
+    module, interface = tree.roots[0], tree.roots[0].children[0]
+    assert (module.body_end, interface.kind) == (6, 'interface')
+    assert tree.scope_of(13).name == 'twice'
+    assert tree.scope_of(3).name == 'ext'
+    assert tree.scope_of(16) is module
+    assert tree.scope_of(15).name == 'Fill'
+
+
+def test_separate_scope():
+    """Test that the body of the scopes stops at 'contains', the same way
+    for the statements and the plain lines."""
+    data = split_rawdata(RAWDATA, 'free')
+    tree = scope_tree(data)
+    assert scope_tree(data) is tree
+    forget_tree(data)
+    assert scope_tree(data) is not tree
+    scopes = separate_scope(data)
+    assert [(s.name, s.istart, s.iend) for s in scopes] == [
+        ('sizes', 0, 6), ('fill', 7, 11), ('twice', 12, 14), ('main', 17, 19)]
+    lines = [split_string(rd) for rd in RAWDATA]
+    assert [(node.name, node.body_end)
+            for node in scope_tree(lines).scopes()] == [
+        ('Sizes', 6), ('Fill', 11), ('twice', 14), ('main', 19)]
+
+
+def test_read_units():
+    """Test that a file is read one top-level unit at a time, the
+    continuation lines and the preprocessor conditionals kept whole."""
+    assert [len(chunk) for chunk in read_units(iter(RAWDATA), 'free')] == \
+        [17, 3]
+    lines = ["c     first\n", "      subroutine a\n", "      end\n",
+             "#ifdef MPI\n", "      subroutine b\n", "      end\n",
+             "#endif\n", "      subroutine c(x,\n", "     &  y)\n",
+             "      end subroutine\n", "     &  c\n", "c     last\n"]
+    chunks = list(read_units(iter(lines), 'fixed'))
+    assert chunks == [lines[:3], lines[3:11], lines[11:]]
+
+
+def test_derived_type_functions():
+    """Test the functions returning a derived type, the type name split
+    from its keyword or not."""
+    for line in ("      type(point) function f()\n",
+                 "      recursive type (point) function f(x)\n",
+                 "      class(point) function f(x)\n"):
+        lines = [line, "      end\n"]
+        for data in (split_rawdata(lines, 'fixed'),
+                     [split_string(rd) for rd in lines]):
+            assert [(node.kind, node.name)
+                    for node in scope_tree(data).scopes()] == [
+                ('function', 'f')]
+    for line in ("      type point\n", "      type(point) :: p\n"):
+        data = split_rawdata([line, "      end type\n"], 'fixed')
+        assert scope_tree(data).scopes() == []
+
+
+def test_end_comments():
+    """Test that an end statement closes its unit whatever its comment."""
+    for end in ("end ! of a\n", "end subroutine a ! of a\n"):
+        lines = ["subroutine a()\n", "  x = 1\n", end, "subroutine b()\n",
+                 "end subroutine b !\n"]
+        for data in (split_rawdata(lines, 'free'),
+                     [split_string(rd) for rd in lines]):
+            assert [(node.name, node.istart, node.iend)
+                    for node in scope_tree(data).nodes()] == [
+                ('a', 0, 2), ('b', 3, 4)]
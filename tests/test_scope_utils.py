@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+""" Tests of the filling of the scopes """
+from roquefort.records import SCOPE_PARTS
+from roquefort.scope_utils import (fill_scope, fill_scopes,
+                                   gather_use_variables, separate_scope)
+from roquefort.statements import assemble_statements
+from roquefort.string_utils import split_rawdata
+
+RAWDATA = [
+    "      subroutine foo(a)\n", "      use sizes, only: n, m\n",
+    "      implicit real*8(a-h,o-z)\n", "      real*8 a(n), b\n",
+    "      integer k\n", "      parameter(two=2.d0)\n",
+    "      dimension w(3)\n", "      y = w(1) + z\n",
+    "      character*8 z\n", "      x = two * z + k + y + m\n",
+    "      end\n"
+]
+
+
+def test_fill_scope():
+    """Test the declarations and the bulky variables of a single sweep."""
+    texts = [st.text for st in assemble_statements(RAWDATA)]
+    (scope, ) = separate_scope(split_rawdata(texts))
+    fill_scope(scope)
+    assert [(mod.name, [v.name for v in mod.var]) for mod in scope.module] \
+        == [('sizes', ['n', 'm'])]
+    assert [d.variables for d in scope.floats] == [['a', 'b']]
+    assert [d.variables for d in scope.integers] == [['k']]
+    assert scope.parameters[0].variables == ['two']
+    assert scope.dimensions[0].variables == ['w']
+    assert (scope.symbols['a'].kind, scope.symbols['w'].dimensions) == \
+        ('*8', '(3)')
+    # the declarations after a statement exclude its variables too:
+    assert scope.bulky_var == ['y', 'x']
+    assert gather_use_variables(scope) == {'n', 'm', 'mpi_status_size'}
+
+
+def test_implicit_inheritance():
+    """Test that the contained procedures inherit the implicit types."""
+    texts = ["module m\n", "implicit logical(l)\n", "contains\n",
+             "subroutine s\n", "implicit complex*16(z)\n", "end\n",
+             "end module\n"]
+    module, procedure = separate_scope(split_rawdata(texts, 'free'))
+    for scope in (module, procedure):
+        fill_scope(scope, clean_implicit=False)
+    assert procedure.parent is module
+    assert (module.implicit[11], module.implicit[25]) == ('logical', 'real')
+    assert (procedure.implicit[11], procedure.implicit[25]) == \
+        ('logical', 'complex*16')
+
+
+def test_fill_scopes_in_pool():
+    """Test that a pool of processes fills the scopes as the serial loop."""
+    texts = [st.text for st in assemble_statements(RAWDATA)]
+    texts = texts[:-1] + ["      contains\n", "      subroutine bar\n",
+                          "      implicit integer(a-h)\n", "      b = 1\n",
+                          "      end\n"] + texts[-1:]
+    data = split_rawdata(texts)
+    serial = fill_scopes([], separate_scope(data), True)
+    pooled = fill_scopes([], separate_scope(data), True, jobs=2)
+    assert [s.name for s in pooled] == ['foo', 'bar']
+    # (the scopes compare by name and range only, not by what is found)
+    assert [[getattr(s, name) for name in SCOPE_PARTS] for s in pooled] == \
+        [[getattr(s, name) for name in SCOPE_PARTS] for s in serial]
+    assert [v.name for v in pooled[0].module[0].var] == ['n', 'm']
+    assert pooled[0].bulky_var and pooled[0].symbols
+    assert pooled[1].implicit[1] == 'integer'
+
+
+def test_lazy_attributes():
+    """Test that the attributes are analysed when first read, only."""
+    texts = [st.text for st in assemble_statements(RAWDATA)]
+    (scope, ) = separate_scope(split_rawdata(texts))
+    assert [mod.name for mod in scope.module] == ['sizes']
+    assert scope.pending('declarations') and scope.pending('bulky_var')
+    assert scope.bulky_var == ['y', 'x']
+    assert not scope.pending('declarations')
+    assert [d.variables for d in scope.integers] == [['k']]
+    assert scope.pending('implicit')
+    assert scope.implicit[0] == 'real*8'
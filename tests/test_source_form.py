@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+""" Tests of the source form detection """
+from roquefort.clean_common import search_for_procedures
+from roquefort.source_form import (BLANK, COMMENT_LINE, CONTINUATION,
+                                   FIXED_FORM, FREE_FORM, INITIAL,
+                                   classify_fixed_line, classify_free_line,
+                                   detect_form)
+from roquefort.statements import assemble_statements
+from roquefort.string_utils import split_rawdata
+
+FIXED = ["c a comment\n", "      subroutine foo(a,\n",
+         "     +               b)\n", "      end\n"]
+FREE = ["subroutine foo(a, &\n", "               b)\n", "  c = a + b\n",
+        "end subroutine\n"]
+
+
+def test_detect_form():
+    """Test that the content confirms or overrules the extension."""
+    assert detect_form("foo.f", FIXED) == FIXED_FORM
+    assert detect_form("foo.F90", FREE) == FREE_FORM
+    assert detect_form("foo.f", FREE) == FREE_FORM
+    assert detect_form("foo.f90", FIXED) == FIXED_FORM
+    assert detect_form("foo.f90", ["      x = 1\n"]) == FREE_FORM
+    assert detect_form(None, ["      x = 1\n"]) == FIXED_FORM
+
+
+def test_classifiers():
+    """Test the column rules of fixed form and their absence in free form."""
+    assert classify_fixed_line("c = 1\n") == (COMMENT_LINE, 0)
+    assert classify_free_line("c = 1\n") == (INITIAL, 0)
+    assert classify_fixed_line("     +  b)\n") == (CONTINUATION, 6)
+    assert classify_free_line("     +  b)\n") == (INITIAL, 0)
+    assert classify_free_line("    & b)\n") == (CONTINUATION, 5)
+    assert classify_fixed_line("  \n") == (BLANK, 0)
+
+
+def test_form_aware_statements():
+    """Test the statements and words of both forms."""
+    fixed = assemble_statements(FIXED, FIXED_FORM)
+    assert [st.lines for st in fixed] == [[0], [1, 2], [3]]
+    free = assemble_statements(FREE)
+    assert [st.lines for st in free] == [[0, 1], [2], [3]]
+    assert split_rawdata([FREE[2]], FREE_FORM) == [['c', 'a', 'b\n']]
+
+
+def test_search_for_procedures():
+    """Test the procedures found in each form."""
+    xs = ''.join(FIXED) + "\n      subroutine bar\nc      end\n      end\n"
+    assert search_for_procedures(0, xs) == (12, 71)
+    assert search_for_procedures(71, xs) == (71, len(xs))
+    xs = ''.join(FREE) + "  subroutine bar\n  end\n"
+    assert search_for_procedures(0, xs, form=FREE_FORM) == (0, 65)
+    assert search_for_procedures(65, xs, form=FREE_FORM) == (65, len(xs))
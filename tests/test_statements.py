@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+""" Tests of the logical statement assembler """
+from roquefort.statements import (assemble_statements, drop_statements,
+                                  format_statement, replace_statement)
+
+FIXED = [
+    "      use mod1, only: var1, var2, ! first\n",
+    "c between the lines\n",
+    "     &  var3, var4\n",
+    "      x = var1\n",
+]
+
+FREE = [
+    "  call foo( a, b, & ! first\n",
+    "            c )\n",
+    "  y = 1\n",
+]
+
+
+def test_fixed_form_continuation():
+    """Test the leading '&' continuation lines."""
+    statements = assemble_statements(FIXED)
+    assert len(statements) == 2
+    assert statements[0].text == \
+        "      use mod1, only: var1, var2, var3, var4\n"
+    assert statements[0].lines == [0, 2]
+    assert statements[0].prefix == "     &"
+    assert statements[1].lines == [3]
+
+
+def test_free_form_continuation():
+    """Test the trailing '&' continuation lines."""
+    statements = assemble_statements(FREE)
+    assert [st.text for st in statements] == \
+        ["  call foo( a, b, c )\n", "  y = 1\n"]
+    assert statements[0].trailing
+
+
+def test_project_edits():
+    """Test that a rewritten statement replaces its physical lines only."""
+    rawdata = list(FIXED)
+    statement = assemble_statements(rawdata)[0]
+    names = ['variable_%d' % i for i in range(6)]
+    text = format_statement(statement, "      use mod1, only: ", names)
+    assert text == (
+        "      use mod1, only: variable_0, variable_1, variable_2, "
+        "variable_3,\n"
+        "     & variable_4, variable_5\n")
+    rawdata = replace_statement(rawdata, statement, text)
+    assert rawdata[1:] == ["c between the lines\n", "", "      x = var1\n"]
+
+
+def test_drop_statements():
+    """Test that the continuation lines are dropped with their statement."""
+    rawdata = ["      parameter (a=1,\n", "     &  b=2)\n", "      x = a\n"]
+    assert drop_statements(rawdata, lambda rd: 'parameter' in rd) == \
+        ["      x = a\n"]
+
+
+def test_drop_statements_fixed_form():
+    """Test that the column 6 continuation lines of fixed form are dropped
+    too."""
+    rawdata = ["      parameter (aa=1.d0,\n", "     +  bb=2.d0)\n",
+               "      dimension z(3),\n", "     +  y(4)\n", "      x = aa\n"]
+    dropped = []
+    assert drop_statements(rawdata, lambda rd: 'parameter' in rd, dropped,
+                           'fixed') == rawdata[2:]
+    assert dropped == [0, 1]
+    assert drop_statements(rawdata, lambda rd: 'dimension' in rd) == \
+        rawdata[:2] + rawdata[4:]
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+""" Tests of the declaration and common block splitters """
+import pytest
+
+from roquefort.clean_common import (VariableMatcher, get_variable_in_string,
+                                    parse_common_block, split_common_block)
+from roquefort.string_utils import split_string_with_parenthesis
+
+
+def test_split_string_with_parenthesis():
+    """Test the split at the commas outside of parenthesis and quotes."""
+    assert split_string_with_parenthesis(
+        "index(3,4), n,indx(n, m),m,nstack") == \
+        ['index(3,4)', 'n', 'indx(n, m)', 'm', 'nstack']
+    assert split_string_with_parenthesis("fmt(')', 2) ,'a,b'") == \
+        ["fmt(')', 2)", "'a,b'"]
+    # the scan stops at an unbalanced parenthesis:
+    assert split_string_with_parenthesis("a, b(1, c") == ['a', 'b']
+    with pytest.raises(ValueError):
+        split_string_with_parenthesis(", a")
+
+
+def test_parse_common_block():
+    """Test the tokens of a common block."""
+    assert parse_common_block("common /dets/ cdet(MDET, 3), ndet") == \
+        ['common', '/', 'dets', '/',
+         ['cdet', '(', 'MDET', ',', '3', ')', ','], ['ndet']]
+    assert split_common_block("common /c/ a(n*2), b,\n c") == \
+        ['a(n*2)', 'b', 'c']
+    with pytest.raises(ValueError):
+        parse_common_block("common /c/")
+
+
+def test_get_variable_in_string():
+    """Test that the variables in strings and comments are skipped."""
+    content = ("      x = nup ! ndn\n      print *, 'nel'\n"
+               "c nel2\n      y = ndet\n")
+    assert get_variable_in_string(
+        content, ['nup', 'ndn', 'nel', 'nel2', 'ndet']) == {'nup', 'ndet'}
+    matcher = VariableMatcher(['nup', 'NDET', 'nel'])
+    assert matcher.find(content) == {'nup': [10], 'NDET': [58]}
+
+
+def test_get_variable_in_free_form():
+    """Test that a free-form line starting with 'c' is code."""
+    content = "count = nup ! ndn\ncall run(ndet)\n"
+    for form in ('free', None):
+        assert get_variable_in_string(
+            content, ['count', 'nup', 'ndn', 'ndet'], form) == {
+                'count', 'nup', 'ndet'}
+    assert VariableMatcher(['ndet']).find(content, 'free') == {'ndet': [27]}
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+""" Tests of the interned token store """
+from roquefort.string_utils import split_rawdata
+from roquefort.symbols import SymbolTable, TokenStore
+
+
+def test_symbol_table():
+    """Test that the identifiers are interned case-insensitively."""
+    symbols = SymbolTable()
+    assert symbols.intern('dp') == 0
+    assert symbols.intern('nelec') == 1
+    assert symbols.intern('dp') == 0
+    assert symbols.lookup('NELEC') == 1
+    assert symbols.lookup('nup') is None
+    assert symbols.name(1) == 'nelec'
+
+
+def test_token_store():
+    """Test the counts of the identifiers, strings and comments left out."""
+    data = split_rawdata(["      use mod1, only: nelec, dp\n",
+                          "      x = NELEC*2.0_dp ! nelec\n",
+                          "      print *, 'nelec', nelec_up\n"])
+    tokens = TokenStore(data, SymbolTable())
+    assert tokens.ids.typecode == 'I'
+    ids = tokens.gather(range(1, 3))
+    assert tokens.count(ids, 'nelec') == 1
+    assert tokens.count(ids, 'dp') == 0
+    assert tokens.count(tokens.gather(range(3)), 'Nelec') == 2
+    assert tokens.count(ids, 'missing') == 0
+    counts = tokens.occurrences(range(3))
+    assert [tokens.tally(counts, name) for name in ('NELEC', 'x', 'dp')] \
+        == [2, 1, 1]
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+""" Tests of the columnar token table """
+import pytest
+
+from roquefort.token_table import load_token_table, token_table
+
+np = pytest.importorskip('numpy')
+
+SOURCE = """      subroutine Fill(a)
+      implicit real*8 (a-h,o-z)
+      common /sizes/ nstep, wt(MWALK)
+      a = nstep ! nstep
+      end
+      subroutine empty
+      use kinds, only: dp, i4
+      use mpi
+      use, intrinsic :: iso_c_binding, only: c_int, cp => c_ptr
+      end
+"""
+
+
+def test_token_table(tmp_path):
+    """Test the columns and the census queries."""
+    first, second = tmp_path / 'first.f', tmp_path / 'second.f'
+    first.write_text(SOURCE)
+    second.write_text("      program main\n      nstep = 2\n      end\n")
+    table = token_table([first, second])
+    assert [name for _, name in table.scopes] == ['Fill', 'empty', 'main']
+    assert table.scopes_with(['IMPLICIT', 'real', '*', '8']) == [
+        (str(first), 'Fill')]
+    assert table.scopes_with(['real', '*', '4']) == []
+    assert table.common_variables() == ['nstep', 'wt']
+    assert table.file_counts(['nstep', 'wt', 'mpi']) == {
+        'nstep': 2, 'wt': 1, 'mpi': 1}
+    assert table.use_list_lengths().tolist() == [2, 0, 2]
+
+    # the rows of the comment are left out:
+    nstep = table.ids(['nstep'])[0]
+    assert np.count_nonzero(table.token == nstep) == 3
+    assert table.line[table.token == nstep].tolist() == [2, 3, 1]
+
+    path = str(tmp_path / 'tokens.npz')
+    table.save(path)
+    loaded = load_token_table(path)
+    assert (loaded.files, loaded.scopes) == (table.files, table.scopes)
+    assert loaded.common_variables() == ['nstep', 'wt']
+    assert all(np.array_equal(getattr(loaded, name), getattr(table, name))
+               for name in ('file', 'scope', 'line', 'token', 'kind'))